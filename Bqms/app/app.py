@@ -2,7 +2,7 @@ from flask import Flask
 from flask_cors import CORS
 from flask_jwt_extended import JWTManager
 from app.config.config import get_config_by_name
-from app.initialize_functions import initialize_route, initialize_db, initialize_swagger
+from app.initialize_functions import initialize_route, initialize_db, initialize_events, initialize_queue, initialize_numbering, initialize_group_commit, initialize_idempotency, initialize_swagger, initialize_cli, initialize_passwords, initialize_response_cache, initialize_json, initialize_metrics, initialize_admission
 from flask_migrate import Migrate
 from app.db.db import db
 
@@ -25,24 +25,66 @@ def create_app(config=None) -> Flask:
     if config:
         app.config.from_object(get_config_by_name(config))
 
+    # Faster JSON encoding when orjson is installed
+    initialize_json(app)
+
+    # Request latency and DB usage at /metrics
+    initialize_metrics(app)
+
+    # Rate limits and load shedding, ahead of any database work
+    initialize_admission(app)
+
     # Initialize extensions
     initialize_db(app)
+    initialize_passwords(app)
 
     # Register blueprints
     initialize_route(app)
 
+    # Live queue feed and the in-memory queue built on it
+    initialize_events(app)
+    initialize_queue(app)
+
+    # Per-worker leases on ticket number blocks
+    initialize_numbering(app)
+
+    # Optional group commit of POST /api/ticket/new
+    initialize_group_commit(app)
+
+    # Replayed responses for retried write requests
+    initialize_idempotency(app)
+
+    # Initialize the response cache for the list endpoints
+    initialize_response_cache(app)
+
     # Initialize Swagger
     initialize_swagger(app)
 
     #set up jwt error handlers and callbacks
     setup_jwt_callbacks(app)
 
+    # Register `flask bqms ...` commands
+    initialize_cli(app)
+
     return app
 
 def setup_jwt_callbacks(app):
     """Setup JWT error handlers and callbacks"""
-    from flask import jsonify
+    from flask import current_app, jsonify
+    from sqlalchemy import event
     from app.db.db import User
+    from app.utils.cache import TTLCache
+
+    # Users resolved from tokens, so protected requests skip the User query
+    # in the steady state. Entries are dropped when a user row changes in
+    # this worker; other workers see the change once the entry expires.
+    app.extensions['jwt_user_cache'] = TTLCache(
+        app.config.get('JWT_USER_CACHE_SIZE', 1024),
+        app.config.get('JWT_USER_CACHE_TTL', 60),
+    )
+    if not event.contains(User, 'after_update', invalidate_cached_user):
+        event.listen(User, 'after_update', invalidate_cached_user)
+        event.listen(User, 'after_delete', invalidate_cached_user)
     
     @jwt.user_identity_loader
     def user_identity_lookup(user):
@@ -59,7 +101,15 @@ def setup_jwt_callbacks(app):
         a protected route is accessed.
         """
         identity = jwt_data["sub"]
-        return User.query.filter_by(id=identity).one_or_none()
+        cache = current_app.extensions['jwt_user_cache']
+        user = cache.get(identity)
+        if user is None:
+            user = User.query.filter_by(id=identity).one_or_none()
+            if user is not None:
+                # Detach it so it can outlive this request's session
+                db.session.expunge(user)
+                cache.set(identity, user)
+        return user
     
     @jwt.expired_token_loader
     def expired_token_callback(jwt_header, jwt_payload):
@@ -92,3 +142,11 @@ def setup_jwt_callbacks(app):
             'message': 'The token is not fresh',
             'code': 'fresh_token_required'
         }), 401
+
+
+def invalidate_cached_user(mapper, connection, user):
+    """Drop a changed or deleted user from the JWT user cache"""
+    from flask import current_app
+    cache = current_app.extensions.get('jwt_user_cache')
+    if cache is not None:
+        cache.pop(user.id)
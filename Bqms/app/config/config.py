@@ -1,10 +1,30 @@
 from datetime import timedelta
 import os
+import tempfile
 from dotenv import load_dotenv
 
 load_dotenv()
 
 
+def engine_options(database_uri):
+    """
+    SQLALCHEMY_ENGINE_OPTIONS for ``database_uri``, tunable from the
+    environment. SQLite gets the default pool; its concurrency comes from
+    the WAL pragmas set on connect (see SQLITE_* below).
+    """
+    options = {
+        'pool_pre_ping': os.getenv('DB_POOL_PRE_PING', 'true').lower() == 'true',
+        'pool_recycle': int(os.getenv('DB_POOL_RECYCLE', 1800)),
+    }
+    if not database_uri.startswith('sqlite'):
+        options.update(
+            pool_size=int(os.getenv('DB_POOL_SIZE', 10)),
+            max_overflow=int(os.getenv('DB_MAX_OVERFLOW', 20)),
+            pool_timeout=int(os.getenv('DB_POOL_TIMEOUT', 30)),
+        )
+    return options
+
+
 class BaseConfig:
     """Base configuration."""
     DEBUG = False
@@ -14,22 +34,103 @@ class BaseConfig:
     JWT_SECRET_KEY = os.getenv('JWT_SECRET_KEY', 'jwt-secret-string')
     JWT_ACCESS_TOKEN_EXPIRES = timedelta(hours=1)
     JWT_REFRESH_TOKEN_EXPIRES = timedelta(days=30)
+    # Users cached by token identity (entries, seconds)
+    JWT_USER_CACHE_SIZE = int(os.getenv('JWT_USER_CACHE_SIZE', 1024))
+    JWT_USER_CACHE_TTL = int(os.getenv('JWT_USER_CACHE_TTL', 60))
+    # Rendered list responses (entries, seconds). Entries are keyed by data
+    # version, so the TTL only bounds memory; set RESPONSE_CACHE_URL to a
+    # redis:// URL to share them between workers
+    RESPONSE_CACHE_SIZE = int(os.getenv('RESPONSE_CACHE_SIZE', 256))
+    RESPONSE_CACHE_TTL = int(os.getenv('RESPONSE_CACHE_TTL', 300))
+    RESPONSE_CACHE_URL = os.getenv('RESPONSE_CACHE_URL')
+    # bcrypt cost, and the per-worker pool that hashes passwords off the
+    # request threads. Changing the cost rehashes passwords at next login.
+    BCRYPT_LOG_ROUNDS = int(os.getenv('BCRYPT_LOG_ROUNDS', 12))
+    BCRYPT_WORKERS = int(os.getenv('BCRYPT_WORKERS', 2))
+    BCRYPT_QUEUE_SIZE = int(os.getenv('BCRYPT_QUEUE_SIZE', 32))
+    BCRYPT_TIMEOUT = float(os.getenv('BCRYPT_TIMEOUT', 10))
+    # Pragmas applied to every new SQLite connection
+    SQLITE_JOURNAL_MODE = os.getenv('SQLITE_JOURNAL_MODE', 'WAL')
+    SQLITE_SYNCHRONOUS = os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL')
+    SQLITE_BUSY_TIMEOUT = int(os.getenv('SQLITE_BUSY_TIMEOUT', 5000))
+    # Numbers each worker leases from the daily counter at once; 0 reserves
+    # one number per ticket inside the ticket's own transaction. Not
+    # available with SQLite under gevent, where each worker has a single
+    # connection and the lease needs a second one.
+    TICKET_NUMBER_BLOCK_SIZE = int(os.getenv('TICKET_NUMBER_BLOCK_SIZE', 0))
+    # Largest request accepted by POST /api/ticket/batch
+    TICKET_BATCH_MAX_SIZE = int(os.getenv('TICKET_BATCH_MAX_SIZE', 500))
+    # Responses to write requests sent with an Idempotency-Key header are
+    # kept this long, for retries; each worker also caches this many
+    IDEMPOTENCY_KEY_TTL_HOURS = int(os.getenv('IDEMPOTENCY_KEY_TTL_HOURS', 24))
+    IDEMPOTENCY_CACHE_SIZE = int(os.getenv('IDEMPOTENCY_CACHE_SIZE', 1024))
+    # Group commit: POST /api/ticket/new calls arriving within the window
+    # (milliseconds) share one transaction, up to this many per commit
+    TICKET_GROUP_COMMIT = os.getenv('TICKET_GROUP_COMMIT', 'false').lower() == 'true'
+    TICKET_GROUP_COMMIT_WINDOW_MS = float(os.getenv('TICKET_GROUP_COMMIT_WINDOW_MS', 5))
+    TICKET_GROUP_COMMIT_MAX = int(os.getenv('TICKET_GROUP_COMMIT_MAX', 100))
+    # Page size for GET /api/ticket/list when no limit is given, and its cap
+    TICKET_LIST_PAGE_SIZE = int(os.getenv('TICKET_LIST_PAGE_SIZE', 100))
+    TICKET_LIST_MAX_PAGE_SIZE = int(os.getenv('TICKET_LIST_MAX_PAGE_SIZE', 1000))
+    # flask bqms archive-tickets moves tickets older than this many days out
+    # of the hot ticket table, this many per transaction
+    TICKET_RETENTION_DAYS = int(os.getenv('TICKET_RETENTION_DAYS', 7))
+    TICKET_ARCHIVE_BATCH_SIZE = int(os.getenv('TICKET_ARCHIVE_BATCH_SIZE', 1000))
+    # GET /api/ticket/export reads, renders and sends this many tickets at a
+    # time, so its memory use does not grow with the date range; the gzip
+    # level applies to clients sending Accept-Encoding: gzip (0 disables)
+    TICKET_EXPORT_CHUNK_SIZE = int(os.getenv('TICKET_EXPORT_CHUNK_SIZE', 1000))
+    TICKET_EXPORT_GZIP_LEVEL = int(os.getenv('TICKET_EXPORT_GZIP_LEVEL', 6))
+    # Live queue feed (GET /api/ticket/events)
+    EVENT_POLL_INTERVAL = float(os.getenv('EVENT_POLL_INTERVAL', 0.5))
+    EVENT_HEARTBEAT = float(os.getenv('EVENT_HEARTBEAT', 15))
+    EVENT_BUFFER_SIZE = int(os.getenv('EVENT_BUFFER_SIZE', 1000))
+    EVENT_REPLAY_LIMIT = int(os.getenv('EVENT_REPLAY_LIMIT', 5000))
+    EVENT_RETENTION_HOURS = int(os.getenv('EVENT_RETENTION_HOURS', 24))
+    # Admission control on the ticket routes, checked before any database
+    # work. Each client (its address, or the first value of
+    # RATE_LIMIT_CLIENT_HEADER, e.g. X-Forwarded-For behind a proxy) gets
+    # token buckets for reads and writes: RATE requests per second, up to
+    # BURST at once (a rate of 0 disables that bucket). Buckets live in the
+    # SQLite file RATE_LIMIT_STORE, shared by the workers of a host.
+    # MAX_IN_FLIGHT (0 disables) caps the requests a worker runs at once.
+    # Rejections are 429 or 503 with a Retry-After of at least RETRY_AFTER.
+    RATE_LIMIT_ENABLED = os.getenv('RATE_LIMIT_ENABLED', 'false').lower() == 'true'
+    RATE_LIMIT_READ_RATE = float(os.getenv('RATE_LIMIT_READ_RATE', 5))
+    RATE_LIMIT_READ_BURST = int(os.getenv('RATE_LIMIT_READ_BURST', 20))
+    RATE_LIMIT_WRITE_RATE = float(os.getenv('RATE_LIMIT_WRITE_RATE', 2))
+    RATE_LIMIT_WRITE_BURST = int(os.getenv('RATE_LIMIT_WRITE_BURST', 10))
+    RATE_LIMIT_STORE = os.getenv('RATE_LIMIT_STORE', os.path.join(tempfile.gettempdir(), 'bqms-rate-limits.db'))
+    RATE_LIMIT_CLIENT_HEADER = os.getenv('RATE_LIMIT_CLIENT_HEADER')
+    MAX_IN_FLIGHT = int(os.getenv('MAX_IN_FLIGHT', 0))
+    RETRY_AFTER = int(os.getenv('RETRY_AFTER', 1))
+    # Request latency and DB usage at GET /metrics. Requests slower than
+    # PROFILE_THRESHOLD_MS (0 disables profiling) leave a cProfile dump
+    # in PROFILE_DIR; under gevent only one request per worker is profiled
+    # at a time.
+    METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'true').lower() == 'true'
+    PROFILE_THRESHOLD_MS = int(os.getenv('PROFILE_THRESHOLD_MS', 0))
+    PROFILE_DIR = os.getenv('PROFILE_DIR', 'profiles')
 
 class DevelopmentConfig(BaseConfig):
     """Development configuration."""
     DEBUG = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///development.db'
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(SQLALCHEMY_DATABASE_URI)
 
 class TestingConfig(BaseConfig):
     """Testing configuration."""
     DEBUG = True
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///testing.db'
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(SQLALCHEMY_DATABASE_URI)
+    BCRYPT_LOG_ROUNDS = 4
 
 class ProductionConfig(BaseConfig):
     """Production configuration."""
     DEBUG = False
-    SQLALCHEMY_DATABASE_URI = 'sqlite:///production.db'
+    SQLALCHEMY_DATABASE_URI = os.getenv('DATABASE_URL', 'sqlite:///production.db')
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(SQLALCHEMY_DATABASE_URI)
 
 
 def get_config_by_name(config_name):
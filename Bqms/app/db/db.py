@@ -1,8 +1,12 @@
+import functools
+import sqlite3
 import uuid
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
 from sqlalchemy.orm import DeclarativeBase
 from datetime import date, datetime
 from flask_bcrypt import Bcrypt
+from app.utils.passwords import get_password_hasher
 
 db = SQLAlchemy()
 bcrypt = Bcrypt()
@@ -10,6 +14,28 @@ bcrypt = Bcrypt()
 def generate_uuid():
     return str(uuid.uuid4().hex[:8])
 
+# Branch of the unscoped /api routes and of data from before branches existed
+DEFAULT_BRANCH = 'main'
+
+
+def configure_sqlite(engine, journal_mode, synchronous, busy_timeout):
+    """
+    Set the given pragmas on every new connection of a SQLite ``engine``.
+
+    WAL lets readers run alongside the single writer, synchronous=NORMAL
+    drops the fsync per commit that WAL makes unnecessary, and busy_timeout
+    makes a writer wait for the lock instead of failing at once.
+    """
+    @event.listens_for(engine, 'connect')
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        if not isinstance(dbapi_connection, sqlite3.Connection):
+            return
+        cursor = dbapi_connection.cursor()
+        cursor.execute(f'PRAGMA journal_mode={journal_mode}')
+        cursor.execute(f'PRAGMA synchronous={synchronous}')
+        cursor.execute(f'PRAGMA busy_timeout={int(busy_timeout)}')
+        cursor.close()
+
 
 # 
 class User(db.Model):
@@ -19,7 +45,7 @@ class User(db.Model):
     username = db.Column(db.String(80), unique=True, nullable=False)
     email = db.Column(db.String(120), unique=True, nullable=False)
     _password = db.Column(db.String(128), nullable=False)
-    created_at = db.Column(db.DateTime, default=datetime.now())
+    created_at = db.Column(db.DateTime, default=datetime.now)
     
     # Define relationship with Teller
     # tellers = db.relationship('Teller', backref='user', lazy=True)
@@ -30,10 +56,13 @@ class User(db.Model):
     
     @password.setter
     def password(self, password):
-        self._password = bcrypt.generate_password_hash(password).decode('utf-8')
+        self._password = get_password_hasher().hash(password)
     
     def verify_password(self, password):
-        return bcrypt.check_password_hash(self._password, password)
+        return get_password_hasher().verify(self._password, password)
+    
+    def password_needs_rehash(self):
+        return get_password_hasher().needs_rehash(self._password)
     
     def to_json(self):
         return {
@@ -45,13 +74,41 @@ class User(db.Model):
     def __repr__(self):
         return f"<User {self.username}>"
     
+class Branch(db.Model):
+    """
+    A branch running its own queue. Tickets, tellers, ticket numbers and
+    statistics are all kept per branch; see ``flask bqms create-branch``.
+    """
+    __tablename__ = 'branch'
+
+    id = db.Column(db.String(36), primary_key=True)
+    name = db.Column(db.String(80), nullable=False)
+
+    def to_json(self):
+        return {
+            "id": self.id,
+            "name": self.name,
+        }
+
+    def __repr__(self):
+        return f"<Branch {self.id}>"
+
+
 class Teller(db.Model):
     __tablename__ = 'teller'
     
     id = db.Column(db.String(36), primary_key=True, default=generate_uuid)
+    branch_id = db.Column(
+        db.String(36), db.ForeignKey('branch.id'), nullable=False,
+        default=DEFAULT_BRANCH, server_default=DEFAULT_BRANCH,
+    )
     name = db.Column(db.String(50), nullable=False)
     is_active = db.Column(db.Boolean, default=False)
     
+    __table_args__ = (
+        db.Index('ix_teller_branch_active', branch_id, is_active),
+    )
+
     # Define relationship with Ticket
     tickets = db.relationship('Ticket', backref='teller', lazy=True)
     
@@ -65,19 +122,103 @@ class Teller(db.Model):
     def __repr__(self):
         return f"<Teller {self.name}"
 
-class Ticket(db.Model):
+class TicketJSONMixin:
+    """Rendering shared by Ticket and TicketArchive"""
+
+    # to_json key -> the column it is rendered from
+    JSON_COLUMNS = {
+        'id': 'id',
+        'canceled': 'is_canceled',
+        'status': 'is_served',
+        'ticket_number': 'ticket_number',
+        'ticket_type': 'ticket_type',
+        'issue_date': 'created_at',
+        'Teller': 'teller_name',
+        'completed': 'completed',
+    }
+
+    @property
+    def teller_name(self):
+        return self.teller.name if self.teller else None
+
+    @classmethod
+    def json_column_names(cls, fields):
+        """Names of the columns json_columns(fields) selects, in order"""
+        return sorted({'id', 'created_at', *(cls.JSON_COLUMNS[field] for field in fields)})
+
+    @classmethod
+    def json_columns(cls, fields):
+        """
+        Columns to SELECT so the resulting rows can be passed to ticket_json
+        or ticket_rows_json.
+
+        ``id`` and ``created_at`` are always included since list pages are
+        keyed on them.
+        """
+        return [
+            Teller.name.label('teller_name') if name == 'teller_name' else getattr(cls, name)
+            for name in cls.json_column_names(fields)
+        ]
+
+    def to_json(self, fields=None):
+        return ticket_json(self, fields or self.JSON_COLUMNS)
+
+
+class Ticket(TicketJSONMixin, db.Model):
     __tablename__ = 'ticket'
 
     id = db.Column(db.String(36), primary_key=True, default=generate_uuid)
-    ticket_number = db.Column(db.String(20), unique=True, nullable=False)
+    branch_id = db.Column(
+        db.String(36), db.ForeignKey('branch.id'), nullable=False,
+        default=DEFAULT_BRANCH, server_default=DEFAULT_BRANCH,
+    )
+    # Numbers restart every day in every branch, so only unique per branch
+    ticket_number = db.Column(db.String(20), nullable=False)
     ticket_type = db.Column(db.String(1), nullable=False)
-    created_at =  db.Column(db.DateTime, default=datetime.now(), nullable=True)
+    created_at =  db.Column(db.DateTime, default=datetime.now, nullable=True)
     is_served = db.Column(db.Boolean, default=False)
     served_at = db.Column(db.DateTime, nullable=True)
     teller_id = db.Column(db.String(36), db.ForeignKey('teller.id'), nullable=True)
     is_canceled = db.Column(db.Boolean, default=False)
     completed = db.Column(db.Boolean, default=False)
 
+    # get_ticket_list always filters on one branch and one day of
+    # created_at; each status filter gets a partial index holding only the
+    # rows that can match it. Leading with branch_id keeps every branch's
+    # rows together, so a branch's queries only read that branch's tickets.
+    # The partial indexes end with id, the list's page order, so a page is
+    # read in index order without a sort; that saving is also what makes
+    # SQLite pick them over ix_ticket_branch_created_at.
+    # ix_ticket_created_at serves the jobs that cover all branches
+    # (archiving, rebuilding statistics).
+    __table_args__ = (
+        db.UniqueConstraint(branch_id, ticket_number, name='uq_ticket_branch_number'),
+        db.Index('ix_ticket_created_at', created_at),
+        db.Index('ix_ticket_branch_created_at', branch_id, created_at),
+        db.Index(
+            'ix_ticket_branch_pending_created_at', branch_id, created_at, id,
+            sqlite_where=is_served == False,
+            postgresql_where=is_served == False,
+        ),
+        db.Index(
+            'ix_ticket_branch_served_created_at', branch_id, created_at, id,
+            sqlite_where=db.and_(is_served == True, completed == False, is_canceled == False),
+            postgresql_where=db.and_(is_served == True, completed == False, is_canceled == False),
+        ),
+        db.Index(
+            'ix_ticket_branch_completed_created_at', branch_id, created_at, id,
+            sqlite_where=db.and_(is_served == True, completed == True),
+            postgresql_where=db.and_(is_served == True, completed == True),
+        ),
+        db.Index(
+            'ix_ticket_branch_canceled_created_at', branch_id, created_at, id,
+            sqlite_where=is_canceled == True,
+            postgresql_where=is_canceled == True,
+        ),
+        db.Index('ix_ticket_teller_id', teller_id),
+        db.Index('ix_ticket_type_created_at', ticket_type, created_at),
+    )
+
     TICKET_TYPE_LABELS = {
         'W': 'Withdrawal',
         'D': 'Deposit',
@@ -93,46 +234,299 @@ class Ticket(db.Model):
 
     def __repr__(self):
         return f"<{self.ticket_number} - {self.get_ticket_type_display()}>"
-    
-    def to_json(self):
-        return {
-            "id" : self.id,
-            "canceled" : self.is_canceled,
-            "status": "served" if self.is_served else "pending",
-            "ticket_number": self.ticket_number,
-            "ticket_type" : self.get_ticket_type_display(),
-            "issue_date": self.created_at.strftime('%Y-%m-%d %H:%M:%S'),
-            'Teller': get_teller_name(self.teller_id)  if self.teller_id else None,
-            'completed': self.completed,
-        }
 
-def get_teller_name(id):
-        teller = Teller.query.filter_by(id=id).first()
-        return teller.name if teller else None
+
+class TicketArchive(TicketJSONMixin, db.Model):
+    """
+    Tickets moved out of the hot ``ticket`` table by
+    ``flask bqms archive-tickets``; same columns, read-only afterwards.
+    """
+    __tablename__ = 'ticket_archive'
+
+    id = db.Column(db.String(36), primary_key=True)
+    branch_id = db.Column(db.String(36), nullable=False, default=DEFAULT_BRANCH, server_default=DEFAULT_BRANCH)
+    ticket_number = db.Column(db.String(20), nullable=False)
+    ticket_type = db.Column(db.String(1), nullable=False)
+    created_at = db.Column(db.DateTime, nullable=True)
+    is_served = db.Column(db.Boolean, default=False)
+    served_at = db.Column(db.DateTime, nullable=True)
+    teller_id = db.Column(db.String(36), db.ForeignKey('teller.id'), nullable=True)
+    is_canceled = db.Column(db.Boolean, default=False)
+    completed = db.Column(db.Boolean, default=False)
+
+    teller = db.relationship('Teller')
+
+    # Archived days are only ever read a whole day at a time, for one
+    # branch or, when rebuilding statistics, for all of them
+    __table_args__ = (
+        db.UniqueConstraint(branch_id, ticket_number, name='uq_ticket_archive_branch_number'),
+        db.Index('ix_ticket_archive_created_at', created_at),
+        db.Index('ix_ticket_archive_branch_created_at', branch_id, created_at),
+    )
+
+    def __repr__(self):
+        return f"<Archived {self.ticket_number}>"
+
+
+# to_json key -> function of its column's value; other keys are the value
+_TICKET_JSON_CONVERTERS = {
+    'status': lambda is_served: "served" if is_served else "pending",
+    'ticket_type': lambda code: Ticket.TICKET_TYPE_LABELS.get(code, "Unknown"),
+    # Same text as strftime('%Y-%m-%d %H:%M:%S'), without parsing a format
+    'issue_date': lambda created_at: created_at.isoformat(' ', 'seconds'),
+}
+
+def ticket_json(record, fields):
+    """
+    Render ``fields`` of a ticket as a dict.
+
+    ``record`` is a Ticket, a TicketArchive or any object with the same
+    attribute names, such as a row selected with ``json_columns(fields)``.
+    """
+    values = {}
+    for field in fields:
+        value = getattr(record, TicketJSONMixin.JSON_COLUMNS[field])
+        convert = _TICKET_JSON_CONVERTERS.get(field)
+        values[field] = convert(value) if convert else value
+    return values
+
+
+@functools.lru_cache(maxsize=64)
+def _ticket_row_plan(fields):
+    positions = {name: i for i, name in enumerate(TicketJSONMixin.json_column_names(fields))}
+    return [
+        (field, positions[TicketJSONMixin.JSON_COLUMNS[field]], _TICKET_JSON_CONVERTERS.get(field))
+        for field in fields
+    ]
+
+def ticket_rows_json(rows, fields):
+    """
+    Render rows selected with ``json_columns(fields)`` as a list of dicts.
+
+    Same output as ticket_json, but each field's column position and
+    converter are worked out once per call instead of once per row, and
+    rows are read by position; this is the list endpoint's hot path.
+    """
+    plan = _ticket_row_plan(tuple(fields))
+    return [
+        {field: convert(row[i]) if convert else row[i] for field, i, convert in plan}
+        for row in rows
+    ]
 
 
 class DailyCounter(db.Model):
     __tablename__ = 'daily_counter'
 
     id = db.Column(db.Integer, primary_key=True)
-    date = db.Column(db.Date, unique=True, nullable=False, default=date.today)
+    # One counter row per branch and day, so branches never wait for each
+    # other's ticket numbers
+    branch_id = db.Column(db.String(36), nullable=False, default=DEFAULT_BRANCH, server_default=DEFAULT_BRANCH)
+    date = db.Column(db.Date, nullable=False, default=date.today)
     last_number = db.Column(db.Integer, default=0)
 
+    __table_args__ = (
+        db.UniqueConstraint(branch_id, date, name='uq_daily_counter_branch_date'),
+    )
+
     @classmethod
-    def get_today_counter(cls):
-        today = date.today()
-        counter = cls.query.filter_by(date=today).first()
-        if not counter:
-            counter = cls(date=today)
-            db.session.add(counter)
-            db.session.commit()
-        return counter
-
-    def increment(self):
-        self.last_number += 1
-        db.session.commit()
-        return self.last_number
+    def reserve(cls, count=1, day=None, connection=None, branch_id=DEFAULT_BRANCH):
+        """
+        Atomically advance the counter for ``branch_id`` and ``day`` by
+        ``count`` and return the new ``last_number``.
+
+        The numbers reserved are ``last_number - count + 1 .. last_number``.
+        The counter row is created on first use, and both cases run as one
+        UPSERT ... RETURNING statement, so concurrent workers never read the
+        same value. Nothing is committed here: by default the statement runs
+        on ``db.session`` and the caller's commit makes it durable together
+        with the rows that use the numbers.
+        """
+        day = day or date.today()
+        executor = db.session if connection is None else connection
+        bind = db.session.get_bind() if connection is None else connection
+        dialect = bind.dialect.name
+        table = cls.__table__
+
+        if dialect in ('sqlite', 'postgresql'):
+            if dialect == 'sqlite':
+                from sqlalchemy.dialects.sqlite import insert
+            else:
+                from sqlalchemy.dialects.postgresql import insert
+            stmt = (
+                insert(table)
+                .values(branch_id=branch_id, date=day, last_number=count)
+                .on_conflict_do_update(
+                    index_elements=[table.c.branch_id, table.c.date],
+                    set_={'last_number': table.c.last_number + count},
+                )
+                .returning(table.c.last_number)
+            )
+            return executor.execute(stmt).scalar_one()
+
+        # Backends without UPSERT ... RETURNING: the UPDATE takes the row lock
+        # for the rest of the transaction, so the SELECT after it is safe.
+        key = (table.c.branch_id == branch_id, table.c.date == day)
+        updated = executor.execute(
+            table.update()
+            .where(*key)
+            .values(last_number=table.c.last_number + count)
+        )
+        if updated.rowcount == 0:
+            executor.execute(table.insert().values(branch_id=branch_id, date=day, last_number=count))
+        return executor.execute(
+            db.select(table.c.last_number).where(*key)
+        ).scalar_one()
+
+    def __repr__(self):
+        return f"<Counter for {self.branch_id} {self.date}: {self.last_number}>"
+
+
+class QueueEvent(db.Model):
+    """
+    Append-only log of queue state changes.
+
+    Rows are added in the same transaction as the change they describe, so
+    the log never disagrees with the tables; the auto-incrementing id is the
+    resume token handed to live feed clients.
+    """
+    __tablename__ = 'queue_event'
+    # Never reuse ids, even once old events are pruned
+    __table_args__ = {'sqlite_autoincrement': True}
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    # Live feeds and queue engines only follow their own branch's events
+    branch_id = db.Column(db.String(36), nullable=False, default=DEFAULT_BRANCH, server_default=DEFAULT_BRANCH)
+    kind = db.Column(db.String(32), nullable=False)
+    payload = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.now, nullable=False, index=True)
 
     def __repr__(self):
-        return f"<Counter for {self.date}: {self.last_number}>"
+        return f"<QueueEvent {self.id} {self.kind}>"
+
+
+def increment_row(model, keys, increments):
+    """
+    Add ``increments`` (column -> amount) to the row of ``model`` identified
+    by ``keys`` (column -> value), creating it if needed.
 
+    Like DailyCounter.reserve this is a single UPSERT on SQLite and
+    PostgreSQL, so concurrent writers never lose an update; it runs in the
+    current session transaction. ``keys`` must match a unique constraint.
+    """
+    table = model.__table__
+    dialect = db.session.get_bind().dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        if dialect == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert
+        db.session.execute(
+            insert(table)
+            .values(**keys, **increments)
+            .on_conflict_do_update(
+                index_elements=[table.c[name] for name in keys],
+                set_={name: table.c[name] + amount for name, amount in increments.items()},
+            )
+        )
+        return
+
+    where = [table.c[name] == value for name, value in keys.items()]
+    updated = db.session.execute(
+        table.update()
+        .where(*where)
+        .values({name: table.c[name] + amount for name, amount in increments.items()})
+    )
+    if updated.rowcount == 0:
+        db.session.execute(table.insert().values(**keys, **increments))
+
+
+class TicketDailyStats(db.Model):
+    """
+    Rollup of ticket activity per branch x day x ticket type x teller, kept
+    up to date by the ticket endpoints. Tickets not yet served by anyone
+    (issued, canceled while waiting) are counted under teller_id ''.
+    """
+    __tablename__ = 'ticket_daily_stats'
+
+    id = db.Column(db.Integer, primary_key=True)
+    branch_id = db.Column(db.String(36), nullable=False, default=DEFAULT_BRANCH, server_default=DEFAULT_BRANCH)
+    day = db.Column(db.Date, nullable=False)
+    ticket_type = db.Column(db.String(1), nullable=False)
+    teller_id = db.Column(db.String(36), nullable=False, default='')
+    issued = db.Column(db.Integer, nullable=False, default=0)
+    served = db.Column(db.Integer, nullable=False, default=0)
+    completed = db.Column(db.Integer, nullable=False, default=0)
+    canceled = db.Column(db.Integer, nullable=False, default=0)
+    # Sum of served_at - created_at over the served tickets, in seconds
+    wait_seconds = db.Column(db.Float, nullable=False, default=0)
+
+    __table_args__ = (
+        db.UniqueConstraint('branch_id', 'day', 'ticket_type', 'teller_id', name='uq_ticket_daily_stats_key'),
+    )
+
+    def __repr__(self):
+        return f"<Stats {self.branch_id} {self.day} {self.ticket_type} {self.teller_id or '-'}>"
+
+
+class TicketWaitHistogram(db.Model):
+    """
+    Served tickets per branch x day x ticket type x teller, bucketed by wait
+    time; ``bucket`` is the bucket's upper bound in seconds.
+    """
+    __tablename__ = 'ticket_wait_histogram'
+
+    id = db.Column(db.Integer, primary_key=True)
+    branch_id = db.Column(db.String(36), nullable=False, default=DEFAULT_BRANCH, server_default=DEFAULT_BRANCH)
+    day = db.Column(db.Date, nullable=False)
+    ticket_type = db.Column(db.String(1), nullable=False)
+    teller_id = db.Column(db.String(36), nullable=False)
+    bucket = db.Column(db.Integer, nullable=False)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        db.UniqueConstraint('branch_id', 'day', 'ticket_type', 'teller_id', 'bucket', name='uq_ticket_wait_histogram_key'),
+    )
+
+    def __repr__(self):
+        return f"<WaitHistogram {self.day} {self.ticket_type} {self.teller_id} <={self.bucket}s: {self.count}>"
+
+
+class ListVersion(db.Model):
+    """
+    Change counters behind the ETags of the list endpoints, one row per
+    scope (e.g. 'tickets:main:2026-01-31:pending' or 'tellers:main').
+    Bumped in the same transaction as the change, so a version can be
+    compared without reading the lists themselves.
+    """
+    __tablename__ = 'list_version'
+
+    id = db.Column(db.Integer, primary_key=True)
+    scope = db.Column(db.String(100), unique=True, nullable=False)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<ListVersion {self.scope} {self.version}>"
+
+
+class IdempotencyKey(db.Model):
+    """
+    The response to a write request sent with an Idempotency-Key header.
+
+    Added in the same transaction as the write, so a key is stored exactly
+    when its write committed; retries with the key are answered from here.
+    Keys are scoped to a branch and a view and expire after
+    IDEMPOTENCY_KEY_TTL_HOURS.
+    """
+    __tablename__ = 'idempotency_key'
+
+    branch_id = db.Column(db.String(36), primary_key=True)
+    endpoint = db.Column(db.String(40), primary_key=True)
+    key = db.Column(db.String(255), primary_key=True)
+    # Hash of the request, to refuse a key reused for a different request
+    fingerprint = db.Column(db.String(64), nullable=False)
+    status_code = db.Column(db.Integer, nullable=False)
+    body = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.now, nullable=False, index=True)
+
+    def __repr__(self):
+        return f"<IdempotencyKey {self.branch_id} {self.endpoint} {self.key}>"
@@ -1,9 +1,35 @@
-from flask import Flask
+import click
+from flask import Flask, current_app
+from flask.cli import AppGroup
+from flask_migrate import stamp, upgrade
 from flasgger import Swagger
 from app.modules.ticket import ticket_bp
-from app.db.db import Teller, db
+from app.db.db import DEFAULT_BRANCH, Branch, Teller, bcrypt, configure_sqlite, db
+from app.modules.ticket.archive import archive_cutoff, archive_tickets
+from app.modules.ticket.events import init_event_broker
+from app.modules.ticket.group_commit import init_group_commit
+from app.modules.ticket.idempotency import init_idempotency
+from app.modules.ticket.numbering import init_numbering
+from app.modules.ticket.queue import init_queue_engine
+from app.modules.ticket.route import insert_tickets
+from app.modules.ticket.stats import rebuild_stats
+from app.modules.ticket.versions import bump_versions, tellers_scope
+from app.utils.admission import init_admission
+from app.utils.concurrency import gevent_patched
+from app.utils.json_provider import init_json_provider
+from app.utils.metrics import init_metrics
+from app.utils.passwords import init_password_hasher
+from app.utils.response_cache import init_response_cache
 
-def create_tellers():
+def create_branch(branch_id, name):
+    """Add a branch unless it exists; True if it was added"""
+    if db.session.get(Branch, branch_id):
+        return False
+    db.session.add(Branch(id=branch_id, name=name))
+    db.session.commit()
+    return True
+
+def create_tellers(branch_id=DEFAULT_BRANCH, count=6):
     # Dictionary of tellers
     tellers = {
         'A': {'name': 'Teller A', 'is_active': False},
@@ -14,20 +40,23 @@ def create_tellers():
         'F': {'name': 'Teller F', 'is_active': False}
     }
     
-    # Check if tellers already exist in the database
-    existing_tellers = Teller.query.all()
+    # Check if the branch already has tellers
+    existing_tellers = db.session.query(Teller.id).filter_by(branch_id=branch_id).first()
     if existing_tellers:
         print("Tellers already exist in the database. Skipping creation.")
         return "Tellers already exist!"
 
     # Create instances of the Teller class
-    for teller_id, teller_info in tellers.items():
+    for teller_id, teller_info in list(tellers.items())[:count]:
         teller = Teller(
+            branch_id=branch_id,
             name=teller_info['name'],
             is_active=teller_info['is_active']
         )
         db.session.add(teller)
     
+    bump_versions([tellers_scope(branch_id)])
+
     # Commit the changes to the database
     db.session.commit()
     
@@ -37,13 +66,135 @@ def create_tellers():
 def initialize_route(app: Flask):
     with app.app_context():
         app.register_blueprint(ticket_bp, url_prefix='/api')
+        # The same routes for any branch; /api is the default branch
+        app.register_blueprint(ticket_bp, url_prefix='/api/branches/<branch_id>', name='branch')
+
+
+bqms_cli = AppGroup('bqms', help='Ticket system database commands.')
+
+
+# The schema that db.create_all() built before migrations were tracked
+BASELINE_REVISION = '0e9b6e9e495c'
+
+
+@bqms_cli.command('init-db')
+def init_db_command():
+    """Create or migrate the schema to the latest revision and seed the tellers."""
+    inspector = db.inspect(db.engine)
+    tables = inspector.get_table_names()
+    if not tables:
+        db.create_all()
+        # The tables match the models, so every migration is already applied
+        stamp()
+    else:
+        # Never create_all on an existing schema: tables it adds would make
+        # the migrations that create them fail
+        if 'alembic_version' not in tables and 'ticket' in tables and 'completed' in {
+            column['name'] for column in inspector.get_columns('ticket')
+        }:
+            stamp(revision=BASELINE_REVISION)
+        upgrade()
+    create_branch(DEFAULT_BRANCH, 'Main branch')
+    click.echo(create_tellers())
+
+
+@bqms_cli.command('create-branch')
+@click.argument('branch_ids', nargs=-1, required=True)
+@click.option('--name', help='Display name (default: the branch id); only with a single branch.')
+@click.option('--tellers', type=click.IntRange(0, 6), default=6, show_default=True, help='Tellers to seed per branch.')
+def create_branch_command(branch_ids, name, tellers):
+    """Add branches, each with its own tellers and ticket numbering."""
+    if name and len(branch_ids) > 1:
+        raise click.UsageError('--name needs a single branch id')
+    for branch_id in branch_ids:
+        if not create_branch(branch_id, name or branch_id):
+            click.echo(f'Branch {branch_id} already exists.')
+        if tellers:
+            create_tellers(branch_id, tellers)
+    click.echo(f'{len(branch_ids)} branch(es) ready.')
+
+@bqms_cli.command('rebuild-stats')
+@click.option('--from', 'start', required=True, type=click.DateTime(formats=['%Y-%m-%d']))
+@click.option('--to', 'end', required=True, type=click.DateTime(formats=['%Y-%m-%d']))
+def rebuild_stats_command(start, end):
+    """Recompute the daily statistics rollup from the ticket tables."""
+    tickets = rebuild_stats(start.date(), end.date())
+    click.echo(f'Rebuilt statistics from {tickets} tickets.')
+
+
+@bqms_cli.command('archive-tickets')
+@click.option('--days', type=int, help='Keep this many days in the ticket table (default TICKET_RETENTION_DAYS).')
+@click.option('--batch-size', type=int, help='Tickets moved per transaction (default TICKET_ARCHIVE_BATCH_SIZE).')
+def archive_tickets_command(days, batch_size):
+    """Move old tickets to the ticket_archive table; meant to run nightly."""
+    config = current_app.config
+    before = archive_cutoff(config['TICKET_RETENTION_DAYS'] if days is None else days)
+    moved = archive_tickets(before, batch_size or config['TICKET_ARCHIVE_BATCH_SIZE'])
+    click.echo(f'Archived {moved} tickets created before {before:%Y-%m-%d}.')
+
+
+def initialize_cli(app: Flask):
+    app.cli.add_command(bqms_cli)
 
 
 def initialize_db(app: Flask):
+    # No database I/O here: every worker and test app runs this at start-up.
+    # Schema and seed data are managed with `flask bqms init-db` and
+    # `flask db upgrade`.
+    uri = app.config['SQLALCHEMY_DATABASE_URI']
+    if uri.startswith('sqlite') and ':memory:' not in uri and uri != 'sqlite://' and gevent_patched():
+        # SQLite waits for a lock inside C, which stalls every greenlet of
+        # the worker, including the one holding the lock. With a single
+        # connection greenlets queue for it cooperatively instead; SQLite
+        # runs one statement at a time anyway.
+        if app.config.get('TICKET_NUMBER_BLOCK_SIZE', 0) > 1:
+            # A block lease commits on a second connection while the request
+            # holds the only one, and would wait for it forever
+            raise RuntimeError(
+                'TICKET_NUMBER_BLOCK_SIZE cannot be used with SQLite under gevent; unset it or use threaded workers'
+            )
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = dict(
+            app.config['SQLALCHEMY_ENGINE_OPTIONS'], pool_size=1, max_overflow=0,
+        )
     with app.app_context():
         db.init_app(app)
-        db.create_all()
-        create_tellers()
+        if db.engine.dialect.name == 'sqlite':
+            configure_sqlite(
+                db.engine,
+                app.config['SQLITE_JOURNAL_MODE'],
+                app.config['SQLITE_SYNCHRONOUS'],
+                app.config['SQLITE_BUSY_TIMEOUT'],
+            )
+
+def initialize_passwords(app: Flask):
+    init_password_hasher(app, bcrypt)
+
+def initialize_events(app: Flask):
+    init_event_broker(app)
+
+def initialize_queue(app: Flask):
+    init_queue_engine(app)
+
+def initialize_numbering(app: Flask):
+    init_numbering(app)
+
+def initialize_group_commit(app: Flask):
+    init_group_commit(app, insert_tickets)
+
+def initialize_idempotency(app: Flask):
+    init_idempotency(app)
+
+def initialize_json(app: Flask):
+    init_json_provider(app)
+
+def initialize_response_cache(app: Flask):
+    init_response_cache(app)
+
+def initialize_metrics(app: Flask):
+    init_metrics(app)
+
+def initialize_admission(app: Flask):
+    init_admission(app)
 
 def initialize_swagger(app: Flask):
     with app.app_context():
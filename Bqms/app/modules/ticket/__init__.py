@@ -1,9 +1,8 @@
-
-
 from flask import Blueprint
 
 
 ticket_bp = Blueprint('main', __name__)
 
+import app.modules.ticket.branches
 import app.modules.ticket.route
 import app.modules.ticket.auth
@@ -0,0 +1,53 @@
+from datetime import datetime, timedelta
+
+from app.db.db import Ticket, TicketArchive, db
+
+ARCHIVE_COLUMNS = [column.name for column in Ticket.__table__.columns]
+
+
+def archive_cutoff(retention_days, today=None):
+    """Start of the oldest day that stays in the hot table"""
+    today = today or datetime.now().date()
+    return datetime.combine(today - timedelta(days=retention_days), datetime.min.time())
+
+
+def archive_tickets(before, batch_size):
+    """
+    Move tickets of every branch created before ``before`` from ``ticket``
+    to ``ticket_archive`` and return how many were moved.
+
+    Works oldest first in batches of ``batch_size``, each copied and deleted
+    in its own short transaction, so live requests are never locked out for
+    long and an interrupted run simply resumes where it stopped.
+    """
+    moved = 0
+    while True:
+        ids = db.session.execute(
+            db.select(Ticket.id)
+            .where(Ticket.created_at < before)
+            .order_by(Ticket.created_at, Ticket.id)
+            .limit(batch_size)
+        ).scalars().all()
+        if not ids:
+            return moved
+
+        db.session.execute(
+            db.insert(TicketArchive).from_select(
+                ARCHIVE_COLUMNS,
+                db.select(*[Ticket.__table__.c[name] for name in ARCHIVE_COLUMNS]).where(Ticket.id.in_(ids)),
+            )
+        )
+        db.session.execute(db.delete(Ticket).where(Ticket.id.in_(ids)))
+        db.session.commit()
+        moved += len(ids)
+
+
+def ticket_models_for(day):
+    """
+    The tables that may hold tickets issued on ``day``: only ``ticket`` for
+    today, both ``ticket_archive`` and ``ticket`` for past days, since the
+    archive job may have moved all, some or none of them.
+    """
+    if day >= datetime.now().date():
+        return (Ticket,)
+    return (TicketArchive, Ticket)
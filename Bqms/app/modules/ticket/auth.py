@@ -2,6 +2,16 @@ from flask import jsonify, request
 from flask_jwt_extended import create_access_token, create_refresh_token, get_jwt_identity, jwt_required
 from app.db.db import User, db
 from app.modules.ticket import ticket_bp
+from app.utils.passwords import PasswordHasherBusy
+
+
+def password_hasher_busy():
+    response = jsonify({
+        'status' : 'error',
+        'message' : 'Too many sign-in requests, please retry shortly.',
+    })
+    response.headers['Retry-After'] = '1'
+    return response, 503
 
 @ticket_bp.route('/register', methods=['POST'])
 def register_admin_user():
@@ -45,6 +55,9 @@ def register_admin_user():
             'message': 'User created successfully',
             'user': new_user.to_json()
         }), 201
+    except PasswordHasherBusy:
+        db.session.rollback()
+        return password_hasher_busy()
     except Exception as e:
         db.session.rollback()
         return jsonify({
@@ -68,11 +81,20 @@ def login_admin_user():
     # Find the user
     user = User.query.filter_by(username=data['username']).first()
     
-    if not user or not user.verify_password(data['password']):
-        return jsonify({
-            'status' : 'error',
-            'message' : 'Invalid username or password.',
-        }, 401)
+    try:
+        if not user or not user.verify_password(data['password']):
+            return jsonify({
+                'status' : 'error',
+                'message' : 'Invalid username or password.',
+            }, 401)
+        
+        # Upgrade the stored hash if the configured bcrypt cost changed
+        if user.password_needs_rehash():
+            user.password = data['password']
+            db.session.commit()
+    except PasswordHasherBusy:
+        db.session.rollback()
+        return password_hasher_busy()
     
     # generate JWT token for the user
     access_token = create_access_token(identity=user)
@@ -0,0 +1,46 @@
+from flask import g, jsonify
+
+from app.db.db import DEFAULT_BRANCH, Branch, db
+from app.modules.ticket import ticket_bp
+
+# Every ticket_bp route is served twice: under /api for the default branch
+# and under /api/branches/<branch_id> for any branch (see initialize_route).
+# The branch id is taken off the URL before the view runs, so views ask
+# current_branch() instead of taking a branch_id argument.
+
+# Branches are never deleted, so a branch seen once needs no more lookups
+_known_branches = {DEFAULT_BRANCH}
+
+
+def current_branch():
+    """Id of the branch the current request is for"""
+    return g.get('branch_id', DEFAULT_BRANCH)
+
+
+def branch_exists(branch_id):
+    if branch_id in _known_branches:
+        return True
+    if db.session.get(Branch, branch_id) is None:
+        return False
+    _known_branches.add(branch_id)
+    return True
+
+
+@ticket_bp.url_value_preprocessor
+def pull_branch(endpoint, values):
+    g.branch_id = values.pop('branch_id', DEFAULT_BRANCH) if values else DEFAULT_BRANCH
+
+
+@ticket_bp.url_defaults
+def add_branch(endpoint, values):
+    # url_for() from a branch-scoped request stays in that branch
+    if 'branch_id' in g and g.branch_id != DEFAULT_BRANCH and endpoint.startswith('branch.'):
+        values.setdefault('branch_id', g.branch_id)
+
+
+@ticket_bp.before_request
+def check_branch():
+    if not branch_exists(current_branch()):
+        return jsonify({
+            'status': 'error',
+            'message': 'Branch not found'}), 404
@@ -0,0 +1,244 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import event
+from app.db.db import QueueEvent, db
+from app.modules.ticket.versions import bump_versions, event_scopes
+
+logger = logging.getLogger(__name__)
+
+
+def record_event(kind, **records):
+    """
+    Add a queue event describing ``records`` to the current session.
+
+    ``records`` are models of one branch with a to_json method (e.g.
+    ticket=..., teller=...). The event, and the list versions it bumps,
+    commit or roll back together with the change it describes; subscribers
+    in this worker are woken as soon as the session commits.
+    """
+    # Flush first so column defaults (ids, created_at) are in the snapshot
+    db.session.flush()
+    branch_id = next(record.branch_id for record in records.values() if record is not None)
+    payload = {name: record.to_json() for name, record in records.items() if record is not None}
+    db.session.add(QueueEvent(branch_id=branch_id, kind=kind, payload=json.dumps(payload)))
+    bump_versions(event_scopes(kind, payload, branch_id))
+    db.session.info['queue_events'] = True
+
+
+def record_events(kind, payloads, branch_id):
+    """
+    Add one ``kind`` event of ``branch_id`` per payload dict to the current
+    session, with a single multi-row INSERT; used by the bulk ticket paths.
+    """
+    now = datetime.now()
+    db.session.execute(
+        db.insert(QueueEvent),
+        [
+            {'branch_id': branch_id, 'kind': kind, 'payload': json.dumps(payload), 'created_at': now}
+            for payload in payloads
+        ],
+    )
+    bump_versions(scope for payload in payloads for scope in event_scopes(kind, payload, branch_id))
+    db.session.info['queue_events'] = True
+
+
+def _after_commit(session):
+    if session.info.pop('queue_events', False):
+        broker = current_app.extensions.get('event_broker')
+        if broker:
+            broker.notify()
+
+
+def _after_rollback(session):
+    session.info.pop('queue_events', None)
+
+
+class EventBroker:
+    """
+    Fans queue events out to the live feed subscribers of one worker.
+
+    The queue_event table is the broker between workers: a single background
+    thread per worker polls it for rows past the last id it has seen, keeps
+    the most recent ones in memory and wakes every subscriber, so N open
+    feeds cost one query per poll interval rather than N. The worker that
+    commits an event polls immediately instead of waiting for the interval.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.poll_interval = app.config['EVENT_POLL_INTERVAL']
+        self.heartbeat = app.config['EVENT_HEARTBEAT']
+        self.buffer_size = app.config['EVENT_BUFFER_SIZE']
+        self.replay_limit = app.config['EVENT_REPLAY_LIMIT']
+        self.retention = timedelta(hours=app.config['EVENT_RETENTION_HOURS'])
+
+        self._cond = threading.Condition()
+        self._wakeup = threading.Event()
+        self._start_lock = threading.Lock()
+        self._recent = deque()
+        self._last_id = 0
+        # Every event with an id above _floor is in _recent
+        self._floor = 0
+        self._gap = None
+        self._pruned_at = 0.0
+        self._thread = None
+        self._pid = None
+
+    def notify(self):
+        """Poll now rather than at the next interval"""
+        self._wakeup.set()
+
+    def stream(self, branch_id, last_id=None):
+        """
+        Yield Server-Sent Events for every queue event of ``branch_id``
+        after ``last_id``.
+
+        Without ``last_id`` the stream starts at the newest event. If the
+        client is too far behind to replay, a ``reset`` event tells it to
+        reload its lists and continue from the newest event.
+        """
+        self.start()
+        cursor = self.last_id if last_id is None else last_id
+        yield f"retry: {int(self.poll_interval * 2000)}\n\n"
+        while True:
+            events = self.events_after(cursor)
+            # Do not hold a connection for the lifetime of the stream
+            db.session.close()
+            if events is None:
+                cursor = self.last_id
+                yield f"id: {cursor}\nevent: reset\ndata: {{}}\n\n"
+                continue
+            for event_id, kind, payload, event_branch in events:
+                # Ids are shared by all branches; a resuming client only
+                # needs the last one it received
+                if event_branch == branch_id:
+                    yield f"id: {event_id}\nevent: {kind}\ndata: {payload}\n\n"
+                cursor = event_id
+            if events:
+                continue
+            with self._cond:
+                idle = self._last_id <= cursor and not self._cond.wait(self.heartbeat)
+            # Yield outside the lock: the generator stays suspended until the
+            # client has taken the data, and a slow one must not stall the
+            # poller and every other subscriber
+            if idle:
+                yield ": keepalive\n\n"
+
+    @property
+    def last_id(self):
+        """Id of the newest event this worker has seen"""
+        return self._last_id
+
+    def events_after(self, cursor):
+        """
+        ``(id, kind, payload, branch_id)`` tuples for the events after
+        ``cursor``, or None if there are more than EVENT_REPLAY_LIMIT of them.
+        """
+        with self._cond:
+            if cursor >= self._floor:
+                events = []
+                for item in reversed(self._recent):
+                    if item[0] <= cursor:
+                        break
+                    events.append(item)
+                events.reverse()
+                return events
+            floor = self._floor
+
+        # The reader is behind the in-memory window: replay from the table
+        rows = db.session.execute(
+            db.select(QueueEvent.id, QueueEvent.kind, QueueEvent.payload, QueueEvent.branch_id)
+            .where(QueueEvent.id > cursor, QueueEvent.id <= floor)
+            .order_by(QueueEvent.id)
+            .limit(self.replay_limit + 1)
+        ).all()
+        if len(rows) > self.replay_limit:
+            return None
+        return [tuple(row) for row in rows] + self.events_after(floor)
+
+    def start(self):
+        """Start this worker's poller thread if it is not running yet"""
+        # Started lazily so the thread lives in the worker process, not in a
+        # master process that preloaded the app before forking
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            last_id = db.session.execute(db.select(db.func.max(QueueEvent.id))).scalar() or 0
+            with self._cond:
+                self._recent.clear()
+                self._last_id = self._floor = last_id
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='queue-event-broker', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        with self.app.app_context():
+            while True:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+                try:
+                    self._poll()
+                    self._prune()
+                except Exception:
+                    logger.exception('Polling queue events failed')
+                finally:
+                    db.session.remove()
+
+    def _poll(self):
+        rows = db.session.execute(
+            db.select(QueueEvent.id, QueueEvent.kind, QueueEvent.payload, QueueEvent.branch_id)
+            .where(QueueEvent.id > self._last_id)
+            .order_by(QueueEvent.id)
+            .limit(self.buffer_size)
+        ).all()
+
+        # On backends where ids are handed out before commit, a missing id
+        # may still be in flight; wait briefly for it rather than skip it.
+        # Ids from rolled back transactions never appear, so give up after
+        # a few polls.
+        expected = self._last_id + 1
+        accepted = []
+        for row in rows:
+            if row.id != expected and not self._gap_expired(expected):
+                break
+            accepted.append(tuple(row))
+            expected = row.id + 1
+        if not accepted:
+            return
+
+        with self._cond:
+            self._recent.extend(accepted)
+            self._last_id = accepted[-1][0]
+            while len(self._recent) > self.buffer_size:
+                self._floor = self._recent.popleft()[0]
+            self._cond.notify_all()
+
+    def _gap_expired(self, missing_id):
+        now = time.monotonic()
+        if self._gap is None or self._gap[0] != missing_id:
+            self._gap = (missing_id, now)
+        return now - self._gap[1] > self.poll_interval * 4
+
+    def _prune(self):
+        now = time.monotonic()
+        if now - self._pruned_at < 3600:
+            return
+        self._pruned_at = now
+        QueueEvent.query.filter(QueueEvent.created_at < datetime.now() - self.retention).delete()
+        db.session.commit()
+
+
+def init_event_broker(app):
+    app.extensions['event_broker'] = EventBroker(app)
+    if not event.contains(db.session, 'after_commit', _after_commit):
+        event.listen(db.session, 'after_commit', _after_commit)
+        event.listen(db.session, 'after_rollback', _after_rollback)
@@ -0,0 +1,118 @@
+import csv
+import io
+import zlib
+from datetime import datetime
+
+from flask import current_app
+
+from app.db.db import Teller, Ticket, TicketArchive, db, ticket_rows_json
+
+# format argument of GET /api/ticket/export -> mimetype
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+
+def export_chunks(branch_id, start, end, fields, chunk_size):
+    """
+    Yield the tickets ``branch_id`` issued on the days ``start`` to ``end``
+    (inclusive), oldest first, as lists of at most ``chunk_size`` dicts with
+    the given to_json ``fields``.
+
+    Memory use does not depend on the range. Backends with server-side
+    cursors and a pool of several connections stream one query with
+    yield_per; elsewhere (SQLite) each chunk is its own short query keyed on
+    (created_at, id) and the connection goes back to the pool between
+    chunks, so a slow download never holds a gevent worker's only
+    connection. Either way each statement reads ticket_archive and ticket
+    together, so tickets the archive job moves during the export are still
+    sent exactly once.
+    """
+    first = datetime.combine(start, datetime.min.time())
+    last = datetime.combine(end, datetime.max.time())
+
+    def merged(after=None, limit=None):
+        selects = []
+        for model in (TicketArchive, Ticket):
+            query = db.select(*model.json_columns(fields)).where(
+                model.branch_id == branch_id,
+                model.created_at.between(first, last),
+            )
+            if 'Teller' in fields:
+                query = query.outerjoin(Teller, model.teller_id == Teller.id)
+            if after:
+                created_at, ticket_id = after
+                query = query.where(db.or_(
+                    model.created_at > created_at,
+                    db.and_(model.created_at == created_at, model.id > ticket_id),
+                ))
+            if limit:
+                # Each table's first rows past the cursor are enough
+                query = db.select(query.order_by(model.created_at, model.id).limit(limit).subquery())
+            selects.append(query)
+        tickets = db.union_all(*selects).subquery()
+        query = db.select(tickets).order_by(tickets.c.created_at, tickets.c.id)
+        return query.limit(limit) if limit else query
+
+    chunks = _cursor_chunks(merged(), chunk_size) if _streams_with_cursor() else _keyset_chunks(merged, chunk_size)
+    for rows in chunks:
+        yield ticket_rows_json(rows, fields)
+
+
+def _streams_with_cursor():
+    engine = db.engine
+    pool_size = getattr(engine.pool, 'size', None)
+    return engine.dialect.supports_server_side_cursors and pool_size is not None and pool_size() > 1
+
+
+def _cursor_chunks(query, chunk_size):
+    result = db.session.execute(query, execution_options={'yield_per': chunk_size})
+    try:
+        yield from result.partitions()
+    finally:
+        result.close()
+
+
+def _keyset_chunks(query_after, chunk_size):
+    """Chunks of ``query_after(after, limit)``, each read by its own statement"""
+    after = None
+    while True:
+        rows = db.session.execute(query_after(after, chunk_size)).all()
+        # Do not hold a connection while the client reads the chunk
+        db.session.close()
+        if rows:
+            yield rows
+        if len(rows) < chunk_size:
+            return
+        after = rows[-1].created_at, rows[-1].id
+
+
+def ndjson_lines(chunks):
+    """One JSON object per line, one string per chunk"""
+    dumps = current_app.json.dumps
+    for tickets in chunks:
+        yield ''.join(dumps(ticket) + '\n' for ticket in tickets)
+
+
+def csv_lines(chunks, fields):
+    """A header row, then one string of CSV rows per chunk"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(fields)
+    yield buffer.getvalue()
+    for tickets in chunks:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows([ticket[field] for field in fields] for ticket in tickets)
+        yield buffer.getvalue()
+
+
+def gzip_stream(chunks, level):
+    """Compress a stream of strings into a single gzip member as it goes"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode())
+        if data:
+            yield data
+    yield compressor.flush()
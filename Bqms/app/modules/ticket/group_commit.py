@@ -0,0 +1,122 @@
+import threading
+
+from app.db.db import db
+
+
+class _Batch:
+    def __init__(self):
+        self.items = []
+        self.full = threading.Event()
+        self.done = threading.Event()
+        self.results = []
+        self.errors = []
+
+
+class TicketGroupCommitter:
+    """
+    Coalesces the single-ticket creations of one worker into shared
+    transactions (group commit).
+
+    The first caller to arrive opens a batch and leads it: it waits up to
+    ``window`` seconds, or until ``max_size`` callers have joined, then
+    inserts every ticket of the batch with ``insert(ticket_types, branch_id)``
+    (one call per branch) and commits once. The others block until that
+    commit is done, so each caller still gets its own ticket and only
+    returns once the ticket is durable.
+
+    If the shared commit fails, the leader retries each ticket in its own
+    transaction, so a failing request (e.g. one repeating an
+    Idempotency-Key) only fails itself.
+    """
+
+    def __init__(self, insert, window, max_size):
+        self.insert = insert
+        self.window = window
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._batch = None
+
+    def submit(self, branch_id, ticket_type, on_insert=None):
+        """
+        Create one ticket through the current batch and return its to_json
+        dict. ``on_insert(ticket)`` is called, on the leader's thread, once
+        the ticket is in the batch's transaction and before it commits.
+        """
+        with self._lock:
+            batch = self._batch
+            leader = batch is None
+            if leader:
+                batch = self._batch = _Batch()
+            index = len(batch.items)
+            batch.items.append((branch_id, ticket_type, on_insert))
+            if len(batch.items) >= self.max_size:
+                self._close(batch)
+
+        if leader:
+            batch.full.wait(self.window)
+            with self._lock:
+                self._close(batch)
+            self._flush(batch)
+        else:
+            batch.done.wait()
+
+        if batch.errors[index] is not None:
+            raise batch.errors[index]
+        return batch.results[index]
+
+    def _close(self, batch):
+        # Called with the lock held; later callers start the next batch
+        if self._batch is batch:
+            self._batch = None
+        batch.full.set()
+
+    def _flush(self, batch):
+        try:
+            batch.results = self._insert(batch.items)
+            db.session.commit()
+            batch.errors = [None] * len(batch.items)
+        except Exception as e:
+            db.session.rollback()
+            if len(batch.items) == 1:
+                batch.results, batch.errors = [None], [e]
+            else:
+                self._flush_each(batch)
+        finally:
+            batch.done.set()
+
+    def _flush_each(self, batch):
+        batch.results, batch.errors = [], []
+        for item in batch.items:
+            try:
+                batch.results += self._insert([item])
+                db.session.commit()
+                batch.errors.append(None)
+            except Exception as e:
+                db.session.rollback()
+                batch.results.append(None)
+                batch.errors.append(e)
+
+    def _insert(self, items):
+        """Insert the tickets of ``items`` in the current transaction; their dicts in order"""
+        # branch_id -> [(index, ticket_type, on_insert)], in arrival order
+        groups = {}
+        for index, (branch_id, ticket_type, on_insert) in enumerate(items):
+            groups.setdefault(branch_id, []).append((index, ticket_type, on_insert))
+        results = [None] * len(items)
+        for branch_id, group in groups.items():
+            tickets = self.insert([ticket_type for _, ticket_type, _ in group], branch_id)
+            for (index, _, on_insert), ticket in zip(group, tickets):
+                if on_insert:
+                    on_insert(ticket)
+                results[index] = ticket
+        return results
+
+
+def init_group_commit(app, insert):
+    """Register the committer when TICKET_GROUP_COMMIT is on"""
+    if app.config.get('TICKET_GROUP_COMMIT'):
+        app.extensions['ticket_committer'] = TicketGroupCommitter(
+            insert,
+            app.config['TICKET_GROUP_COMMIT_WINDOW_MS'] / 1000,
+            app.config['TICKET_GROUP_COMMIT_MAX'],
+        )
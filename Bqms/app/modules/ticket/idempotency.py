@@ -0,0 +1,181 @@
+import hashlib
+import json
+import time
+from datetime import datetime, timedelta
+from functools import wraps
+
+from flask import current_app, g, jsonify, make_response, request
+from sqlalchemy.exc import IntegrityError
+
+from app.db.db import IdempotencyKey, db
+from app.modules.ticket.branches import current_branch
+from app.utils.cache import TTLCache
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+
+# Seconds between deletions of expired keys, per worker
+PRUNE_INTERVAL = 3600
+_pruned_at = 0.0
+
+
+def _ttl():
+    return timedelta(hours=current_app.config['IDEMPOTENCY_KEY_TTL_HOURS'])
+
+
+class PendingKey:
+    """
+    An Idempotency-Key sent with a request whose write has not committed
+    yet. Holds everything it needs, so the group committer can stage it
+    from another request's thread.
+    """
+
+    def __init__(self, branch_id, endpoint, key, fingerprint):
+        self.branch_id = branch_id
+        self.endpoint = endpoint
+        self.key = key
+        self.fingerprint = fingerprint
+        self.staged = None
+
+    @property
+    def cache_key(self):
+        return f'{self.branch_id}:{self.endpoint}:{self.key}'
+
+    def stage(self, body, status_code):
+        """Add the response to the current session, to commit with the write"""
+        # An expired row may still hold the key until it is pruned
+        db.session.execute(db.delete(IdempotencyKey).where(
+            IdempotencyKey.branch_id == self.branch_id,
+            IdempotencyKey.endpoint == self.endpoint,
+            IdempotencyKey.key == self.key,
+            IdempotencyKey.created_at < datetime.now() - _ttl(),
+        ))
+        self.staged = (self.fingerprint, status_code, current_app.json.dumps(body))
+        db.session.add(IdempotencyKey(
+            branch_id=self.branch_id,
+            endpoint=self.endpoint,
+            key=self.key,
+            fingerprint=self.fingerprint,
+            status_code=status_code,
+            body=self.staged[2],
+        ))
+
+    def stored(self):
+        """(fingerprint, status_code, body) saved for this key, or None"""
+        cache = current_app.extensions['idempotency_cache']
+        stored = cache.get(self.cache_key)
+        if stored is None:
+            row = db.session.execute(
+                db.select(IdempotencyKey.fingerprint, IdempotencyKey.status_code, IdempotencyKey.body).where(
+                    IdempotencyKey.branch_id == self.branch_id,
+                    IdempotencyKey.endpoint == self.endpoint,
+                    IdempotencyKey.key == self.key,
+                    IdempotencyKey.created_at >= datetime.now() - _ttl(),
+                )
+            ).first()
+            if row is None:
+                return None
+            stored = tuple(row)
+            cache.set(self.cache_key, stored)
+        return stored
+
+    def replay(self):
+        """The response to repeat for this key, or None if it has none yet"""
+        stored = self.stored()
+        if stored is None:
+            return None
+        fingerprint, status_code, body = stored
+        if fingerprint != self.fingerprint:
+            return jsonify({
+                'status': 'error',
+                'message': f'{IDEMPOTENCY_HEADER} was already used for a different request'}), 422
+        response = current_app.response_class(body, status=status_code, mimetype=current_app.json.mimetype)
+        response.headers['Idempotent-Replayed'] = 'true'
+        return response
+
+
+def request_fingerprint(view_args):
+    digest = hashlib.sha256(json.dumps(view_args, sort_keys=True, default=str).encode())
+    digest.update(request.get_data())
+    return digest.hexdigest()
+
+
+def pending_key():
+    """The current request's PendingKey, or None if it sent no key"""
+    return g.get('idempotency')
+
+
+def remember_response(body, status_code=200):
+    """
+    Save ``body`` as the response to the current request's
+    Idempotency-Key, if it sent one. Views call this with their success
+    response just before they commit.
+    """
+    pending = pending_key()
+    if pending is not None:
+        pending.stage(body, status_code)
+
+
+def idempotent(view):
+    """
+    Honour the Idempotency-Key header on a write view.
+
+    A request repeating a key that already committed gets the original
+    response again, without running the view: no ticket number is reserved
+    and no row is written. A key reused with a different request gets 422.
+    Requests without the header are unaffected.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        if key is None:
+            return view(*args, **kwargs)
+        if not key or len(key) > MAX_KEY_LENGTH:
+            return jsonify({
+                'status': 'error',
+                'message': f'{IDEMPOTENCY_HEADER} must be 1 to {MAX_KEY_LENGTH} characters'}), 400
+
+        pending = PendingKey(current_branch(), view.__name__, key, request_fingerprint(kwargs))
+        replay = pending.replay()
+        if replay is not None:
+            return replay
+
+        g.idempotency = pending
+        try:
+            response = make_response(view(*args, **kwargs))
+        except IntegrityError:
+            db.session.rollback()
+            replay = pending.replay()
+            if replay is None:
+                raise
+            return replay
+        if pending.staged is not None and response.status_code < 400:
+            current_app.extensions['idempotency_cache'].set(pending.cache_key, pending.staged)
+            _prune()
+        elif response.status_code >= 400:
+            # A concurrent request with the same key may have committed
+            # first and made this one fail; answer as it did
+            replay = pending.replay()
+            if replay is not None:
+                return replay
+        return response
+    return wrapper
+
+
+def _prune():
+    global _pruned_at
+    now = time.monotonic()
+    if now - _pruned_at < PRUNE_INTERVAL:
+        return
+    _pruned_at = now
+    db.session.execute(db.delete(IdempotencyKey).where(IdempotencyKey.created_at < datetime.now() - _ttl()))
+    db.session.commit()
+
+
+def init_idempotency(app):
+    # Recently stored keys, so a retry reaching the same worker skips the
+    # database; entries never change, so caching them is always safe
+    app.extensions['idempotency_cache'] = TTLCache(
+        app.config['IDEMPOTENCY_CACHE_SIZE'],
+        app.config['IDEMPOTENCY_KEY_TTL_HOURS'] * 3600,
+    )
@@ -0,0 +1,57 @@
+import threading
+
+from flask import current_app
+from app.db.db import DailyCounter, db
+
+
+class TicketNumberBlock:
+    """
+    A per-process lease on a contiguous range of one branch's ticket numbers.
+
+    Each worker reserves ``size`` numbers from ``DailyCounter`` at once and
+    hands them out from memory, so the hot path only writes the counter once
+    per block. Numbers from different workers interleave, and a block left
+    unused when a worker exits leaves a gap in the day's sequence.
+    """
+
+    def __init__(self, branch_id):
+        self.branch_id = branch_id
+        self._lock = threading.Lock()
+        self._day = None
+        self._next = 0
+        self._last = -1
+
+    def take(self, day, size):
+        with self._lock:
+            if self._day != day or self._next > self._last:
+                # The lease commits on its own connection: if it rode on the
+                # request's transaction, a rolled back ticket would release
+                # the range in the database while this worker still uses it.
+                with db.engine.begin() as connection:
+                    last = DailyCounter.reserve(size, day=day, connection=connection, branch_id=self.branch_id)
+                self._day, self._next, self._last = day, last - size + 1, last
+            number = self._next
+            self._next += 1
+            return number
+
+
+def reserve_ticket_number(day, branch_id):
+    """
+    Reserve the next ticket number of ``branch_id`` for ``day``.
+
+    Without ``TICKET_NUMBER_BLOCK_SIZE`` the counter is advanced inside the
+    current session transaction, so the number is only used up if the
+    ticket insert commits.
+    """
+    block_size = current_app.config.get('TICKET_NUMBER_BLOCK_SIZE', 0)
+    if block_size > 1:
+        blocks = current_app.extensions['ticket_number_blocks']
+        block = blocks.get(branch_id) or blocks.setdefault(branch_id, TicketNumberBlock(branch_id))
+        return block.take(day, block_size)
+    return DailyCounter.reserve(day=day, branch_id=branch_id)
+
+
+def init_numbering(app):
+    # branch_id -> TicketNumberBlock. Leases belong to the app, so apps on
+    # different databases (e.g. tests) never share a range.
+    app.extensions['ticket_number_blocks'] = {}
@@ -0,0 +1,172 @@
+import heapq
+import json
+import threading
+from datetime import date, datetime
+
+from app.db.db import Teller, Ticket, db
+
+TICKET_TYPE_CODES = {label: code for code, label in Ticket.TICKET_TYPE_LABELS.items()}
+
+
+class QueueEngine:
+    """
+    In-memory view of today's waiting lines and of the free tellers, one
+    BranchQueue per branch, created on first use.
+    """
+
+    def __init__(self, broker):
+        self._broker = broker
+        self._lock = threading.Lock()
+        self._branches = {}
+
+    def branch(self, branch_id):
+        queue = self._branches.get(branch_id)
+        if queue is None:
+            with self._lock:
+                queue = self._branches.setdefault(branch_id, BranchQueue(self._broker, branch_id))
+        return queue
+
+    def pop_next(self, branch_id, ticket_types=None):
+        return self.branch(branch_id).pop_next(ticket_types)
+
+    def has_waiting(self, branch_id, ticket_types=None):
+        return self.branch(branch_id).has_waiting(ticket_types)
+
+    def free_tellers(self, branch_id):
+        return self.branch(branch_id).free_tellers()
+
+    def reset(self, branch_id):
+        self.branch(branch_id).reset()
+
+
+class BranchQueue:
+    """
+    In-memory view of one branch's waiting line and free tellers.
+
+    Pending tickets are kept in one heap per ticket type, ordered by issue
+    time and daily number, so picking the next ticket is O(log n) and never
+    scans the ticket table. The view is loaded from the database on first
+    use and then kept in step with the queue_event log, which every worker
+    commits to, so it converges with changes made by other workers within
+    one event poll interval. Callers must still claim a ticket with a
+    conditional update: another worker may have taken it in the meantime.
+    Each branch has its own lock, so branches never wait for each other.
+    """
+
+    def __init__(self, broker, branch_id):
+        self._broker = broker
+        self.branch_id = branch_id
+        self._lock = threading.Lock()
+        self._day = None
+        self._cursor = 0
+        # ticket_type -> heap of (issue_date, number, ticket_id)
+        self._heaps = {}
+        # ticket_id -> heap entry, for tickets still waiting; entries that
+        # left the line stay in their heap until popped
+        self._pending = {}
+        self._free_tellers = set()
+
+    def pop_next(self, ticket_types=None):
+        """
+        Remove and return the id of the oldest waiting ticket of one of
+        ``ticket_types`` (all types by default), or None if nobody waits.
+        """
+        with self._lock:
+            self._sync()
+            heap = self._first_heap(ticket_types)
+            if heap is None:
+                return None
+            entry = heapq.heappop(heap)
+            del self._pending[entry[2]]
+            return entry[2]
+
+    def has_waiting(self, ticket_types=None):
+        """Whether a ticket of one of ``ticket_types`` is waiting"""
+        with self._lock:
+            self._sync()
+            return self._first_heap(ticket_types) is not None
+
+    def _first_heap(self, ticket_types):
+        # The heap whose top is the oldest waiting ticket of ticket_types
+        best = None
+        for ticket_type in ticket_types or self._heaps:
+            heap = self._heaps.get(ticket_type)
+            while heap and heap[0][2] not in self._pending:
+                heapq.heappop(heap)
+            if heap and (best is None or heap[0] < best[0]):
+                best = heap
+        return best
+
+    def reset(self):
+        """Reload from the database on next use, e.g. after a failed commit"""
+        with self._lock:
+            self._day = None
+
+    def free_tellers(self):
+        """Ids of the tellers believed to be free"""
+        with self._lock:
+            self._sync()
+            return set(self._free_tellers)
+
+    def _sync(self):
+        today = date.today()
+        if self._day != today:
+            self._rebuild(today)
+            return
+        events = self._broker.events_after(self._cursor)
+        if events is None:
+            self._rebuild(today)
+            return
+        for event_id, kind, payload, branch_id in events:
+            if branch_id == self.branch_id:
+                self._apply(kind, json.loads(payload))
+            self._cursor = event_id
+
+    def _rebuild(self, today):
+        self._broker.start()
+        # Events after this id are applied on top of the snapshot; applying
+        # one the snapshot already reflects is harmless
+        cursor = self._broker.last_id
+        rows = db.session.execute(
+            db.select(Ticket.id, Ticket.ticket_type, Ticket.ticket_number, Ticket.created_at).where(
+                Ticket.branch_id == self.branch_id,
+                Ticket.created_at >= datetime.combine(today, datetime.min.time()),
+                Ticket.is_served == False,
+                Ticket.is_canceled == False,
+            )
+        ).all()
+        free_tellers = db.session.execute(
+            db.select(Teller.id).where(Teller.branch_id == self.branch_id, Teller.is_active == False)
+        ).scalars().all()
+
+        self._day, self._cursor = today, cursor
+        self._heaps, self._pending = {}, {}
+        for row in rows:
+            self._push(row.id, row.ticket_type, row.ticket_number, row.created_at.strftime('%Y-%m-%d %H:%M:%S'))
+        self._free_tellers = set(free_tellers)
+
+    def _apply(self, kind, payload):
+        ticket = payload.get('ticket')
+        if ticket:
+            if kind == 'ticket.created':
+                if ticket['issue_date'].startswith(self._day.isoformat()):
+                    self._push(ticket['id'], TICKET_TYPE_CODES.get(ticket['ticket_type']), ticket['ticket_number'], ticket['issue_date'])
+            else:
+                self._pending.pop(ticket['id'], None)
+        teller = payload.get('teller')
+        if teller:
+            if teller['is_active']:
+                self._free_tellers.discard(teller['id'])
+            else:
+                self._free_tellers.add(teller['id'])
+
+    def _push(self, ticket_id, ticket_type, ticket_number, issue_date):
+        if ticket_id in self._pending:
+            return
+        entry = (issue_date, int(ticket_number.rsplit('-', 1)[1]), ticket_id)
+        heapq.heappush(self._heaps.setdefault(ticket_type, []), entry)
+        self._pending[ticket_id] = entry
+
+
+def init_queue_engine(app):
+    app.extensions['queue_engine'] = QueueEngine(app.extensions['event_broker'])
@@ -1,27 +1,124 @@
+import base64
+import binascii
+import random
 from datetime import date, datetime, timedelta
-from sqlite3 import IntegrityError
+from types import SimpleNamespace
 
 from flask_jwt_extended import jwt_required
-from app.db.db import DailyCounter, Teller, Ticket, db
+from sqlalchemy.exc import IntegrityError
+from app.db.db import DailyCounter, Teller, Ticket, TicketArchive, db, generate_uuid, ticket_json, ticket_rows_json
 from app.modules.ticket import ticket_bp
-from flask import jsonify, request
-from datetime import datetime
-from app.db.db import DailyCounter
+from app.modules.ticket.branches import current_branch
+from app.modules.ticket.events import record_event, record_events
+from app.modules.ticket.export import EXPORT_FORMATS, csv_lines, export_chunks, gzip_stream, ndjson_lines
+from app.modules.ticket.idempotency import idempotent, pending_key, remember_response
+from app.modules.ticket.archive import ticket_models_for
+from app.modules.ticket.numbering import reserve_ticket_number
+from app.modules.ticket.stats import count_canceled, count_completed, count_issued, count_served, summarize
+from app.modules.ticket.versions import (
+    TICKET_STATUSES, list_etag, not_modified, tellers_scope, ticket_scopes, with_etag
+)
+from app.utils.response_cache import get_response_cache
+from flask import Response, current_app, jsonify, request, stream_with_context
 
 
 
 
-def generate_ticket_number(ticket_type):
-    """Generate a unique ticket number based on date and type"""
-    counter = DailyCounter.get_today_counter()
-    next_number = counter.increment()
-    
-    today = date.today().strftime('%Y%m%d')
+def format_ticket_number(day, ticket_type, number):
     # Format: YYYYMMDD-TYPE-NUMBER (e.g., 20250411-W-001)
-    ticket_number = f"{today}-{ticket_type}-{next_number:03d}"
-    return ticket_number
+    return f"{day.strftime('%Y%m%d')}-{ticket_type}-{number:03d}"
+
+def generate_ticket_number(ticket_type, branch_id):
+    """Generate a ticket number unique in the branch based on date and type"""
+    today = date.today()
+    next_number = reserve_ticket_number(today, branch_id)
+    return format_ticket_number(today, ticket_type, next_number)
+
+
+def insert_tickets(ticket_types, branch_id):
+    """
+    Insert one new ticket of ``branch_id`` per entry of ``ticket_types`` in
+    the current transaction and return their to_json dicts, in order.
+
+    The numbers come from a single contiguous DailyCounter reservation and
+    the rows (and their queue events) go in with one multi-row INSERT each.
+    """
+    today = date.today()
+    last_number = DailyCounter.reserve(len(ticket_types), day=today, branch_id=branch_id)
+    first_number = last_number - len(ticket_types) + 1
+    now = datetime.now()
+
+    rows = [
+        {
+            'id': generate_uuid(),
+            'branch_id': branch_id,
+            'ticket_number': format_ticket_number(today, ticket_type, first_number + i),
+            'ticket_type': ticket_type,
+            'created_at': now,
+            'is_served': False,
+            'is_canceled': False,
+            'completed': False,
+        }
+        for i, ticket_type in enumerate(ticket_types)
+    ]
+    db.session.execute(db.insert(Ticket), rows)
+
+    tickets = [ticket_json(SimpleNamespace(teller_name=None, **row), Ticket.JSON_COLUMNS) for row in rows]
+    record_events('ticket.created', [{'ticket': ticket} for ticket in tickets], branch_id)
+    count_issued(branch_id, now.date(), ticket_types)
+    return tickets
+
+
+# Assignment is done with conditional UPDATEs rather than read-then-write:
+# of two concurrent requests for the same teller or ticket, the database
+# lets exactly one UPDATE match, and the loser sees a row count of 0.
+# Callers pass ids already checked to belong to the request's branch.
+
+def claim_teller(teller_id):
+    """Mark a free teller busy; False if it was not free"""
+    return db.session.execute(
+        db.update(Teller)
+        .where(Teller.id == teller_id, Teller.is_active == False)
+        .values(is_active=True)
+    ).rowcount == 1
+
+
+def claim_ticket(ticket_id, teller_id):
+    """Mark a waiting ticket served by ``teller_id``; False if it was not waiting"""
+    return db.session.execute(
+        db.update(Ticket)
+        .where(Ticket.id == ticket_id, Ticket.is_served == False, Ticket.is_canceled == False)
+        .values(is_served=True, served_at=datetime.now(), teller_id=teller_id)
+    ).rowcount == 1
+
+
+def release_teller(teller_id):
+    """
+    Mark a teller free. Callers only release a teller after closing the
+    ticket it was serving with a conditional UPDATE that matched, so a
+    ticket that was already closed never frees a teller who has moved on.
+    """
+    return db.session.execute(
+        db.update(Teller)
+        .where(Teller.id == teller_id)
+        .values(is_active=False)
+    ).rowcount == 1
+
+
+def get_in_branch_or_404(model, record_id):
+    """The ``model`` row ``record_id`` if it belongs to the request's branch, else 404"""
+    return model.query.filter_by(id=record_id, branch_id=current_branch()).first_or_404()
+
+
+def created_ticket_body(ticket):
+    return {
+        'ticket': ticket,
+        'message': 'Ticket created successfully'
+    }
+
 
 @ticket_bp.route('/ticket/new', methods=['POST'])
+@idempotent
 def create_ticket():
     """Create a new ticket in the system"""
     data = request.get_json()
@@ -36,21 +133,38 @@ def create_ticket():
         return jsonify({'error': 'Invalid ticket type'}), 400
     
     try:
-        ticket_number = generate_ticket_number(ticket_type)
+        branch_id = current_branch()
+        committer = current_app.extensions.get('ticket_committer')
+        if committer:
+            # Shares a transaction with the other tickets of this instant;
+            # the key is saved in that transaction too
+            pending = pending_key()
+            # Hand back any connection this request holds (e.g. from the
+            # key lookup) before waiting: the batch's leader may need it
+            db.session.close()
+            ticket = committer.submit(
+                branch_id, ticket_type,
+                on_insert=pending and (lambda ticket: pending.stage(created_ticket_body(ticket), 201)),
+            )
+            return jsonify(created_ticket_body(ticket)), 201
+        
+        ticket_number = generate_ticket_number(ticket_type, branch_id)
         
         # Create new ticket
         new_ticket = Ticket(
+            branch_id=branch_id,
             ticket_number=ticket_number,
             ticket_type=ticket_type,
         )
         
         db.session.add(new_ticket)
+        record_event('ticket.created', ticket=new_ticket)
+        count_issued(branch_id, new_ticket.created_at.date(), [ticket_type])
+        body = created_ticket_body(new_ticket.to_json())
+        remember_response(body, 201)
         db.session.commit()
         
-        return jsonify({
-            'ticket': new_ticket.to_json(),
-            'message': 'Ticket created successfully'
-        }), 201
+        return jsonify(body), 201
         
     except IntegrityError:
         db.session.rollback()
@@ -60,7 +174,50 @@ def create_ticket():
         return jsonify({'error': str(e)}), 500
     
 
+@ticket_bp.route('/ticket/batch', methods=['POST'])
+@idempotent
+def create_ticket_batch():
+    """
+    Create several tickets at once, e.g. when a kiosk flushes the requests
+    it buffered while offline. Tickets are numbered in the order given.
+    """
+    data = request.get_json()
+    
+    if not data or not isinstance(data.get('tickets'), list) or not data['tickets']:
+        return jsonify({'error': 'A non-empty tickets list is required'}), 400
+    
+    if len(data['tickets']) > current_app.config['TICKET_BATCH_MAX_SIZE']:
+        return jsonify({'error': f"At most {current_app.config['TICKET_BATCH_MAX_SIZE']} tickets per batch"}), 400
+    
+    ticket_types = []
+    for index, item in enumerate(data['tickets']):
+        ticket_type = str(item.get('ticket_type', '')).upper() if isinstance(item, dict) else ''
+        # Validate ticket type
+        if ticket_type not in Ticket.TICKET_TYPE_LABELS:
+            return jsonify({'error': f'Invalid ticket type at index {index}'}), 400
+        ticket_types.append(ticket_type)
+    
+    try:
+        tickets = insert_tickets(ticket_types, current_branch())
+        body = {
+            'tickets': tickets,
+            'message': f'{len(tickets)} tickets created successfully'
+        }
+        remember_response(body, 201)
+        db.session.commit()
+        
+        return jsonify(body), 201
+        
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({'error': 'Failed to create tickets. Please try again.'}), 500
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+    
+
 @ticket_bp.route('/ticket/cancel', methods=['POST', 'DELETE'])
+@idempotent
 def cancel_ticket():
     """Cancel a ticket in the system"""
     data = request.get_json()
@@ -73,28 +230,49 @@ def cancel_ticket():
     ticket_number = data['ticket_number']
     
     # Find the ticket
-    ticket = Ticket.query.filter_by(ticket_number=ticket_number).first()
+    ticket = Ticket.query.filter_by(branch_id=current_branch(), ticket_number=ticket_number).first()
     
     if not ticket:
         return jsonify({
             'status': 'error',
             'message': 'Ticket not found'}), 404
 
-    if ticket.teller_id:
-        teller = Teller.query.filter_by(id=ticket.teller_id).first()
-        if teller:
-            teller.is_active = False
-        else:
-            pass
-    
     try:
-        ticket.is_canceled = True
-        db.session.commit()
-        
-        return jsonify({
+        # Only cancelling an open ticket frees its teller and is recorded;
+        # cancelling it again, or after it was completed, must not free a
+        # teller who has moved on to another ticket
+        canceled = db.session.execute(
+            db.update(Ticket)
+            .where(
+                Ticket.id == ticket.id,
+                Ticket.is_canceled == False,
+                db.or_(Ticket.completed == False, Ticket.completed == None),
+            )
+            .values(is_canceled=True)
+        ).rowcount
+        if not canceled:
+            # Reload the ticket: it may have been closed since it was read
+            db.session.rollback()
+            if not ticket.is_canceled:
+                return jsonify({
+                    'status': 'error',
+                    'message': 'Ticket service is already completed'}), 409
+        else:
+            # It may have been served since it was read; the row is ours now
+            db.session.refresh(ticket)
+            teller = None
+            if ticket.is_served and ticket.teller_id and release_teller(ticket.teller_id):
+                teller = db.session.get(Teller, ticket.teller_id)
+            record_event('ticket.canceled', ticket=ticket, teller=teller)
+            count_canceled(ticket)
+        body = {
             'status': 'ok',
             'message': 'Ticket cancelled successfully'
-        }), 200
+        }
+        remember_response(body)
+        db.session.commit()
+        
+        return jsonify(body), 200
         
     except Exception as e:
         db.session.rollback()
@@ -111,8 +289,14 @@ def validate_ticket():
     ticket_number = data['ticket_number']
     
     # Find the ticket
-    ticket = Ticket.query.filter_by(ticket_number=ticket_number).first()
+    ticket = Ticket.query.filter_by(branch_id=current_branch(), ticket_number=ticket_number).first()
     
+    if not ticket and TicketArchive.query.filter_by(branch_id=current_branch(), ticket_number=ticket_number).first():
+        return jsonify({
+            'status': 'error',
+            'message': 'Ticket is expired'
+        }), 400
+
     if not ticket:
         return jsonify({
             'status': 'error',
@@ -121,7 +305,7 @@ def validate_ticket():
     #check if the ticket is expired. Ticket is valid for 1 day
     if ticket.created_at < datetime.now() - timedelta(days=1):
         return jsonify({
-            'status ': 'error',
+            'status': 'error',
             'message': 'Ticket is expired'
         }), 400
     
@@ -152,53 +336,216 @@ def get_ticket_list():
     except ValueError:
         return jsonify({'message': 'Invalid date format. Use YYYY-MM-DD'}), 400
     
-    # Query tickets for the specified date - Time range for the whole day
-    start_of_day = datetime.combine(query_date, datetime.min.time())
-    end_of_day = datetime.combine(query_date, datetime.max.time())
-    
-    # Filter by status if provided
+    # Optional projection: only the requested keys of each ticket are selected
+    try:
+        fields = requested_fields()
+    except ValueError as e:
+        return jsonify({'message': f"Unknown fields: {e}"}), 400
+
+    try:
+        limit = int(request.args.get('limit', current_app.config['TICKET_LIST_PAGE_SIZE']))
+    except ValueError:
+        return jsonify({'message': 'limit must be an integer'}), 400
+    limit = max(1, min(limit, current_app.config['TICKET_LIST_MAX_PAGE_SIZE']))
+
+    # Keyset pagination: resume strictly after the last (created_at, id) seen
+    cursor = request.args.get('cursor')
+    after = None
+    if cursor:
+        try:
+            after = decode_cursor(cursor)
+        except ValueError:
+            return jsonify({'message': 'Invalid cursor'}), 400
+
+    # Answer unchanged polls from list_version alone, before the ticket
+    # table is touched
+    branch_id = current_branch()
     status = request.args.get('status')
-    if status == 'pending':
-        tickets = Ticket.query.filter(
-            Ticket.created_at.between(start_of_day, end_of_day),
-            Ticket.is_served == False
-        ).all()
-    elif status == 'served':
-        tickets = Ticket.query.filter(
-            Ticket.created_at.between(start_of_day, end_of_day),
-            Ticket.is_served == True,
-            Ticket.completed == False,
-            Ticket.is_canceled == False
-        ).all()
+    etag = list_etag(
+        ticket_scopes(branch_id, query_date, [status] if status in TICKET_STATUSES else TICKET_STATUSES),
+        branch_id, query_date, status, fields, limit, cursor,
+    )
+    unchanged = not_modified(etag)
+    if unchanged:
+        return unchanged
 
-    elif status == 'completed':
-        tickets = Ticket.query.filter(
-            Ticket.created_at.between(start_of_day, end_of_day),
-            Ticket.is_served == True,
-            Ticket.completed == True
-        ).all()
-    
-    elif status == 'canceled':
-        tickets = Ticket.query.filter(
-            Ticket.created_at.between(start_of_day, end_of_day),
-            Ticket.is_canceled == True
-        ).all()
+    # The ETag names this exact page at these versions, so it is also the
+    # cache key: screens polling the same URL share one query
+    body = get_response_cache().get_or_render(
+        f'ticket_list:{etag}',
+        lambda: render_ticket_list(branch_id, query_date, fields, status, limit, after),
+    )
+    return with_etag(json_response(body), etag), 200
+
+
+def render_ticket_list(branch_id, query_date, fields, status, limit, after):
+    """JSON body of one GET /api/ticket/list page"""
+    # Past days may have been moved, wholly or partly, to the archive table
+    models = ticket_models_for(query_date)
+    # One extra row tells us whether there is a next page
+    queries = [
+        ticket_list_query(model, branch_id, query_date, fields, status, after)
+        .order_by(model.created_at, model.id)
+        .limit(limit + 1)
+        for model in models
+    ]
+    if len(queries) == 1:
+        query = queries[0]
     else:
-        tickets = Ticket.query.filter(
-            Ticket.created_at.between(start_of_day, end_of_day)
-        ).all()
+        # Each table's first page, merged in one statement so a batch the
+        # archive job moves meanwhile is seen in exactly one of them
+        pages = [db.select(query.subquery()) for query in queries]
+        page = db.union_all(*pages).subquery()
+        query = db.select(page).order_by(page.c.created_at, page.c.id).limit(limit + 1)
+
+    rows = db.session.execute(query).all()
+    next_cursor = encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+    tickets = rows[:limit]
     
     return jsonify({
         'status': 'ok',
         'message': 'Ticket list retrieved successfully',
         'date': query_date.strftime('%Y-%m-%d'),
         'total_tickets': len(tickets),
-        'tickets': [ticket.to_json() for ticket in tickets]
-    }), 200
+        'next_cursor': next_cursor,
+        'tickets': ticket_rows_json(tickets, fields)
+    }).get_data()
+
+
+def ticket_list_query(model, branch_id, query_date, fields, status, after):
+    """SELECT of the ``model`` rows a list page is taken from, unordered"""
+    # Query tickets for the specified date - Time range for the whole day
+    start_of_day = datetime.combine(query_date, datetime.min.time())
+    end_of_day = datetime.combine(query_date, datetime.max.time())
+
+    # Select plain rows rather than Ticket objects; the teller name comes from
+    # the same query so rendering a page never issues further lookups
+    query = db.select(*model.json_columns(fields)).where(
+        model.branch_id == branch_id,
+        model.created_at.between(start_of_day, end_of_day)
+    )
+    if 'Teller' in fields:
+        query = query.outerjoin(Teller, model.teller_id == Teller.id)
+
+    # Filter by status if provided
+    if status == 'pending':
+        query = query.where(model.is_served == False)
+    elif status == 'served':
+        query = query.where(
+            model.is_served == True,
+            model.completed == False,
+            model.is_canceled == False
+        )
+    elif status == 'completed':
+        query = query.where(
+            model.is_served == True,
+            model.completed == True
+        )
+    elif status == 'canceled':
+        query = query.where(model.is_canceled == True)
+
+    if after:
+        cursor_created_at, cursor_id = after
+        query = query.where(db.or_(
+            model.created_at > cursor_created_at,
+            db.and_(model.created_at == cursor_created_at, model.id > cursor_id),
+        ))
+    return query
+
+
+def requested_fields():
+    """
+    The ticket keys named by the ``fields`` argument, all of them by
+    default; raises ValueError listing any unknown ones.
+    """
+    fields_arg = request.args.get('fields')
+    if not fields_arg:
+        return list(Ticket.JSON_COLUMNS)
+    fields = [field for field in fields_arg.split(',') if field]
+    unknown = [field for field in fields if field not in Ticket.JSON_COLUMNS]
+    if unknown:
+        raise ValueError(', '.join(unknown))
+    return fields
+
+
+def json_response(body):
+    return current_app.response_class(body, mimetype=current_app.json.mimetype)
+
+
+def encode_cursor(row):
+    """Opaque page cursor pointing just after ``row``"""
+    raw = f"{row.created_at.isoformat()}|{row.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor):
+    """Inverse of encode_cursor; raises ValueError for malformed cursors"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+    except (binascii.Error, UnicodeDecodeError) as e:
+        raise ValueError(cursor) from e
+    created_at, _, ticket_id = raw.partition('|')
+    if not ticket_id:
+        raise ValueError(cursor)
+    return datetime.fromisoformat(created_at), ticket_id
+
+
+@ticket_bp.route('/ticket/export', methods=['GET'])
+@jwt_required()
+def export_tickets():
+    """
+    Stream every ticket issued on the days ``from`` to ``to`` (YYYY-MM-DD,
+    inclusive, default today), archived or not, as NDJSON or, with
+    ``format=csv``, as CSV with a header row. ``fields`` works as for the
+    list endpoint. The body is gzipped on the fly for clients that accept
+    it.
+
+    Tickets are read and sent TICKET_EXPORT_CHUNK_SIZE at a time, so any
+    range can be exported in constant memory (see export_chunks for when the
+    request holds a database connection between chunks).
+    """
+    try:
+        today = datetime.now().date()
+        start = datetime.strptime(request.args['from'], '%Y-%m-%d').date() if request.args.get('from') else today
+        end = datetime.strptime(request.args['to'], '%Y-%m-%d').date() if request.args.get('to') else today
+    except ValueError:
+        return jsonify({'message': 'Invalid date format. Use YYYY-MM-DD'}), 400
+    if start > end:
+        return jsonify({'message': '"from" must not be after "to"'}), 400
+
+    export_format = request.args.get('format', 'ndjson')
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({'message': f"format must be one of: {', '.join(EXPORT_FORMATS)}"}), 400
+
+    try:
+        fields = requested_fields()
+    except ValueError as e:
+        return jsonify({'message': f"Unknown fields: {e}"}), 400
+
+    branch_id = current_branch()
+    chunks = export_chunks(branch_id, start, end, fields, current_app.config['TICKET_EXPORT_CHUNK_SIZE'])
+    body = ndjson_lines(chunks) if export_format == 'ndjson' else csv_lines(chunks, fields)
+
+    filename = f'tickets-{branch_id}-{start:%Y%m%d}-{end:%Y%m%d}.{export_format}'
+    headers = {
+        'Content-Disposition': f'attachment; filename="{filename}"',
+        'Vary': 'Accept-Encoding',
+    }
+    level = current_app.config['TICKET_EXPORT_GZIP_LEVEL']
+    if level and 'gzip' in request.accept_encodings:
+        body = gzip_stream(body, level)
+        headers['Content-Encoding'] = 'gzip'
+
+    return Response(
+        stream_with_context(body),
+        mimetype=EXPORT_FORMATS[export_format],
+        headers=headers,
+    )
 
 
 @ticket_bp.route('/ticket/<string:ticket_id>/serve', methods=['POST'])
 @jwt_required()
+@idempotent
 def ticket_served(ticket_id):
     data = request.get_json()
     
@@ -207,8 +554,8 @@ def ticket_served(ticket_id):
             'status': 'error',
             'message': 'Teller ID is required'}), 400
     
-    ticket = Ticket.query.get_or_404(ticket_id)
-    teller = Teller.query.get_or_404(data['teller_id'])
+    ticket = get_in_branch_or_404(Ticket, ticket_id)
+    teller = get_in_branch_or_404(Teller, data['teller_id'])
     
     # Check if ticket is already served
     if ticket.is_served:
@@ -216,35 +563,50 @@ def ticket_served(ticket_id):
             'status' : 'error',
             'message': 'Ticket is already served'}), 400
     
+    if ticket.is_canceled:
+        return jsonify({
+            'status' : 'error',
+            'message': 'Ticket has been canceled'}), 400
+    
     if teller.is_active:
         return jsonify({
             'status' : 'error',
             'message': 'This teller is currently serving another ticket'}), 400
     
-
+    # Mark teller as active (busy with this ticket), unless a concurrent
+    # request got there first
+    if not claim_teller(teller.id):
+        db.session.rollback()
+        return jsonify({
+            'status' : 'error',
+            'message': 'This teller is currently serving another ticket'}), 409
     
     # Update ticket status
-    ticket.is_served = True
-    ticket.served_at = datetime.now()
-    ticket.teller_id = teller.id
-
-    # Mark teller as active (busy with this ticket)
-    teller.is_active = True
-    
-    db.session.commit()
+    if not claim_ticket(ticket.id, teller.id):
+        db.session.rollback()
+        return jsonify({
+            'status' : 'error',
+            'message': 'Ticket is already served'}), 409
     
-    return jsonify({
+    record_event('ticket.served', ticket=ticket, teller=teller)
+    count_served(ticket)
+    body = {
         'status': 'ok',
         'message': 'Ticket marked as served',
         'ticket': ticket.to_json()
-    }), 200
+    }
+    remember_response(body)
+    db.session.commit()
+    
+    return jsonify(body), 200
 
 @ticket_bp.route('/ticket/<string:ticket_id>/complete', methods=['PUT'])
 @jwt_required()
+@idempotent
 def complete_ticket_service( ticket_id):
     """Mark a ticket as completed and free up the teller"""
     
-    ticket = Ticket.query.get_or_404(ticket_id)
+    ticket = get_in_branch_or_404(Ticket, ticket_id)
     
     # Check if ticket is assigned to a teller
     if not ticket.teller_id:
@@ -252,21 +614,38 @@ def complete_ticket_service( ticket_id):
             'status': 'error',
             'message': 'This ticket is not assigned to any teller'}), 400
     
-    teller = Teller.query.filter_by(id=ticket.teller_id).first()
+    #update ticket status; completing twice, or a canceled ticket, would
+    # free a teller who has moved on to another ticket
+    completed = db.session.execute(
+        db.update(Ticket)
+        .where(
+            Ticket.id == ticket.id,
+            db.or_(Ticket.completed == False, Ticket.completed == None),
+            Ticket.is_canceled == False,
+        )
+        .values(completed=True)
+    ).rowcount
+    if not completed:
+        db.session.rollback()
+        return jsonify({
+            'status': 'error',
+            'message': 'Ticket has been canceled' if ticket.is_canceled else 'Ticket service is already completed'}), 409
     
     # Update teller status
-    teller.is_active = False
-
-    #update ticket status
-    ticket.completed = True
-    
-    db.session.commit()
+    release_teller(ticket.teller_id)
+    teller = db.session.get(Teller, ticket.teller_id)
     
-    return jsonify({
+    record_event('ticket.completed', ticket=ticket, teller=teller)
+    count_completed(ticket)
+    body = {
         'message': 'Ticket service completed, teller is now available',
         'ticket': ticket.to_json(),
         'teller': teller.to_json()
-    }), 200
+    }
+    remember_response(body)
+    db.session.commit()
+    
+    return jsonify(body), 200
 
 
 @ticket_bp.route('/tellers', methods=['GET'])
@@ -274,45 +653,186 @@ def complete_ticket_service( ticket_id):
 def get_tellers():
     # Get all tellers with optional filter for active status
     active_only = request.args.get('active', 'false').lower() == 'true'
-    
+
+    branch_id = current_branch()
+    etag = list_etag([tellers_scope(branch_id)], branch_id, active_only)
+    unchanged = not_modified(etag)
+    if unchanged:
+        return unchanged
+
+    body = get_response_cache().get_or_render(f'tellers:{etag}', lambda: render_tellers(branch_id, active_only))
+    return with_etag(json_response(body), etag), 200
+
+
+def render_tellers(branch_id, active_only):
     if active_only:
-        tellers = Teller.query.filter_by(is_active=False).all()
+        tellers = Teller.query.filter_by(branch_id=branch_id, is_active=False).all()
     else:
-        tellers = Teller.query.all()
+        tellers = Teller.query.filter_by(branch_id=branch_id).all()
     
     return jsonify({
         'total': len(tellers),
         'tellers': [teller.to_json() for teller in tellers]
-    }), 200
+    }).get_data()
 
 
 @ticket_bp.route('/tickets/<string:ticket_id>/auto-assign', methods=['GET'])
 def auto_assign_ticket(ticket_id):
-    # Find available tellers (is_active=False)
-    available_tellers = Teller.query.filter_by(is_active=False).all()
+    # Find the ticket to assign
+    branch_id = current_branch()
+    pending_ticket = Ticket.query.filter_by(id=ticket_id, branch_id=branch_id).first()
+    if not pending_ticket:
+        # No pending tickets - return empty response
+        return '', 204
     
+    # Find available tellers (is_active=False); the queue engine's view may
+    # lag other workers slightly, so fall back to the table when it is empty
+    available_tellers = list(current_app.extensions['queue_engine'].free_tellers(branch_id))
     if not available_tellers:
+        available_tellers = db.session.execute(
+            db.select(Teller.id).where(Teller.branch_id == branch_id, Teller.is_active == False)
+        ).scalars().all()
+    
+    # Try the tellers in random order until one can be claimed
+    random.shuffle(available_tellers)
+    chosen_teller_id = next((teller_id for teller_id in available_tellers if claim_teller(teller_id)), None)
+    if chosen_teller_id is None:
         # No tellers available - return empty response
-        return '', 204
-    
-    # Choose a random teller
-    import random
-    chosen_teller = random.choice(available_tellers)
-    
-    # Find the first pending ticket
-    pending_ticket = Ticket.query.filter_by(id=ticket_id).first()
-    if not pending_ticket:
-        # No pending tickets - return empty response
+        db.session.rollback()
         return '', 204
     
     # Assign the ticket to the chosen teller
-    pending_ticket.teller_id = chosen_teller.id
-    pending_ticket.is_served = True
-    pending_ticket.served_at = datetime.now()
-    chosen_teller.is_active = True
+    if not claim_ticket(pending_ticket.id, chosen_teller_id):
+        db.session.rollback()
+        return jsonify({
+            'status': 'error',
+            'message': 'Ticket is already served'}), 409
+    
+    chosen_teller = db.session.get(Teller, chosen_teller_id)
+    record_event('ticket.served', ticket=pending_ticket, teller=chosen_teller)
+    count_served(pending_ticket)
     db.session.commit()
     return jsonify({
         'message': 'Ticket has been assigned Teller',
         'ticket': pending_ticket.to_json(),
         'teller': chosen_teller.to_json()
-    }), 200
\ No newline at end of file
+    }), 200
+
+
+@ticket_bp.route('/ticket/events', methods=['GET'])
+@jwt_required(locations=['headers', 'query_string'])
+def ticket_events():
+    """
+    Live feed of queue changes as Server-Sent Events.
+
+    Each event carries the changed ticket and, when one is involved, the
+    teller. Reconnecting clients send the last event id they saw (the
+    Last-Event-ID header, or ?last_event_id=) and receive only what they
+    missed. EventSource cannot set headers, so the token may also be passed
+    as ?jwt=.
+    """
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    try:
+        last_event_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        return jsonify({'message': 'Invalid event id'}), 400
+
+    broker = current_app.extensions['event_broker']
+    return Response(
+        stream_with_context(broker.stream(current_branch(), last_event_id)),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
+
+
+@ticket_bp.route('/tellers/<string:teller_id>/next', methods=['POST'])
+@jwt_required()
+def call_next_ticket(teller_id):
+    """
+    Assign the oldest waiting ticket to a free teller.
+
+    An optional JSON body ``{"ticket_types": ["W", "D"]}`` restricts the
+    tickets the teller takes. The teller and the ticket are both claimed with
+    conditional updates in one transaction, so concurrent calls never hand
+    out the same ticket or double-book the teller.
+    """
+    data = request.get_json(silent=True) or {}
+    ticket_types = [ticket_type.upper() for ticket_type in data.get('ticket_types') or []]
+    if any(ticket_type not in Ticket.TICKET_TYPE_LABELS for ticket_type in ticket_types):
+        return jsonify({
+            'status': 'error',
+            'message': 'Invalid ticket type'}), 400
+
+    branch_id = current_branch()
+    queue = current_app.extensions['queue_engine']
+    teller = get_in_branch_or_404(Teller, teller_id)
+
+    if teller.is_active:
+        return jsonify({
+            'status': 'error',
+            'message': 'This teller is currently serving another ticket'}), 409
+
+    # Idle tellers poll this endpoint; answer from memory when nobody waits
+    # rather than take a write lock on the teller for nothing
+    if not queue.has_waiting(branch_id, ticket_types):
+        return '', 204
+
+    if not claim_teller(teller.id):
+        db.session.rollback()
+        return jsonify({
+            'status': 'error',
+            'message': 'This teller is currently serving another ticket'}), 409
+
+    try:
+        # The in-memory queue may be a little behind other workers; skip
+        # tickets that were served or canceled since
+        while True:
+            ticket_id = queue.pop_next(branch_id, ticket_types)
+            if ticket_id is None:
+                db.session.rollback()
+                return '', 204
+            if claim_ticket(ticket_id, teller.id):
+                break
+
+        ticket = db.session.get(Ticket, ticket_id)
+        record_event('ticket.served', ticket=ticket, teller=teller)
+        count_served(ticket)
+        db.session.commit()
+    except Exception as e:
+        # Tickets popped above may still be waiting: reload this worker's
+        # queue from the table
+        db.session.rollback()
+        queue.reset(branch_id)
+        return jsonify({'error': str(e)}), 500
+
+    return jsonify({
+        'status': 'ok',
+        'message': 'Ticket has been assigned Teller',
+        'ticket': ticket.to_json(),
+        'teller': teller.to_json()
+    }), 200
+
+
+@ticket_bp.route('/stats', methods=['GET'])
+@jwt_required()
+def get_stats():
+    """
+    Ticket counts and wait times for the days from ``from`` to ``to``
+    (YYYY-MM-DD, inclusive, default today), served from the daily rollup
+    rather than the ticket table.
+    """
+    try:
+        today = datetime.now().date()
+        start = datetime.strptime(request.args['from'], '%Y-%m-%d').date() if request.args.get('from') else today
+        end = datetime.strptime(request.args['to'], '%Y-%m-%d').date() if request.args.get('to') else today
+    except ValueError:
+        return jsonify({'message': 'Invalid date format. Use YYYY-MM-DD'}), 400
+    if start > end:
+        return jsonify({'message': '"from" must not be after "to"'}), 400
+
+    return jsonify({
+        'status': 'ok',
+        'from': start.strftime('%Y-%m-%d'),
+        'to': end.strftime('%Y-%m-%d'),
+        **summarize(current_branch(), start, end)
+    }), 200
@@ -0,0 +1,206 @@
+import bisect
+from collections import Counter, defaultdict
+from datetime import datetime
+
+from app.db.db import Teller, Ticket, TicketArchive, TicketDailyStats, TicketWaitHistogram, db, increment_row
+
+# Upper bounds, in seconds, of the wait-time histogram buckets; the last
+# bucket also takes anything longer
+WAIT_BUCKETS = (30, 60, 120, 180, 300, 450, 600, 900, 1200, 1800, 2700, 3600, 5400, 7200, 86400)
+
+STAT_COUNTS = ('issued', 'served', 'completed', 'canceled')
+
+
+def wait_bucket(seconds):
+    return WAIT_BUCKETS[min(bisect.bisect_left(WAIT_BUCKETS, seconds), len(WAIT_BUCKETS) - 1)]
+
+
+def _key(ticket):
+    return {
+        'branch_id': ticket.branch_id,
+        'day': ticket.created_at.date(),
+        'ticket_type': ticket.ticket_type,
+        'teller_id': ticket.teller_id or '',
+    }
+
+
+# The count_* functions update the rollup in the current transaction, so it
+# commits or rolls back together with the ticket change it counts.
+
+def count_issued(branch_id, day, ticket_types):
+    """Count new tickets issued on ``day``; ``ticket_types`` may repeat"""
+    for ticket_type, issued in Counter(ticket_types).items():
+        increment_row(
+            TicketDailyStats,
+            {'branch_id': branch_id, 'day': day, 'ticket_type': ticket_type, 'teller_id': ''},
+            {'issued': issued},
+        )
+
+
+def count_served(ticket):
+    wait = max((ticket.served_at - ticket.created_at).total_seconds(), 0)
+    key = _key(ticket)
+    increment_row(TicketDailyStats, key, {'served': 1, 'wait_seconds': wait})
+    increment_row(TicketWaitHistogram, dict(key, bucket=wait_bucket(wait)), {'count': 1})
+
+
+def count_completed(ticket):
+    increment_row(TicketDailyStats, _key(ticket), {'completed': 1})
+
+
+def count_canceled(ticket):
+    increment_row(TicketDailyStats, _key(ticket), {'canceled': 1})
+
+
+class _Summary:
+    def __init__(self):
+        self.counts = dict.fromkeys(STAT_COUNTS, 0)
+        self.wait_seconds = 0.0
+        self.histogram = Counter()
+
+    def add(self, row):
+        for name in STAT_COUNTS:
+            self.counts[name] += getattr(row, name)
+        self.wait_seconds += row.wait_seconds
+
+    def percentile(self, fraction):
+        """
+        Estimated wait below which the given fraction of waits fall:
+        interpolated linearly within its histogram bucket, and never above
+        avg / (1 - fraction), which no distribution with that average
+        exceeds (so tickets served at once report 0, not 30)
+        """
+        total = sum(self.histogram.values())
+        if not total:
+            return None
+        rank = fraction * total
+        seen = 0
+        for bucket in sorted(self.histogram):
+            count = self.histogram[bucket]
+            if seen + count >= rank:
+                index = bisect.bisect_left(WAIT_BUCKETS, bucket)
+                lower = WAIT_BUCKETS[index - 1] if index else 0
+                estimate = lower + (bucket - lower) * (rank - seen) / count
+                break
+            seen += count
+        served = self.counts['served']
+        if served and fraction < 1:
+            estimate = min(estimate, self.wait_seconds / served / (1 - fraction))
+        return round(estimate, 1)
+
+    def to_json(self):
+        served = self.counts['served']
+        return {
+            **self.counts,
+            'avg_wait_seconds': round(self.wait_seconds / served, 1) if served else None,
+            'p50_wait_seconds': self.percentile(0.5),
+            'p90_wait_seconds': self.percentile(0.9),
+        }
+
+
+def summarize(branch_id, start, end):
+    """
+    Ticket statistics of ``branch_id`` for the days ``start`` to ``end``
+    inclusive, read from the rollup tables only: overall, per ticket type
+    and per teller.
+    Percentiles are estimated from the wait histogram (see WAIT_BUCKETS).
+    """
+    rows = db.session.execute(
+        db.select(
+            TicketDailyStats.ticket_type,
+            TicketDailyStats.teller_id,
+            *[db.func.sum(getattr(TicketDailyStats, name)).label(name) for name in STAT_COUNTS],
+            db.func.sum(TicketDailyStats.wait_seconds).label('wait_seconds'),
+        )
+        .where(TicketDailyStats.branch_id == branch_id, TicketDailyStats.day.between(start, end))
+        .group_by(TicketDailyStats.ticket_type, TicketDailyStats.teller_id)
+    ).all()
+    histogram = db.session.execute(
+        db.select(
+            TicketWaitHistogram.ticket_type,
+            TicketWaitHistogram.teller_id,
+            TicketWaitHistogram.bucket,
+            db.func.sum(TicketWaitHistogram.count),
+        )
+        .where(TicketWaitHistogram.branch_id == branch_id, TicketWaitHistogram.day.between(start, end))
+        .group_by(TicketWaitHistogram.ticket_type, TicketWaitHistogram.teller_id, TicketWaitHistogram.bucket)
+    ).all()
+
+    total = _Summary()
+    by_type = defaultdict(_Summary)
+    by_teller = defaultdict(_Summary)
+    for row in rows:
+        for summary in (total, by_type[row.ticket_type]) + ((by_teller[row.teller_id],) if row.teller_id else ()):
+            summary.add(row)
+    for ticket_type, teller_id, bucket, count in histogram:
+        for summary in (total, by_type[ticket_type], by_teller[teller_id]):
+            summary.histogram[bucket] += count
+
+    teller_names = dict(db.session.execute(
+        db.select(Teller.id, Teller.name).where(Teller.branch_id == branch_id)
+    ).all())
+    return {
+        'total': total.to_json(),
+        'by_ticket_type': [
+            dict(summary.to_json(), ticket_type=Ticket.TICKET_TYPE_LABELS.get(ticket_type, 'Unknown'))
+            for ticket_type, summary in sorted(by_type.items())
+        ],
+        'by_teller': [
+            dict(summary.to_json(), teller_id=teller_id, teller=teller_names.get(teller_id))
+            for teller_id, summary in sorted(by_teller.items())
+        ],
+    }
+
+
+def rebuild_stats(start, end):
+    """
+    Recompute the rollup of every branch for the days ``start`` to ``end``
+    from the ticket and ticket_archive tables, e.g. for history recorded
+    before the rollup existed. Returns the number of tickets read.
+    """
+    first = datetime.combine(start, datetime.min.time())
+    last = datetime.combine(end, datetime.max.time())
+
+    counts = defaultdict(lambda: dict.fromkeys(STAT_COUNTS + ('wait_seconds',), 0))
+    histogram = Counter()
+    tickets = 0
+    # Older days may already have been archived
+    query = db.union_all(*[
+        db.select(
+            model.branch_id, model.ticket_type, model.created_at, model.served_at, model.teller_id,
+            model.is_served, model.completed, model.is_canceled,
+        ).where(model.created_at.between(first, last))
+        for model in (Ticket, TicketArchive)
+    ])
+    for ticket in db.session.execute(query, execution_options={'yield_per': 1000}):
+        tickets += 1
+        day = ticket.created_at.date()
+        counts[(ticket.branch_id, day, ticket.ticket_type, '')]['issued'] += 1
+        key = (ticket.branch_id, day, ticket.ticket_type, ticket.teller_id or '')
+        if ticket.is_served and ticket.served_at:
+            wait = max((ticket.served_at - ticket.created_at).total_seconds(), 0)
+            counts[key]['served'] += 1
+            counts[key]['wait_seconds'] += wait
+            histogram[key + (wait_bucket(wait),)] += 1
+        if ticket.completed:
+            counts[key]['completed'] += 1
+        if ticket.is_canceled:
+            counts[key]['canceled'] += 1
+
+    db.session.execute(db.delete(TicketDailyStats).where(TicketDailyStats.day.between(start, end)))
+    db.session.execute(db.delete(TicketWaitHistogram).where(TicketWaitHistogram.day.between(start, end)))
+    if counts:
+        db.session.execute(db.insert(TicketDailyStats), [
+            dict(values, branch_id=branch_id, day=day, ticket_type=ticket_type, teller_id=teller_id)
+            for (branch_id, day, ticket_type, teller_id), values in counts.items()
+        ])
+    if histogram:
+        db.session.execute(db.insert(TicketWaitHistogram), [
+            {
+                'branch_id': branch_id, 'day': day, 'ticket_type': ticket_type,
+                'teller_id': teller_id, 'bucket': bucket, 'count': count,
+            }
+            for (branch_id, day, ticket_type, teller_id, bucket), count in histogram.items()
+        ])
+    db.session.commit()
+    return tickets
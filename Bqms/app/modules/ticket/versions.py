@@ -0,0 +1,75 @@
+import hashlib
+
+from flask import make_response, request
+
+from app.db.db import ListVersion, db, increment_row
+
+# The status filters of GET /api/ticket/list
+TICKET_STATUSES = ('pending', 'served', 'completed', 'canceled')
+
+# Ticket lists whose content an event of each kind can change. A ticket is
+# rendered with all its flags, so any list that holds it before or after
+# the change is affected.
+EVENT_STATUSES = {
+    'ticket.created': ('pending',),
+    'ticket.served': ('pending', 'served'),
+    'ticket.completed': ('served', 'completed'),
+    'ticket.canceled': TICKET_STATUSES,
+}
+
+
+# Scopes are per branch: a change in one branch never invalidates the
+# lists of another
+
+def ticket_scopes(branch_id, day, statuses=TICKET_STATUSES):
+    return [f'tickets:{branch_id}:{day:%Y-%m-%d}:{status}' for status in statuses]
+
+
+def tellers_scope(branch_id):
+    return f'tellers:{branch_id}'
+
+
+def bump_versions(scopes):
+    """Increment the version of every scope in the current transaction"""
+    # A fixed order keeps concurrent writers from deadlocking on the rows
+    for scope in sorted(set(scopes)):
+        increment_row(ListVersion, {'scope': scope}, {'version': 1})
+
+
+def event_scopes(kind, payload, branch_id):
+    """Scopes changed by a queue event of ``branch_id`` with the given to_json payload"""
+    scopes = []
+    ticket = payload.get('ticket')
+    if ticket:
+        day = ticket['issue_date'][:10]
+        scopes += [f'tickets:{branch_id}:{day}:{status}' for status in EVENT_STATUSES.get(kind, TICKET_STATUSES)]
+    if payload.get('teller'):
+        scopes.append(tellers_scope(branch_id))
+    return scopes
+
+
+def list_etag(scopes, *key):
+    """
+    ETag for a listing that depends on ``scopes``; ``key`` identifies the
+    request (branch, filters, page). Costs one query against list_version
+    only.
+    """
+    versions = db.session.execute(
+        db.select(ListVersion.scope, ListVersion.version).where(ListVersion.scope.in_(scopes))
+    ).all()
+    raw = repr((sorted(versions), key))
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+
+def with_etag(response, etag):
+    response.set_etag(etag)
+    # Let browsers keep the body but revalidate it on every poll
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def not_modified(etag):
+    """The 304 response to send if the client already holds ``etag``, else None"""
+    if etag in request.if_none_match:
+        return with_etag(make_response('', 304), etag)
+    return None
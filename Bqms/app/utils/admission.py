@@ -0,0 +1,178 @@
+import logging
+import math
+import os
+import sqlite3
+import threading
+import time
+
+from flask import g, jsonify, request
+
+logger = logging.getLogger(__name__)
+
+# Blueprint names of the ticket routes (see initialize_route)
+ADMITTED_BLUEPRINTS = ('main', 'branch')
+# Live feeds stay open for minutes and would pin an in-flight slot each
+LONG_LIVED_VIEWS = ('ticket_events',)
+
+
+class SQLiteBucketStore:
+    """
+    Token buckets kept in a small SQLite file that every worker on the host
+    opens, so a client's budget is the same whichever worker it reaches. A
+    stand-in for a shared store like Redis; it is separate from the
+    application database so rejecting a request never touches the latter.
+
+    Each process uses one connection, serialized by a lock; buckets are
+    updated in short BEGIN IMMEDIATE transactions. Waits for another
+    process's transaction poll with time.sleep rather than SQLite's busy
+    handler, which would block a whole gevent worker inside C.
+    """
+
+    PRUNE_EVERY = 1000
+
+    def __init__(self, path, timeout=0.5):
+        self.path = path
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._connection = None
+        self._pid = None
+        self._takes = 0
+
+    def _connect(self):
+        # Opened lazily, and again after a fork: connections must not be
+        # shared between processes
+        if self._connection is None or self._pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=0, isolation_level=None, check_same_thread=False)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=OFF')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS bucket (key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)'
+            )
+            self._connection, self._pid = connection, os.getpid()
+        return self._connection
+
+    def _begin(self, connection):
+        deadline = time.monotonic() + self.timeout
+        while True:
+            try:
+                connection.execute('BEGIN IMMEDIATE')
+                return
+            except sqlite3.OperationalError:
+                if time.monotonic() >= deadline:
+                    raise
+                time.sleep(0.001)
+
+    def take(self, key, rate, burst):
+        """
+        Take a token from the bucket ``key``, refilled at ``rate`` per second
+        up to ``burst``; 0 if there was one, else the seconds until there is
+        """
+        with self._lock:
+            connection = self._connect()
+            self._begin(connection)
+            try:
+                now = time.time()
+                row = connection.execute('SELECT tokens, updated FROM bucket WHERE key = ?', (key,)).fetchone()
+                tokens = burst if row is None else min(burst, row[0] + max(0.0, now - row[1]) * rate)
+                wait = 0.0 if tokens >= 1 else (1 - tokens) / rate
+                if not wait:
+                    tokens -= 1
+                connection.execute(
+                    'INSERT INTO bucket (key, tokens, updated) VALUES (?, ?, ?) '
+                    'ON CONFLICT(key) DO UPDATE SET tokens = excluded.tokens, updated = excluded.updated',
+                    (key, tokens, now),
+                )
+                self._takes += 1
+                if self._takes % self.PRUNE_EVERY == 0:
+                    # A bucket idle long enough to be full again is the same
+                    # as no bucket
+                    connection.execute('DELETE FROM bucket WHERE updated < ?', (now - burst / rate,))
+                connection.execute('COMMIT')
+            except BaseException:
+                connection.execute('ROLLBACK')
+                raise
+            return wait
+
+
+class AdmissionControl:
+    """
+    Sheds load on the ticket routes before they do any database work.
+
+    - At most MAX_IN_FLIGHT requests run at once in a worker; the next one
+      gets 503. The count is per worker, since it is a worker's threads or
+      greenlets that run out, and slots held by a killed worker would
+      otherwise never be returned.
+    - With RATE_LIMIT_ENABLED, each client has a token bucket for reads
+      (GET) and one for writes, shared by all workers through the bucket
+      store; a request finding its bucket empty gets 429.
+
+    Both answers carry Retry-After. If the bucket store fails, requests are
+    let through rather than turning an overload into an outage.
+    """
+
+    def __init__(self, app):
+        config = app.config
+        self.max_in_flight = config['MAX_IN_FLIGHT']
+        self.retry_after = config['RETRY_AFTER']
+        self.client_header = config['RATE_LIMIT_CLIENT_HEADER']
+        self.limits = {
+            'read': (config['RATE_LIMIT_READ_RATE'], config['RATE_LIMIT_READ_BURST']),
+            'write': (config['RATE_LIMIT_WRITE_RATE'], config['RATE_LIMIT_WRITE_BURST']),
+        }
+        self.store = SQLiteBucketStore(config['RATE_LIMIT_STORE']) if config['RATE_LIMIT_ENABLED'] else None
+        self._slots = threading.BoundedSemaphore(self.max_in_flight) if self.max_in_flight else None
+        self._lock = threading.Lock()
+        self._rejected = {429: 0, 503: 0}
+
+    def client_key(self):
+        if self.client_header and request.headers.get(self.client_header):
+            # e.g. X-Forwarded-For: the first entry is the client
+            return request.headers[self.client_header].split(',')[0].strip()
+        return request.remote_addr or 'unknown'
+
+    def _reject(self, status, message, retry_after):
+        with self._lock:
+            self._rejected[status] += 1
+        response = jsonify({'status': 'error', 'message': message})
+        response.headers['Retry-After'] = str(max(1, math.ceil(retry_after)))
+        return response, status
+
+    def before_request(self):
+        if request.blueprint not in ADMITTED_BLUEPRINTS:
+            return None
+
+        long_lived = request.endpoint and request.endpoint.rsplit('.', 1)[-1] in LONG_LIVED_VIEWS
+        if self._slots is not None and not long_lived:
+            if not self._slots.acquire(blocking=False):
+                return self._reject(503, 'Server busy, please retry shortly', self.retry_after)
+            g.admission_slot = True
+
+        if self.store is not None:
+            group = 'read' if request.method in ('GET', 'HEAD') else 'write'
+            rate, burst = self.limits[group]
+            if rate > 0:
+                try:
+                    wait = self.store.take(f'{group}:{self.client_key()}', rate, burst)
+                except sqlite3.Error:
+                    logger.exception('Rate limit store unavailable; admitting request')
+                    wait = 0
+                if wait:
+                    return self._reject(429, 'Too many requests', wait)
+        return None
+
+    def teardown_request(self, exc):
+        if g.pop('admission_slot', False):
+            self._slots.release()
+
+    def stats(self):
+        """Requests rejected by this worker, by status"""
+        with self._lock:
+            return dict(self._rejected)
+
+
+def init_admission(app):
+    if not app.config['RATE_LIMIT_ENABLED'] and not app.config['MAX_IN_FLIGHT']:
+        return
+    admission = app.extensions['admission'] = AdmissionControl(app)
+    app.before_request(admission.before_request)
+    app.teardown_request(admission.teardown_request)
@@ -0,0 +1,9 @@
+import sys
+
+
+def gevent_patched():
+    """True when gevent has monkey patched threading, e.g. in gevent workers"""
+    if 'gevent' not in sys.modules:
+        return False
+    from gevent import monkey
+    return monkey.is_module_patched('threading')
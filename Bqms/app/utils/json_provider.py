@@ -0,0 +1,42 @@
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # optional: Flask's json-based provider is used instead
+    orjson = None
+
+
+class ORJSONProvider(DefaultJSONProvider):
+    """
+    Flask JSON provider backed by orjson.
+
+    Output is equivalent to DefaultJSONProvider's: keys are sorted, and
+    dates and datetimes are passed to the same ``default`` hook so they keep
+    Flask's formatting. Non-ASCII text is written as UTF-8 rather than
+    escaped, and ``dumps`` ignores json.dumps keyword arguments.
+    """
+
+    def dumps(self, obj, **kwargs):
+        return self._dumps(obj).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = (self.compact is None and self._app.debug) or self.compact is False
+        return self._app.response_class(self._dumps(obj, indent) + b'\n', mimetype=self.mimetype)
+
+    def _dumps(self, obj, indent=False):
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=self.default, option=option)
+
+
+def init_json_provider(app):
+    """Use orjson for jsonify and request.json when it is installed"""
+    if orjson is not None:
+        app.json = ORJSONProvider(app)
@@ -0,0 +1,194 @@
+import bisect
+import cProfile
+import itertools
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+
+from flask import Response, current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.utils.concurrency import gevent_patched
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds, in seconds, of the request latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class _RouteStats:
+    __slots__ = ('buckets', 'count', 'seconds', 'queries', 'db_seconds')
+
+    def __init__(self):
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.count = 0
+        self.seconds = 0.0
+        self.queries = 0
+        self.db_seconds = 0.0
+
+
+class RequestMetrics:
+    """
+    Per-route request latency histograms and database usage of one worker.
+
+    Every request is timed from before_request to teardown, and the SQL
+    statements it runs are counted and timed through cursor events. With
+    PROFILE_THRESHOLD_MS set, each request also runs under cProfile and the
+    profile of any request slower than the threshold is written to
+    PROFILE_DIR (open it with ``python -m pstats`` or snakeviz).
+
+    cProfile profiles a thread, not a request. Under gevent every greenlet
+    of a worker shares one thread, so only one request per worker is
+    profiled at a time (the others run unprofiled), and its profile also
+    counts whatever other greenlets ran while it was waiting on I/O.
+
+    Numbers are per process: with several gunicorn workers, each scrape of
+    /metrics reports the worker that answered it.
+    """
+
+    def __init__(self, app):
+        self.profile_threshold = app.config['PROFILE_THRESHOLD_MS'] / 1000
+        self.profile_dir = app.config['PROFILE_DIR']
+        self._routes = defaultdict(_RouteStats)
+        self._lock = threading.Lock()
+        self._profiles = itertools.count(1)
+        # Held by the request being profiled when requests share a thread
+        self._profile_lock = threading.Lock() if gevent_patched() else None
+
+    def before_request(self):
+        g.metrics = {'start': time.perf_counter(), 'queries': 0, 'db_seconds': 0.0, 'status': 500}
+        if self.profile_threshold and (self._profile_lock is None or self._profile_lock.acquire(blocking=False)):
+            g.metrics['profile'] = profile = cProfile.Profile()
+            profile.enable()
+
+    def after_request(self, response):
+        if 'metrics' in g:
+            g.metrics['status'] = response.status_code
+        return response
+
+    def teardown_request(self, exc):
+        metrics = g.pop('metrics', None)
+        if metrics is None:
+            return
+        seconds = time.perf_counter() - metrics['start']
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        key = (request.method, route, metrics['status'])
+
+        with self._lock:
+            stats = self._routes[key]
+            stats.buckets[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+            stats.count += 1
+            stats.seconds += seconds
+            stats.queries += metrics['queries']
+            stats.db_seconds += metrics['db_seconds']
+
+        profile = metrics.get('profile')
+        if profile:
+            profile.disable()
+            if self._profile_lock is not None:
+                self._profile_lock.release()
+            if seconds >= self.profile_threshold:
+                self._dump_profile(profile, route, seconds)
+
+    def _dump_profile(self, profile, route, seconds):
+        os.makedirs(self.profile_dir, exist_ok=True)
+        name = route.strip('/').replace('/', '_').replace('<', '').replace('>', '') or 'root'
+        path = os.path.join(
+            self.profile_dir,
+            f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{next(self._profiles)}"
+            f"-{request.method}-{name}-{seconds * 1000:.0f}ms.prof",
+        )
+        profile.dump_stats(path)
+        logger.warning('Slow request %s %s took %.0f ms; profile written to %s', request.method, request.path, seconds * 1000, path)
+
+    def render(self):
+        """The metrics in the Prometheus text exposition format"""
+        with self._lock:
+            routes = sorted(self._routes.items())
+            routes = [(key, (list(s.buckets), s.count, s.seconds, s.queries, s.db_seconds)) for key, s in routes]
+
+        lines = [
+            '# HELP bqms_request_duration_seconds Request latency by route.',
+            '# TYPE bqms_request_duration_seconds histogram',
+        ]
+        for (method, route, status), (buckets, count, seconds, _, _) in routes:
+            labels = f'method="{method}",route="{route}",status="{status}"'
+            cumulative = 0
+            for bound, n in zip(LATENCY_BUCKETS + ('+Inf',), buckets):
+                cumulative += n
+                lines.append(f'bqms_request_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'bqms_request_duration_seconds_sum{{{labels}}} {seconds}')
+            lines.append(f'bqms_request_duration_seconds_count{{{labels}}} {count}')
+
+        lines += [
+            '# HELP bqms_request_db_queries_total SQL statements run while handling requests.',
+            '# TYPE bqms_request_db_queries_total counter',
+        ]
+        for (method, route, status), (_, _, _, queries, _) in routes:
+            lines.append(f'bqms_request_db_queries_total{{method="{method}",route="{route}",status="{status}"}} {queries}')
+        lines += [
+            '# HELP bqms_request_db_seconds_total Time spent in SQL statements while handling requests.',
+            '# TYPE bqms_request_db_seconds_total counter',
+        ]
+        for (method, route, status), (_, _, _, _, db_seconds) in routes:
+            lines.append(f'bqms_request_db_seconds_total{{method="{method}",route="{route}",status="{status}"}} {db_seconds}')
+
+        lines += [
+            '# HELP bqms_cache_hits_total Lookups answered by an in-process cache.',
+            '# TYPE bqms_cache_hits_total counter',
+            '# HELP bqms_cache_misses_total Lookups not answered by an in-process cache.',
+            '# TYPE bqms_cache_misses_total counter',
+            '# HELP bqms_cache_entries Entries held by an in-process cache.',
+            '# TYPE bqms_cache_entries gauge',
+        ]
+        for name in ('jwt_user_cache', 'response_cache', 'idempotency_cache'):
+            cache = current_app.extensions.get(name)
+            stats = cache.stats() if cache is not None else {}
+            if 'hits' in stats:
+                lines.append(f'bqms_cache_hits_total{{cache="{name}"}} {stats["hits"]}')
+                lines.append(f'bqms_cache_misses_total{{cache="{name}"}} {stats["misses"]}')
+                lines.append(f'bqms_cache_entries{{cache="{name}"}} {stats["size"]}')
+
+        admission = current_app.extensions.get('admission')
+        if admission is not None:
+            lines += [
+                '# HELP bqms_requests_rejected_total Requests turned away by rate limits (429) or load shedding (503).',
+                '# TYPE bqms_requests_rejected_total counter',
+            ]
+            for status, count in sorted(admission.stats().items()):
+                lines.append(f'bqms_requests_rejected_total{{status="{status}"}} {count}')
+        return '\n'.join(lines) + '\n'
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and 'metrics' in g:
+        conn.info.setdefault('metrics_started', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get('metrics_started')
+    if started and has_request_context() and 'metrics' in g:
+        g.metrics['queries'] += 1
+        g.metrics['db_seconds'] += time.perf_counter() - started.pop()
+
+
+def metrics_view():
+    return Response(current_app.extensions['metrics'].render(), mimetype='text/plain; version=0.0.4')
+
+
+def init_metrics(app):
+    if not app.config['METRICS_ENABLED']:
+        return
+    metrics = app.extensions['metrics'] = RequestMetrics(app)
+    app.before_request(metrics.before_request)
+    app.after_request(metrics.after_request)
+    app.teardown_request(metrics.teardown_request)
+    app.add_url_rule('/metrics', 'metrics', metrics_view)
+    # Statements of every engine are seen; only those run inside a request
+    # are attributed to it
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
@@ -0,0 +1,83 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app
+
+from app.utils.concurrency import gevent_patched
+
+
+class PasswordHasherBusy(Exception):
+    """Raised when too many hash requests are already waiting"""
+
+
+class PasswordHasher:
+    """
+    Runs bcrypt on a small dedicated thread pool.
+
+    bcrypt releases the GIL, so the pool caps how many CPU-bound hashes run
+    at once per worker, and a burst of logins queues here (up to
+    BCRYPT_QUEUE_SIZE) instead of starving ticket requests served by the
+    same process. Requests beyond the queue fail fast with
+    PasswordHasherBusy.
+    """
+
+    def __init__(self, app, bcrypt):
+        self.bcrypt = bcrypt
+        self.rounds = app.config['BCRYPT_LOG_ROUNDS']
+        self.workers = app.config['BCRYPT_WORKERS']
+        self.timeout = app.config['BCRYPT_TIMEOUT']
+        self._slots = threading.BoundedSemaphore(self.workers + app.config['BCRYPT_QUEUE_SIZE'])
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def hash(self, password):
+        hashed = self._run(self.bcrypt.generate_password_hash, password, self.rounds)
+        return hashed.decode('utf-8')
+
+    def verify(self, hashed, password):
+        return self._run(self.bcrypt.check_password_hash, hashed, password)
+
+    def needs_rehash(self, hashed):
+        """True if ``hashed`` was made with a different cost than configured"""
+        # bcrypt hashes look like $2b$<rounds>$<salt+digest>
+        return int(hashed.split('$')[2]) != self.rounds
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(timeout=self.timeout):
+            raise PasswordHasherBusy()
+        try:
+            return self._get_executor().submit(fn, *args).result()
+        finally:
+            self._slots.release()
+
+    def _get_executor(self):
+        # Threads do not survive a fork, so create the pool in the worker
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._executor = _native_thread_pool(self.workers)
+                    self._pid = os.getpid()
+        return self._executor
+
+
+def _native_thread_pool(workers):
+    """
+    A pool of real OS threads. Under gevent's monkey patching, threading
+    makes greenlets, and bcrypt on a greenlet would stall every other
+    request of the worker; gevent's own pool runs it on native threads.
+    """
+    if gevent_patched():
+        from gevent.threadpool import ThreadPoolExecutor as GeventThreadPoolExecutor
+        return GeventThreadPoolExecutor(max_workers=workers)
+    return ThreadPoolExecutor(max_workers=workers, thread_name_prefix='bcrypt')
+
+
+def get_password_hasher():
+    return current_app.extensions['password_hasher']
+
+
+def init_password_hasher(app, bcrypt):
+    bcrypt.init_app(app)
+    app.extensions['password_hasher'] = PasswordHasher(app, bcrypt)
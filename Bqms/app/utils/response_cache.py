@@ -0,0 +1,88 @@
+import threading
+
+from flask import current_app
+
+from app.utils.cache import TTLCache
+
+
+class RedisBackend:
+    """Stores entries in a Redis-compatible server shared by all workers"""
+
+    def __init__(self, url, ttl, prefix='bqms:response:'):
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError('RESPONSE_CACHE_URL is set but the redis package is not installed') from e
+        self._client = redis.Redis.from_url(url)
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def get(self, key, default=None):
+        value = self._client.get(self.prefix + key)
+        return default if value is None else value
+
+    def set(self, key, value):
+        self._client.set(self.prefix + key, value, ex=self.ttl)
+
+    def clear(self):
+        for key in self._client.scan_iter(self.prefix + '*'):
+            self._client.delete(key)
+
+    def stats(self):
+        return {'backend': 'redis'}
+
+
+class ResponseCache:
+    """
+    Rendered bodies of read endpoints, keyed by a string that already
+    identifies the data version (see versions.list_etag), so a write never
+    has to find and evict entries: it bumps the version and later requests
+    simply use a new key.
+
+    Concurrent misses on one key are coalesced: the first request renders
+    the body and the others in this worker wait for it instead of running
+    the same query.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self._building = {}
+        self._lock = threading.Lock()
+
+    def get_or_render(self, key, render):
+        """The cached body for ``key``, calling ``render()`` on a miss"""
+        body = self.backend.get(key)
+        if body is not None:
+            return body
+
+        with self._lock:
+            building = self._building.get(key)
+            if building is None:
+                building = self._building[key] = threading.Lock()
+        with building:
+            body = self.backend.get(key)
+            if body is None:
+                try:
+                    body = render()
+                    self.backend.set(key, body)
+                finally:
+                    with self._lock:
+                        self._building.pop(key, None)
+        return body
+
+    def stats(self):
+        return self.backend.stats()
+
+
+def get_response_cache():
+    return current_app.extensions['response_cache']
+
+
+def init_response_cache(app):
+    url = app.config['RESPONSE_CACHE_URL']
+    ttl = app.config['RESPONSE_CACHE_TTL']
+    if url:
+        backend = RedisBackend(url, ttl)
+    else:
+        backend = TTLCache(app.config['RESPONSE_CACHE_SIZE'], ttl)
+    app.extensions['response_cache'] = ResponseCache(backend)
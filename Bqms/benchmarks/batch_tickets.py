@@ -0,0 +1,84 @@
+"""
+Ticket creation throughput, one request per ticket vs POST /api/ticket/batch.
+
+Starts gunicorn on a throwaway SQLite database for each mode and has
+--clients concurrent kiosks flush tickets back to back for --duration
+seconds: first with POST /api/ticket/new, one ticket per request, then
+with POST /api/ticket/batch, --batch-size tickets per request. Reports
+tickets per second and request latency for both, and the speed-up.
+
+    python benchmarks/batch_tickets.py --clients 8 --batch-size 50
+"""
+import argparse
+import random
+import shutil
+import tempfile
+import threading
+import time
+
+from branch_day import TICKET_TYPES, Client, Recorder, register, start_server
+
+
+def run(base_url, token, args, batch_size):
+    recorder = Recorder()
+    stop = threading.Event()
+
+    def kiosk():
+        client = Client(base_url, recorder, token)
+        while not stop.is_set():
+            if batch_size:
+                tickets = [{'ticket_type': random.choice(TICKET_TYPES)} for _ in range(batch_size)]
+                client.request('create_tickets', 'POST', '/api/ticket/batch', {'tickets': tickets})
+            else:
+                client.request('create_tickets', 'POST', '/api/ticket/new', {'ticket_type': random.choice(TICKET_TYPES)})
+
+    threads = [threading.Thread(target=kiosk, daemon=True) for _ in range(args.clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    stop.wait(args.duration)
+    stop.set()
+    for thread in threads:
+        thread.join(timeout=35)
+    row = recorder.summary(time.perf_counter() - start)['create_tickets']
+    row['tickets_per_second'] = row['throughput'] * (1 - row['error_rate']) * (batch_size or 1)
+    return row
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--duration', type=float, default=15)
+    parser.add_argument('--clients', type=int, default=8)
+    parser.add_argument('--batch-size', type=int, default=50, help='Tickets per POST /api/ticket/batch')
+    parser.add_argument('--worker-class', default='gthread', help='gunicorn worker class (gthread, gevent, sync)')
+    parser.add_argument('--workers', type=int, default=2, help='gunicorn workers')
+    parser.add_argument('--threads', type=int, default=8, help='gunicorn threads per worker')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+    random.seed(args.seed)
+
+    results = {}
+    for mode, batch_size in (('per ticket', 0), (f'batch of {args.batch_size}', args.batch_size)):
+        workdir = tempfile.mkdtemp(prefix='bqms-batch-')
+        server = None
+        try:
+            server, base_url = start_server(workdir, args.worker_class, args.workers, args.threads)
+            results[mode] = run(base_url, register(base_url), args, batch_size)
+        finally:
+            if server:
+                server.terminate()
+                server.wait()
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"{'mode':<14}{'requests':>9}{'tickets/s':>11}{'p50 ms':>9}{'p99 ms':>9}{'errors':>8}")
+    for mode, row in results.items():
+        print(
+            f"{mode:<14}{row['requests']:>9}{row['tickets_per_second']:>11.1f}{row['p50_ms']:>9.1f}"
+            f"{row['p99_ms']:>9.1f}{row['error_rate']:>8.1%}"
+        )
+    per_ticket, batch = results.values()
+    print(f"Speed-up: {batch['tickets_per_second'] / per_ticket['tickets_per_second']:.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,352 @@
+"""
+Load test simulating a branch day against the real HTTP endpoints.
+
+Starts gunicorn on a throwaway SQLite database (or targets --url) and runs,
+concurrently for --duration seconds:
+
+- customers taking tickets one at a time, a few of them canceling,
+- a burst of POST /api/ticket/batch every --burst-interval seconds,
+- one loop per teller calling the next ticket, serving it and completing it,
+- dashboards polling the pending list and free tellers with If-None-Match.
+
+It reports throughput, p50/p99 latency and error/conflict rates per
+operation. With --baseline it compares against an earlier --output file and
+exits non-zero if an operation regressed by more than --max-regression.
+
+    python benchmarks/branch_day.py --duration 30 --workers 4 --output day.json
+    python benchmarks/branch_day.py --baseline day.json
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from urllib.parse import urlsplit
+
+BQMS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+TICKET_TYPES = 'WDTIO'
+
+
+class Recorder:
+    """Latency and status of every request, per operation"""
+
+    def __init__(self):
+        self._samples = defaultdict(list)
+        self._lock = threading.Lock()
+
+    def add(self, operation, status, seconds):
+        with self._lock:
+            self._samples[operation].append((status, seconds))
+
+    def summary(self, elapsed):
+        with self._lock:
+            samples = {operation: list(values) for operation, values in self._samples.items()}
+        report = {}
+        for operation, values in sorted(samples.items()):
+            latencies = sorted(seconds for _, seconds in values)
+            # Requests that got past rate limits and load shedding
+            admitted = sorted(seconds for status, seconds in values if status is not None and status not in (429, 503))
+            statuses = [status for status, _ in values]
+            count = len(values)
+            report[operation] = {
+                'requests': count,
+                'throughput': count / elapsed,
+                'p50_ms': percentile(latencies, 0.50) * 1000,
+                'p99_ms': percentile(latencies, 0.99) * 1000,
+                'admitted': len(admitted),
+                'admitted_p99_ms': percentile(admitted, 0.99) * 1000,
+                'error_rate': sum(1 for status in statuses if status is None or status >= 500) / count,
+                'conflict_rate': statuses.count(409) / count,
+                'not_modified_rate': statuses.count(304) / count,
+                'rejected_rate': (statuses.count(429) + statuses.count(503)) / count,
+            }
+        return report
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(round(fraction * (len(values) - 1))))]
+
+
+class Client:
+    """One keep-alive connection; each simulated actor owns its own"""
+
+    def __init__(self, base_url, recorder, token=None, timeout=30):
+        parts = urlsplit(base_url)
+        self.host, self.port = parts.hostname, parts.port or 80
+        self.recorder = recorder
+        self.token = token
+        self.timeout = timeout
+        self._connection = None
+
+    def request(self, operation, method, path, body=None, headers=None):
+        headers = dict(headers or {})
+        if self.token:
+            headers['Authorization'] = f'Bearer {self.token}'
+        if body is not None:
+            body = json.dumps(body)
+            headers['Content-Type'] = 'application/json'
+
+        start = time.perf_counter()
+        try:
+            response, data = self._send(method, path, body, headers)
+        except (OSError, http.client.HTTPException):
+            self.recorder.add(operation, None, time.perf_counter() - start)
+            self._connection = None
+            return None, {}, None
+        self.recorder.add(operation, response.status, time.perf_counter() - start)
+        try:
+            payload = json.loads(data) if data else None
+        except ValueError:
+            payload = None
+        return response.status, response.headers, payload
+
+    def _send(self, method, path, body, headers):
+        # The server closes idle keep-alive connections; a request that
+        # fails on a reused connection is retried once on a new one
+        for reused in (self._connection is not None, False):
+            if self._connection is None:
+                self._connection = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            try:
+                self._connection.request(method, path, body=body, headers=headers)
+                response = self._connection.getresponse()
+                return response, response.read()
+            except (OSError, http.client.HTTPException):
+                self._connection.close()
+                self._connection = None
+                if not reused:
+                    raise
+
+
+class BranchDay:
+    def __init__(self, base_url, token, args):
+        self.base_url = base_url
+        self.token = token
+        self.args = args
+        self.recorder = Recorder()
+        self.stop = threading.Event()
+
+    def client(self, token=True):
+        return Client(self.base_url, self.recorder, self.token if token else None)
+
+    def customer(self):
+        client = self.client(token=False)
+        while not self.stop.is_set():
+            status, _, payload = client.request(
+                'create_ticket', 'POST', '/api/ticket/new', {'ticket_type': random.choice(TICKET_TYPES)}
+            )
+            if status == 201 and random.random() < self.args.cancel_rate:
+                client.request(
+                    'cancel_ticket', 'POST', '/api/ticket/cancel',
+                    {'ticket_number': payload['ticket']['ticket_number']},
+                )
+            self.stop.wait(random.expovariate(1 / self.args.arrival_interval))
+
+    def burst(self):
+        client = self.client(token=False)
+        while not self.stop.wait(self.args.burst_interval):
+            client.request(
+                'create_ticket_batch', 'POST', '/api/ticket/batch',
+                {'tickets': [{'ticket_type': random.choice(TICKET_TYPES)} for _ in range(self.args.burst_size)]},
+            )
+
+    def teller(self, teller_id):
+        client = self.client()
+        while not self.stop.is_set():
+            status, _, payload = client.request('call_next', 'POST', f'/api/tellers/{teller_id}/next')
+            if status != 200:
+                self.stop.wait(self.args.idle_interval)
+                continue
+            self.stop.wait(random.expovariate(1 / self.args.service_time))
+            client.request('complete_ticket', 'PUT', f"/api/ticket/{payload['ticket']['id']}/complete")
+
+    def dashboard(self):
+        client = self.client()
+        etags = {}
+        while not self.stop.is_set():
+            for operation, path in (
+                ('list_pending', '/api/ticket/list?status=pending'),
+                ('list_free_tellers', '/api/tellers?active=true'),
+            ):
+                headers = {'If-None-Match': etags[path]} if path in etags else {}
+                status, response_headers, _ = client.request(operation, 'GET', path, headers=headers)
+                if status == 200 and response_headers.get('ETag'):
+                    etags[path] = response_headers['ETag']
+            self.stop.wait(self.args.poll_interval)
+
+    def run(self):
+        setup = Client(self.base_url, Recorder(), self.token)
+        _, _, payload = setup.request('setup', 'GET', '/api/tellers')
+        teller_ids = [teller['id'] for teller in payload['tellers']]
+
+        actors = [(self.customer, ()) for _ in range(self.args.customers)]
+        actors += [(self.burst, ())]
+        actors += [(self.teller, (teller_id,)) for teller_id in teller_ids]
+        actors += [(self.dashboard, ()) for _ in range(self.args.dashboards)]
+        threads = [threading.Thread(target=target, args=args, daemon=True) for target, args in actors]
+
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        self.stop.wait(self.args.duration)
+        self.stop.set()
+        for thread in threads:
+            thread.join(timeout=35)
+        return self.recorder.summary(time.perf_counter() - start)
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def wait_for(base_url, timeout=30):
+    parts = urlsplit(base_url)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection((parts.hostname, parts.port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f'Server at {base_url} did not start')
+
+
+def start_server(workdir, worker_class, workers, threads, setup=(), env=None):
+    """
+    Initialise a fresh database, run the ``flask bqms`` commands in
+    ``setup`` (lists of arguments) and start gunicorn on it. ``env``
+    overrides environment variables, DATABASE_URL included.
+    """
+    env = dict(
+        os.environ,
+        DATABASE_URL=f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+        BCRYPT_LOG_ROUNDS=os.environ.get('BCRYPT_LOG_ROUNDS', '4'),
+        **(env or {}),
+    )
+    for command in [['init-db'], *setup]:
+        subprocess.run(
+            [sys.executable, '-m', 'flask', '--app', 'wsgi', 'bqms', *command],
+            cwd=BQMS_DIR, env=env, check=True, stdout=subprocess.DEVNULL,
+        )
+    port = free_port()
+    server = subprocess.Popen(
+        [
+            sys.executable, '-m', 'gunicorn', 'wsgi:app',
+            '--bind', f'127.0.0.1:{port}',
+            '--worker-class', worker_class,
+            '--workers', str(workers),
+            '--threads', str(threads),
+            '--log-level', 'warning',
+        ],
+        cwd=BQMS_DIR, env=env,
+    )
+    base_url = f'http://127.0.0.1:{port}'
+    try:
+        wait_for(base_url)
+    except RuntimeError:
+        server.terminate()
+        raise
+    return server, base_url
+
+
+def register(base_url):
+    client = Client(base_url, Recorder())
+    name = f'bench-{os.getpid()}-{random.randrange(10 ** 6)}'
+    status, _, payload = client.request(
+        'register', 'POST', '/api/register',
+        {'username': name, 'email': f'{name}@example.com', 'password': 'benchmark'},
+    )
+    if status != 201:
+        raise RuntimeError(f'Could not register a benchmark user: {status} {payload}')
+    return payload['access_token']
+
+
+def compare(report, baseline, max_regression):
+    """Lines describing operations that regressed against ``baseline``"""
+    regressions = []
+    for operation, current in report.items():
+        previous = baseline.get(operation)
+        if not previous:
+            continue
+        if current['p99_ms'] > previous['p99_ms'] * (1 + max_regression):
+            regressions.append(f"{operation}: p99 {previous['p99_ms']:.1f} -> {current['p99_ms']:.1f} ms")
+        if current['throughput'] < previous['throughput'] * (1 - max_regression):
+            regressions.append(f"{operation}: throughput {previous['throughput']:.1f} -> {current['throughput']:.1f}/s")
+        if current['error_rate'] > previous['error_rate'] + 0.01:
+            regressions.append(f"{operation}: error rate {previous['error_rate']:.1%} -> {current['error_rate']:.1%}")
+    return regressions
+
+
+def print_report(report):
+    print(f"{'operation':<22}{'requests':>9}{'req/s':>9}{'p50 ms':>9}{'p99 ms':>9}{'errors':>8}{'409':>8}{'304':>8}")
+    for operation, row in report.items():
+        print(
+            f"{operation:<22}{row['requests']:>9}{row['throughput']:>9.1f}{row['p50_ms']:>9.1f}{row['p99_ms']:>9.1f}"
+            f"{row['error_rate']:>8.1%}{row['conflict_rate']:>8.1%}{row['not_modified_rate']:>8.1%}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--url', help='Target a running server instead of starting one')
+    parser.add_argument('--duration', type=float, default=30)
+    parser.add_argument('--worker-class', default='gthread', help='gunicorn worker class (gthread, gevent, sync)')
+    parser.add_argument('--workers', type=int, default=2, help='gunicorn workers')
+    parser.add_argument('--threads', type=int, default=4, help='gunicorn threads per worker')
+    parser.add_argument('--customers', type=int, default=8)
+    parser.add_argument('--arrival-interval', type=float, default=0.5, help='Mean seconds between one customer\'s tickets')
+    parser.add_argument('--cancel-rate', type=float, default=0.05)
+    parser.add_argument('--burst-interval', type=float, default=5)
+    parser.add_argument('--burst-size', type=int, default=20)
+    parser.add_argument('--service-time', type=float, default=0.2, help='Mean seconds a teller spends per ticket')
+    parser.add_argument('--idle-interval', type=float, default=0.1, help='Teller wait when nobody is queuing')
+    parser.add_argument('--dashboards', type=int, default=12)
+    parser.add_argument('--poll-interval', type=float, default=1)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='Write the report as JSON')
+    parser.add_argument('--baseline', help='JSON report to compare against')
+    parser.add_argument('--max-regression', type=float, default=0.25)
+    args = parser.parse_args()
+    random.seed(args.seed)
+
+    server = workdir = None
+    base_url = args.url
+    try:
+        if not base_url:
+            workdir = tempfile.mkdtemp(prefix='bqms-bench-')
+            server, base_url = start_server(workdir, args.worker_class, args.workers, args.threads)
+        report = BranchDay(base_url, register(base_url), args).run()
+    finally:
+        if server:
+            server.terminate()
+            server.wait()
+        if workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    print_report(report)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.max_regression)
+        for line in regressions:
+            print(f'REGRESSION {line}')
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,158 @@
+"""
+Load test of many branches sharing one server and database.
+
+Starts gunicorn on a throwaway SQLite database, creates --branches branches
+with `flask bqms create-branch`, fills the first one ("busy") with
+--busy-tickets tickets and then runs, for --duration seconds:
+
+- customers taking tickets in random branches,
+- one teller per branch calling the next ticket and completing it,
+- dashboards reading the pending list of random quiet branches,
+- one dashboard reading the busy branch's pending list.
+
+Every branch has its own counter row, list versions and index range, so a
+quiet branch's requests should cost the same however many tickets the busy
+branch holds: compare list_quiet_branch between runs with different
+--busy-tickets, and with list_busy_branch.
+
+    python benchmarks/branches.py --branches 120 --busy-tickets 20000
+"""
+import argparse
+import random
+import shutil
+import tempfile
+import threading
+import time
+
+from branch_day import TICKET_TYPES, Client, Recorder, print_report, register, start_server
+
+BATCH_SIZE = 500
+
+
+def branch_ids(count):
+    return [f'b{i:03d}' for i in range(count)]
+
+
+class Branches:
+    def __init__(self, base_url, token, branches, args):
+        self.base_url = base_url
+        self.token = token
+        self.busy, *self.quiet = branches
+        self.branches = branches
+        self.args = args
+        self.recorder = Recorder()
+        self.stop = threading.Event()
+
+    def client(self):
+        return Client(self.base_url, self.recorder, self.token)
+
+    def fill_busy_branch(self):
+        client = Client(self.base_url, Recorder(), self.token)
+        left = self.args.busy_tickets
+        while left > 0:
+            size = min(left, BATCH_SIZE)
+            status, _, payload = client.request(
+                'fill', 'POST', f'/api/branches/{self.busy}/ticket/batch',
+                {'tickets': [{'ticket_type': random.choice(TICKET_TYPES)} for _ in range(size)]},
+            )
+            if status != 201:
+                raise RuntimeError(f'Could not fill the busy branch: {status} {payload}')
+            left -= size
+
+    def customer(self):
+        client = self.client()
+        while not self.stop.is_set():
+            branch = random.choice(self.branches)
+            client.request(
+                'create_ticket', 'POST', f'/api/branches/{branch}/ticket/new',
+                {'ticket_type': random.choice(TICKET_TYPES)},
+            )
+            self.stop.wait(random.expovariate(1 / self.args.arrival_interval))
+
+    def teller(self, branch, teller_id):
+        client = self.client()
+        while not self.stop.is_set():
+            status, _, payload = client.request('call_next', 'POST', f'/api/branches/{branch}/tellers/{teller_id}/next')
+            if status != 200:
+                self.stop.wait(self.args.idle_interval)
+                continue
+            self.stop.wait(random.expovariate(1 / self.args.service_time))
+            client.request(
+                'complete_ticket', 'PUT', f"/api/branches/{branch}/ticket/{payload['ticket']['id']}/complete"
+            )
+
+    def dashboard(self, operation, choose_branch):
+        client = self.client()
+        while not self.stop.is_set():
+            # No If-None-Match: every read renders or fetches a full page
+            client.request(
+                operation, 'GET', f'/api/branches/{choose_branch()}/ticket/list?status=pending&limit=50'
+            )
+            self.stop.wait(self.args.poll_interval)
+
+    def run(self):
+        self.fill_busy_branch()
+
+        setup = Client(self.base_url, Recorder(), self.token)
+        actors = []
+        for branch in self.branches:
+            _, _, payload = setup.request('setup', 'GET', f'/api/branches/{branch}/tellers')
+            actors.append((self.teller, (branch, payload['tellers'][0]['id'])))
+        actors += [(self.customer, ()) for _ in range(self.args.customers)]
+        actors += [
+            (self.dashboard, ('list_quiet_branch', lambda: random.choice(self.quiet)))
+            for _ in range(self.args.dashboards)
+        ]
+        actors += [(self.dashboard, ('list_busy_branch', lambda: self.busy))]
+        threads = [threading.Thread(target=target, args=args, daemon=True) for target, args in actors]
+
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        self.stop.wait(self.args.duration)
+        self.stop.set()
+        for thread in threads:
+            thread.join(timeout=35)
+        return self.recorder.summary(time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--branches', type=int, default=120)
+    parser.add_argument('--busy-tickets', type=int, default=20000, help='Tickets issued by the busy branch up front')
+    parser.add_argument('--duration', type=float, default=30)
+    parser.add_argument('--worker-class', default='gthread', help='gunicorn worker class (gthread, gevent, sync)')
+    parser.add_argument('--workers', type=int, default=2, help='gunicorn workers')
+    parser.add_argument('--threads', type=int, default=8, help='gunicorn threads per worker')
+    parser.add_argument('--customers', type=int, default=8)
+    parser.add_argument('--arrival-interval', type=float, default=1, help='Mean seconds between one customer\'s tickets')
+    parser.add_argument('--service-time', type=float, default=2, help='Mean seconds a teller spends per ticket')
+    parser.add_argument('--idle-interval', type=float, default=2, help='Teller wait when nobody is queuing')
+    parser.add_argument('--dashboards', type=int, default=4)
+    parser.add_argument('--poll-interval', type=float, default=0.5)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+    random.seed(args.seed)
+    if args.branches < 2:
+        parser.error('--branches must be at least 2')
+
+    branches = branch_ids(args.branches)
+    workdir = tempfile.mkdtemp(prefix='bqms-branches-')
+    server = None
+    try:
+        server, base_url = start_server(
+            workdir, args.worker_class, args.workers, args.threads,
+            setup=[['create-branch', *branches, '--tellers', '1']],
+        )
+        report = Branches(base_url, register(base_url), branches, args).run()
+    finally:
+        if server:
+            server.terminate()
+            server.wait()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print_report(report)
+
+
+if __name__ == '__main__':
+    main()
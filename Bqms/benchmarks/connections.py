@@ -0,0 +1,116 @@
+"""
+Concurrent connection capacity per gunicorn worker class.
+
+For each worker class, starts gunicorn on a throwaway database, opens up to
+--streams live feeds (GET /api/ticket/events) and holds them open while
+timing GET /api/ticket/list and POST /api/ticket/new. Reports how many
+feeds were accepted and how the ticket endpoints behaved meanwhile.
+
+    python benchmarks/connections.py --streams 500 --worker-classes gthread,gevent
+"""
+import argparse
+import shutil
+import socket
+import tempfile
+import threading
+import time
+
+from branch_day import Client, Recorder, register, start_server
+
+
+def open_stream(base_url, token, timeout):
+    """A socket with a live feed open on it, or None if it was not served in time"""
+    host, port = base_url.rsplit('//', 1)[1].split(':')
+    sock = socket.create_connection((host, int(port)), timeout=timeout)
+    try:
+        sock.sendall(
+            f'GET /api/ticket/events HTTP/1.1\r\nHost: {host}\r\n'
+            f'Authorization: Bearer {token}\r\nAccept: text/event-stream\r\n\r\n'.encode()
+        )
+        # The feed starts with a retry: line as soon as it is being served
+        data = b''
+        while b'retry:' not in data:
+            chunk = sock.recv(4096)
+            if not chunk:
+                raise OSError('closed')
+            data += chunk
+        return sock
+    except OSError:
+        sock.close()
+        return None
+
+
+def measure(worker_class, args):
+    workdir = tempfile.mkdtemp(prefix='bqms-conn-')
+    server, base_url = start_server(workdir, worker_class, args.workers, args.threads)
+    streams = []
+    try:
+        token = register(base_url)
+        lock = threading.Lock()
+
+        def opener(count):
+            for _ in range(count):
+                sock = open_stream(base_url, token, args.stream_timeout)
+                if sock is not None:
+                    with lock:
+                        streams.append(sock)
+
+        per_thread = -(-args.streams // args.openers)
+        openers = [
+            threading.Thread(target=opener, args=(min(per_thread, args.streams - i * per_thread),))
+            for i in range(args.openers)
+            if args.streams - i * per_thread > 0
+        ]
+        start = time.perf_counter()
+        for thread in openers:
+            thread.start()
+        for thread in openers:
+            thread.join()
+        open_seconds = time.perf_counter() - start
+
+        recorder = Recorder()
+        client = Client(base_url, recorder, token, timeout=args.request_timeout)
+        start = time.perf_counter()
+        failures = 0
+        for i in range(args.requests):
+            status, _, _ = client.request('create_ticket', 'POST', '/api/ticket/new', {'ticket_type': 'WDTIO'[i % 5]})
+            client.request('list_tickets', 'GET', '/api/ticket/list?status=pending')
+            # A worker whose connections are all held by feeds cannot
+            # answer at all; do not wait out every request
+            failures = failures + 1 if status is None else 0
+            if failures == 3:
+                break
+        report = recorder.summary(time.perf_counter() - start)
+    finally:
+        for sock in streams:
+            sock.close()
+        server.terminate()
+        server.wait()
+        shutil.rmtree(workdir, ignore_errors=True)
+    return len(streams), open_seconds, report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--worker-classes', default='gthread,gevent')
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--threads', type=int, default=8, help='gthread threads per worker')
+    parser.add_argument('--streams', type=int, default=500, help='Live feeds to open')
+    parser.add_argument('--openers', type=int, default=50, help='Threads opening feeds')
+    parser.add_argument('--stream-timeout', type=float, default=2, help='Seconds to wait for a feed to start')
+    parser.add_argument('--requests', type=int, default=100, help='Requests per endpoint while the feeds are open')
+    parser.add_argument('--request-timeout', type=float, default=5)
+    args = parser.parse_args()
+
+    print(f"{'worker class':<14}{'feeds open':>11}{'open s':>8}  {'endpoint':<14}{'p50 ms':>8}{'p99 ms':>9}{'errors':>8}")
+    for worker_class in args.worker_classes.split(','):
+        opened, open_seconds, report = measure(worker_class, args)
+        for operation, row in report.items():
+            print(
+                f"{worker_class:<14}{opened:>11}{open_seconds:>8.1f}  {operation:<14}"
+                f"{row['p50_ms']:>8.1f}{row['p99_ms']:>9.1f}{row['error_rate']:>8.1%}"
+            )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""
+Cold-start latency of create_app, as paid by every gunicorn worker boot.
+
+Starts --runs fresh interpreters, each of which imports the app and calls
+create_app('production') on a throwaway SQLite database, and reports the
+median and worst import, create_app and total times. Also counts the SQL
+statements create_app runs, which must be none: schema and seed data are
+managed with `flask bqms init-db` and `flask db upgrade`.
+
+Exits non-zero if create_app touches the database or its median exceeds
+--max-ms.
+
+    python benchmarks/create_app_startup.py --runs 20
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs in each fresh interpreter; prints its timings as JSON
+PROBE = """
+import json, time
+start = time.perf_counter()
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from app.app import create_app
+imported = time.perf_counter()
+statements = []
+event.listen(Engine, 'before_cursor_execute', lambda *args: statements.append(args[2]))
+create_app('production')
+created = time.perf_counter()
+print(json.dumps({
+    'import_ms': (imported - start) * 1000,
+    'create_app_ms': (created - imported) * 1000,
+    'total_ms': (created - start) * 1000,
+    'statements': len(statements),
+}))
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=20)
+    parser.add_argument('--max-ms', type=float, default=500, help='Largest acceptable median create_app time')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bqms-startup-')
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{os.path.join(workdir, 'startup.db')}")
+    try:
+        runs = []
+        for _ in range(args.runs):
+            output = subprocess.run(
+                [sys.executable, '-c', PROBE], cwd=ROOT, env=env, check=True, capture_output=True, text=True,
+            ).stdout
+            runs.append(json.loads(output.strip().splitlines()[-1]))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f'{args.runs} cold starts')
+    print(f"{'phase':<14}{'p50 ms':>9}{'max ms':>9}")
+    for phase in ('import_ms', 'create_app_ms', 'total_ms'):
+        values = [run[phase] for run in runs]
+        print(f"{phase[:-3]:<14}{statistics.median(values):>9.1f}{max(values):>9.1f}")
+    statements = max(run['statements'] for run in runs)
+    print(f'SQL statements in create_app: {statements}')
+
+    failures = []
+    if statements:
+        failures.append('create_app ran SQL statements')
+    median = statistics.median(run['create_app_ms'] for run in runs)
+    if median > args.max_ms:
+        failures.append(f'median create_app time {median:.1f} ms is above {args.max_ms:.0f} ms')
+    if failures:
+        print('; '.join(failures))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,147 @@
+"""
+Memory check of GET /api/ticket/export over a large range.
+
+Fills a throwaway SQLite database with --tickets synthetic tickets spread
+over --days days (those older than a week in ticket_archive), streams the
+whole range through the endpoint without keeping the body, and reports
+throughput and how much the process's peak RSS grew while doing so. Exits
+non-zero if it grew by more than --max-rss-growth-mb: the export must run in
+constant memory whatever the range.
+
+    python benchmarks/export_tickets.py --tickets 1000000 --format csv --gzip
+"""
+import argparse
+import multiprocessing
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+SEED_BATCH = 10000
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def create_app():
+    from app.app import create_app
+    return create_app('production')
+
+
+def seed(count, days):
+    """
+    Create the schema and the tickets. Runs in a child process, so that its
+    memory use does not hide the export's.
+    """
+    from app.db.db import DEFAULT_BRANCH, Branch, Teller, Ticket, TicketArchive, User, db
+
+    with create_app().app_context():
+        db.create_all()
+        db.session.add(Branch(id=DEFAULT_BRANCH, name='Main branch'))
+        db.session.add(User(username='export', email='export@example.com', _password='-'))
+        teller = Teller(name='Teller A', is_active=False)
+        db.session.add(teller)
+        db.session.commit()
+
+        today = datetime.combine(datetime.now().date(), datetime.min.time())
+        first_day = today - timedelta(days=days - 1)
+        cutoff = today - timedelta(days=7)
+        step = days * 86400 / count
+        for offset in range(0, count, SEED_BATCH):
+            hot, archived = [], []
+            for i in range(offset, min(offset + SEED_BATCH, count)):
+                created_at = first_day + timedelta(seconds=i * step)
+                (archived if created_at < cutoff else hot).append({
+                    'id': f'{i:08x}',
+                    'ticket_number': f'{created_at:%Y%m%d}-{"WDTIO"[i % 5]}-{i:07d}',
+                    'ticket_type': 'WDTIO'[i % 5],
+                    'created_at': created_at,
+                    'is_served': i % 2 == 0,
+                    'served_at': created_at + timedelta(minutes=5) if i % 2 == 0 else None,
+                    'teller_id': teller.id if i % 2 == 0 else None,
+                    'is_canceled': i % 7 == 0,
+                    'completed': i % 4 == 0,
+                })
+            for model, rows in ((TicketArchive, archived), (Ticket, hot)):
+                if rows:
+                    db.session.execute(model.__table__.insert(), rows)
+            db.session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--tickets', type=int, default=1000000)
+    parser.add_argument('--days', type=int, default=90)
+    parser.add_argument('--format', choices=('ndjson', 'csv'), default='ndjson')
+    parser.add_argument('--gzip', action='store_true', help='Ask for a gzipped body')
+    parser.add_argument('--max-rss-growth-mb', type=float, default=64)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bqms-export-')
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(workdir, 'export.db')}"
+    try:
+        start = time.perf_counter()
+        seeder = multiprocessing.get_context('spawn').Process(target=seed, args=(args.tickets, args.days))
+        seeder.start()
+        seeder.join()
+        if seeder.exitcode:
+            raise RuntimeError('Seeding failed')
+        print(f'Seeded {args.tickets} tickets in {time.perf_counter() - start:.1f}s')
+
+        from flask_jwt_extended import create_access_token
+        from app.db.db import User
+
+        app = create_app()
+        with app.app_context():
+            token = create_access_token(identity=User.query.first())
+        last_day = datetime.now().date()
+        first_day = last_day - timedelta(days=args.days - 1)
+
+        client = app.test_client()
+        headers = {'Authorization': f'Bearer {token}'}
+        if args.gzip:
+            headers['Accept-Encoding'] = 'gzip'
+
+        def export(start_day, end_day):
+            response = client.get(
+                f'/api/ticket/export?from={start_day:%Y-%m-%d}&to={end_day:%Y-%m-%d}&format={args.format}',
+                headers=headers,
+            )
+            if response.status_code != 200:
+                raise RuntimeError(f'Export failed: {response.status_code} {response.get_data()[:200]}')
+            size = 0
+            for chunk in response.iter_encoded():
+                size += len(chunk)
+            response.close()
+            return size
+
+        # Warm up caches and pools on one day so they do not count as growth
+        export(last_day, last_day)
+        baseline = peak_rss_mb()
+
+        start = time.perf_counter()
+        size = export(first_day, last_day)
+        elapsed = time.perf_counter() - start
+        growth = peak_rss_mb() - baseline
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(
+        f'Exported {args.tickets} tickets ({size / 1e6:.1f} MB {args.format}{" gzip" if args.gzip else ""}) '
+        f'in {elapsed:.1f}s, {args.tickets / elapsed:,.0f} tickets/s'
+    )
+    print(f'Peak RSS {baseline:.1f} MB before, grew by {growth:.1f} MB (budget {args.max_rss_growth_mb:.0f} MB)')
+    if growth > args.max_rss_growth_mb:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
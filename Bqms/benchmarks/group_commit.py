@@ -0,0 +1,90 @@
+"""
+Ticket creation throughput with and without group commit.
+
+Runs the same load twice, first with TICKET_GROUP_COMMIT off and then on:
+--clients concurrent customers each take tickets with POST /api/ticket/new
+back to back for --duration seconds. Reports tickets per second and
+latency for both, and the speed-up.
+
+Uses a throwaway SQLite database per run by default; --database-url runs
+both against a pooled server database instead (e.g. PostgreSQL), which
+must exist and be empty or already initialised with `flask bqms init-db`.
+
+    python benchmarks/group_commit.py --clients 32 --window-ms 5
+    python benchmarks/group_commit.py --database-url postgresql://bqms@localhost/bqms_bench
+"""
+import argparse
+import random
+import shutil
+import tempfile
+import threading
+import time
+
+from branch_day import TICKET_TYPES, Client, Recorder, register, start_server
+
+
+def run(base_url, token, args):
+    recorder = Recorder()
+    stop = threading.Event()
+
+    def customer():
+        client = Client(base_url, recorder, token)
+        while not stop.is_set():
+            client.request('create_ticket', 'POST', '/api/ticket/new', {'ticket_type': random.choice(TICKET_TYPES)})
+
+    threads = [threading.Thread(target=customer, daemon=True) for _ in range(args.clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    stop.wait(args.duration)
+    stop.set()
+    for thread in threads:
+        thread.join(timeout=35)
+    return recorder.summary(time.perf_counter() - start)['create_ticket']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--database-url', help='Server database to use instead of a throwaway SQLite file')
+    parser.add_argument('--duration', type=float, default=15)
+    parser.add_argument('--clients', type=int, default=32)
+    parser.add_argument('--worker-class', default='gthread', help='gunicorn worker class (gthread, gevent, sync)')
+    parser.add_argument('--workers', type=int, default=2, help='gunicorn workers')
+    parser.add_argument('--threads', type=int, default=16, help='gunicorn threads per worker')
+    parser.add_argument('--window-ms', type=float, default=5, help='TICKET_GROUP_COMMIT_WINDOW_MS')
+    parser.add_argument('--max-batch', type=int, default=100, help='TICKET_GROUP_COMMIT_MAX')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+    random.seed(args.seed)
+
+    results = {}
+    for mode in ('off', 'on'):
+        workdir = tempfile.mkdtemp(prefix='bqms-group-commit-')
+        env = {
+            'TICKET_GROUP_COMMIT': 'true' if mode == 'on' else 'false',
+            'TICKET_GROUP_COMMIT_WINDOW_MS': str(args.window_ms),
+            'TICKET_GROUP_COMMIT_MAX': str(args.max_batch),
+        }
+        if args.database_url:
+            env['DATABASE_URL'] = args.database_url
+        server = None
+        try:
+            server, base_url = start_server(workdir, args.worker_class, args.workers, args.threads, env=env)
+            results[mode] = run(base_url, register(base_url), args)
+        finally:
+            if server:
+                server.terminate()
+                server.wait()
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"{'group commit':<14}{'tickets':>9}{'tickets/s':>11}{'p50 ms':>9}{'p99 ms':>9}{'errors':>8}")
+    for mode, row in results.items():
+        print(
+            f"{mode:<14}{row['requests']:>9}{row['throughput']:>11.1f}{row['p50_ms']:>9.1f}{row['p99_ms']:>9.1f}"
+            f"{row['error_rate']:>8.1%}"
+        )
+    print(f"Speed-up: {results['on']['throughput'] / results['off']['throughput']:.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+"""
+Login latency under concurrent load, and its effect on ticket creation.
+
+Starts gunicorn on a throwaway SQLite database with BCRYPT_LOG_ROUNDS set
+to --rounds, then runs two phases of --duration seconds each: --kiosks
+kiosks taking tickets on their own, then the same kiosks while --staff
+users log in back to back, as at the start of a shift. Reports login and
+ticket creation latency for each phase.
+
+Exits non-zero if the p99 of ticket creation during the login burst
+exceeds --max-p99-ms.
+
+    python benchmarks/login.py --staff 16 --rounds 12
+"""
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+from branch_day import TICKET_TYPES, Client, Recorder, start_server
+
+
+def run(base_url, users, args):
+    recorder = Recorder()
+    stop = threading.Event()
+
+    def kiosk():
+        client = Client(base_url, recorder)
+        while not stop.is_set():
+            client.request('create_ticket', 'POST', '/api/ticket/new', {'ticket_type': random.choice(TICKET_TYPES)})
+            stop.wait(random.expovariate(1 / args.arrival_interval))
+
+    def staff(username):
+        client = Client(base_url, recorder)
+        while not stop.is_set():
+            client.request('login', 'POST', '/api/login', {'username': username, 'password': 'benchmark'})
+
+    threads = [threading.Thread(target=kiosk, daemon=True) for _ in range(args.kiosks)]
+    threads += [threading.Thread(target=staff, args=(username,), daemon=True) for username in users]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    stop.wait(args.duration)
+    stop.set()
+    for thread in threads:
+        thread.join(timeout=35)
+    return recorder.summary(time.perf_counter() - start)
+
+
+def create_users(base_url, count):
+    """Register ``count`` users with the password 'benchmark'; their usernames"""
+    client = Client(base_url, Recorder())
+    users = []
+    for i in range(count):
+        username = f'staff-{os.getpid()}-{i}'
+        status, _, payload = client.request(
+            'register', 'POST', '/api/register',
+            {'username': username, 'email': f'{username}@example.com', 'password': 'benchmark'},
+        )
+        if status != 201:
+            raise RuntimeError(f'Could not register a benchmark user: {status} {payload}')
+        users.append(username)
+    return users
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--duration', type=float, default=15)
+    parser.add_argument('--worker-class', default='gthread', help='gunicorn worker class (gthread, gevent, sync)')
+    parser.add_argument('--workers', type=int, default=2, help='gunicorn workers')
+    parser.add_argument('--threads', type=int, default=8, help='gunicorn threads per worker')
+    parser.add_argument('--rounds', type=int, default=12, help='BCRYPT_LOG_ROUNDS')
+    parser.add_argument('--staff', type=int, default=16, help='Users logging in at once')
+    parser.add_argument('--kiosks', type=int, default=8)
+    parser.add_argument('--arrival-interval', type=float, default=0.1, help='Mean seconds between one kiosk\'s tickets')
+    parser.add_argument('--max-p99-ms', type=float, default=500)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+    random.seed(args.seed)
+    os.environ['BCRYPT_LOG_ROUNDS'] = str(args.rounds)
+
+    workdir = tempfile.mkdtemp(prefix='bqms-login-')
+    server = None
+    reports = {}
+    try:
+        server, base_url = start_server(workdir, args.worker_class, args.workers, args.threads)
+        users = create_users(base_url, args.staff)
+        reports['tickets only'] = run(base_url, [], args)
+        reports['with logins'] = run(base_url, users, args)
+    finally:
+        if server:
+            server.terminate()
+            server.wait()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f'BCRYPT_LOG_ROUNDS={args.rounds}, {args.staff} users logging in, {args.kiosks} kiosks')
+    print(f"{'phase':<14}{'operation':<16}{'requests':>9}{'req/s':>9}{'p50 ms':>9}{'p99 ms':>9}{'errors':>8}")
+    for phase, report in reports.items():
+        for operation, row in report.items():
+            print(
+                f"{phase:<14}{operation:<16}{row['requests']:>9}{row['throughput']:>9.1f}{row['p50_ms']:>9.1f}"
+                f"{row['p99_ms']:>9.1f}{row['error_rate']:>8.1%}"
+            )
+
+    p99 = reports['with logins']['create_ticket']['p99_ms']
+    if p99 > args.max_p99_ms:
+        print(f'p99 of ticket creation during logins is {p99:.1f} ms, above {args.max_p99_ms:.0f} ms')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+"""
+Overload test of admission control on the ticket routes.
+
+Starts gunicorn on a throwaway SQLite database twice, first without and then
+with rate limits and an in-flight cap, and runs the same overload against
+both for --duration seconds: --kiosks kiosks taking tickets and --dashboards
+dashboards reading the pending list, far faster than the server can go and
+retrying every failure after --retry-delay seconds, ignoring Retry-After.
+Each sends its own X-Client-Id, which the server is told to key limits by.
+
+It reports, per operation, the requests that got through and their p99
+latency, and how many were rejected with 429/503. Exits non-zero if the p99
+of admitted requests exceeds --max-p99-ms with admission control on.
+
+    python benchmarks/overload.py --kiosks 32 --dashboards 16
+"""
+import argparse
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+from branch_day import TICKET_TYPES, Client, Recorder, register, start_server
+
+
+class Overload:
+    def __init__(self, base_url, token, args):
+        self.base_url = base_url
+        self.token = token
+        self.args = args
+        self.recorder = Recorder()
+        self.stop = threading.Event()
+
+    def actor(self, client_id, operation, method, path, body, interval):
+        client = Client(self.base_url, self.recorder, self.token)
+        headers = {'X-Client-Id': client_id}
+        while not self.stop.is_set():
+            status, _, _ = client.request(operation, method, path, body() if body else None, headers)
+            ok = status is not None and status < 400
+            self.stop.wait(random.expovariate(1 / interval) if ok else self.args.retry_delay)
+
+    def run(self):
+        args = self.args
+        actors = [
+            (f'kiosk-{i}', 'create_ticket', 'POST', '/api/ticket/new',
+             lambda: {'ticket_type': random.choice(TICKET_TYPES)}, args.arrival_interval)
+            for i in range(args.kiosks)
+        ]
+        actors += [
+            (f'dashboard-{i}', 'list_pending', 'GET', '/api/ticket/list?status=pending&limit=50',
+             None, args.poll_interval)
+            for i in range(args.dashboards)
+        ]
+        threads = [threading.Thread(target=self.actor, args=actor, daemon=True) for actor in actors]
+
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        self.stop.wait(args.duration)
+        self.stop.set()
+        for thread in threads:
+            thread.join(timeout=35)
+        return self.recorder.summary(time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--duration', type=float, default=20)
+    parser.add_argument('--worker-class', default='gthread', help='gunicorn worker class (gthread, gevent, sync)')
+    parser.add_argument('--workers', type=int, default=2, help='gunicorn workers')
+    parser.add_argument('--threads', type=int, default=8, help='gunicorn threads per worker')
+    parser.add_argument('--kiosks', type=int, default=32)
+    parser.add_argument('--arrival-interval', type=float, default=0.1, help='Mean seconds between one kiosk\'s tickets')
+    parser.add_argument('--dashboards', type=int, default=16)
+    parser.add_argument('--poll-interval', type=float, default=0.1)
+    parser.add_argument('--retry-delay', type=float, default=0.2, help='Seconds before retrying a failed request')
+    parser.add_argument('--write-rate', type=float, default=1, help='RATE_LIMIT_WRITE_RATE')
+    parser.add_argument('--read-rate', type=float, default=2, help='RATE_LIMIT_READ_RATE')
+    parser.add_argument('--max-in-flight', type=int, default=4, help='MAX_IN_FLIGHT per worker')
+    parser.add_argument('--max-p99-ms', type=float, default=500)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+    random.seed(args.seed)
+
+    modes = {
+        'off': {'RATE_LIMIT_ENABLED': 'false', 'MAX_IN_FLIGHT': '0'},
+        'on': {
+            'RATE_LIMIT_ENABLED': 'true',
+            'RATE_LIMIT_WRITE_RATE': str(args.write_rate),
+            'RATE_LIMIT_WRITE_BURST': '5',
+            'RATE_LIMIT_READ_RATE': str(args.read_rate),
+            'RATE_LIMIT_READ_BURST': '5',
+            'RATE_LIMIT_CLIENT_HEADER': 'X-Client-Id',
+            'MAX_IN_FLIGHT': str(args.max_in_flight),
+        },
+    }
+    reports = {}
+    for mode, env in modes.items():
+        workdir = tempfile.mkdtemp(prefix='bqms-overload-')
+        server = None
+        try:
+            env = dict(env, RATE_LIMIT_STORE=f'{workdir}/rate-limits.db')
+            server, base_url = start_server(workdir, args.worker_class, args.workers, args.threads, env=env)
+            reports[mode] = Overload(base_url, register(base_url), args).run()
+        finally:
+            if server:
+                server.terminate()
+                server.wait()
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"{'admission':<11}{'operation':<16}{'requests':>9}{'admitted/s':>12}{'p99 ms':>9}{'rejected':>10}")
+    for mode, report in reports.items():
+        for operation, row in report.items():
+            admitted = row['admitted'] * row['throughput'] / row['requests']
+            print(
+                f"{mode:<11}{operation:<16}{row['requests']:>9}{admitted:>12.1f}{row['admitted_p99_ms']:>9.1f}"
+                f"{row['rejected_rate']:>10.1%}"
+            )
+
+    slow = [operation for operation, row in reports['on'].items() if row['admitted_p99_ms'] > args.max_p99_ms]
+    if slow:
+        print(f"p99 of admitted requests above {args.max_p99_ms:.0f} ms with admission control: {', '.join(slow)}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+"""
+Microbenchmark of the ticket list serialization path.
+
+Compares, per 10k tickets, the original path (Ticket instances, to_json,
+Flask's json-based jsonify) with the current one (rows selected with
+json_columns, ticket_rows_json, the orjson provider when installed).
+
+    python benchmarks/serialize_tickets.py [--tickets 10000] [--repeat 5]
+"""
+import argparse
+import os
+import sys
+import timeit
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+from app.db.db import Teller, Ticket, db, ticket_rows_json
+from app.utils.json_provider import ORJSONProvider, orjson
+
+
+def make_app(count):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        teller = Teller(name='Teller A', is_active=True)
+        db.session.add(teller)
+        db.session.flush()
+        start = datetime(2026, 1, 5, 8, 0, 0)
+        db.session.execute(db.insert(Ticket), [
+            {
+                'id': f'{i:08x}',
+                'ticket_number': f'20260105-{"WDTIO"[i % 5]}-{i:05d}',
+                'ticket_type': 'WDTIO'[i % 5],
+                'created_at': start + timedelta(seconds=i),
+                'is_served': i % 2 == 0,
+                'teller_id': teller.id if i % 2 == 0 else None,
+                'is_canceled': i % 7 == 0,
+                'completed': i % 4 == 0,
+            }
+            for i in range(count)
+        ])
+        db.session.commit()
+    return app
+
+
+def best(fn, repeat):
+    return min(timeit.repeat(fn, number=1, repeat=repeat))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--tickets', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    app = make_app(args.tickets)
+    fields = list(Ticket.JSON_COLUMNS)
+    scale = 10000 / args.tickets
+
+    with app.app_context():
+        db.session.expire_on_commit = False
+        instances = Ticket.query.options(db.joinedload(Ticket.teller)).all()
+        query = db.select(*Ticket.json_columns(fields)).outerjoin(Teller, Ticket.teller_id == Teller.id)
+        rows = db.session.execute(query).all()
+
+        default_json = DefaultJSONProvider(app)
+        fast_json = ORJSONProvider(app) if orjson else default_json
+
+        before_dicts = [ticket.to_json() for ticket in instances]
+        after_dicts = ticket_rows_json(rows, fields)
+        assert before_dicts == after_dicts
+
+        results = [
+            ('build dicts: to_json on instances', best(lambda: [t.to_json() for t in instances], args.repeat)),
+            ('build dicts: ticket_rows_json on rows', best(lambda: ticket_rows_json(rows, fields), args.repeat)),
+            ('encode: Flask json provider', best(lambda: default_json.response(before_dicts), args.repeat)),
+            ('encode: orjson provider' if orjson else 'encode: orjson not installed',
+             best(lambda: fast_json.response(after_dicts), args.repeat)),
+        ]
+        before = best(lambda: default_json.response([t.to_json() for t in instances]), args.repeat)
+        after = best(lambda: fast_json.response(ticket_rows_json(rows, fields)), args.repeat)
+
+    print(f'{args.tickets} tickets, best of {args.repeat}, ms per 10k tickets')
+    for name, seconds in results:
+        print(f'  {name:<42} {seconds * 1000 * scale:8.1f}')
+    print(f'  {"total before":<42} {before * 1000 * scale:8.1f}')
+    print(f'  {"total after":<42} {after * 1000 * scale:8.1f}  ({before / after:.1f}x)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+"""
+gunicorn settings, read from the environment. gunicorn loads this file
+automatically when started from this directory.
+
+GUNICORN_WORKER_CLASS picks the serving mode:
+
+- ``gthread`` (default): each worker serves GUNICORN_THREADS requests at
+  once. Every open live feed (GET /api/ticket/events) holds a thread.
+- ``gevent``: each worker multiplexes up to GUNICORN_WORKER_CONNECTIONS
+  connections on greenlets, so thousands of idle feeds cost little. Needs
+  the gevent package. Calls gevent cannot make cooperative pause the whole
+  worker while they run: bcrypt is therefore moved to native threads (see
+  app/utils/passwords.py), and with SQLite each worker uses a single
+  database connection that greenlets queue for (see initialize_db), which
+  rules out TICKET_NUMBER_BLOCK_SIZE.
+
+Sizing: GUNICORN_WORKERS defaults to 2 x CPUs + 1 for gthread and to the
+CPU count for gevent. A worker never uses more database connections than
+DB_POOL_SIZE + DB_MAX_OVERFLOW, and requests beyond that wait up to
+DB_POOL_TIMEOUT for one, so workers x (DB_POOL_SIZE + DB_MAX_OVERFLOW)
+must stay below the database server's connection limit.
+"""
+import multiprocessing
+import os
+
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gthread')
+_gevent = worker_class in ('gevent', 'gunicorn.workers.ggevent.GeventWorker')
+
+bind = os.getenv('GUNICORN_BIND', f"0.0.0.0:{os.getenv('PORT', '5000')}")
+workers = int(os.getenv(
+    'GUNICORN_WORKERS',
+    multiprocessing.cpu_count() if _gevent else multiprocessing.cpu_count() * 2 + 1,
+))
+threads = int(os.getenv('GUNICORN_THREADS', 8))
+worker_connections = int(os.getenv('GUNICORN_WORKER_CONNECTIONS', 1000))
+# Live feeds stay open far longer than this; the timeout only applies to
+# workers that stop responding altogether
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 30))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', 5))
+# Do not preload: gevent must patch the standard library before the app
+# and its database drivers are imported
+preload_app = False
+
+
+def _uses_gevent(cfg):
+    # The command line may override worker_class above
+    return 'gevent' in cfg.worker_class_str.lower()
+
+
+def post_fork(server, worker):
+    if _uses_gevent(server.cfg):
+        # psycopg2 only yields to other greenlets once patched
+        try:
+            from psycogreen.gevent import patch_psycopg
+        except ImportError:
+            return
+        patch_psycopg()
+
+
+def when_ready(server):
+    cfg = server.cfg
+    server.log.info(
+        'Serving with %d %s worker(s), up to %d concurrent connections each',
+        cfg.workers, cfg.worker_class_str, cfg.worker_connections if _uses_gevent(cfg) else cfg.threads,
+    )
@@ -0,0 +1,50 @@
+"""add indexes for the ticket list and queue queries
+
+Revision ID: 3f1c2a7d9b04
+Revises: 0e9b6e9e495c
+Create Date: 2026-10-18 09:12:41.518203
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1c2a7d9b04'
+down_revision = '0e9b6e9e495c'
+branch_labels = None
+depends_on = None
+
+
+is_served = sa.column('is_served')
+completed = sa.column('completed')
+is_canceled = sa.column('is_canceled')
+
+# Partial indexes: one per status filter in get_ticket_list
+STATUS_INDEXES = {
+    'ix_ticket_pending_created_at': is_served == sa.false(),
+    'ix_ticket_served_created_at': sa.and_(
+        is_served == sa.true(), completed == sa.false(), is_canceled == sa.false()
+    ),
+    'ix_ticket_completed_created_at': sa.and_(is_served == sa.true(), completed == sa.true()),
+    'ix_ticket_canceled_created_at': is_canceled == sa.true(),
+}
+
+
+def upgrade():
+    op.create_index('ix_ticket_created_at', 'ticket', ['created_at'], unique=False)
+    for name, where in STATUS_INDEXES.items():
+        op.create_index(
+            name, 'ticket', ['created_at'], unique=False,
+            sqlite_where=where, postgresql_where=where,
+        )
+    op.create_index('ix_ticket_teller_id', 'ticket', ['teller_id'], unique=False)
+    op.create_index('ix_ticket_type_created_at', 'ticket', ['ticket_type', 'created_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_ticket_type_created_at', table_name='ticket')
+    op.drop_index('ix_ticket_teller_id', table_name='ticket')
+    for name in reversed(list(STATUS_INDEXES)):
+        op.drop_index(name, table_name='ticket')
+    op.drop_index('ix_ticket_created_at', table_name='ticket')
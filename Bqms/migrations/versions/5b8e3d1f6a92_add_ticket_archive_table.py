@@ -0,0 +1,42 @@
+"""add ticket_archive table for archived tickets
+
+Revision ID: 5b8e3d1f6a92
+Revises: c51e7f0a9d23
+Create Date: 2026-10-18 15:03:51.114820
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b8e3d1f6a92'
+down_revision = 'c51e7f0a9d23'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('ticket_archive',
+    sa.Column('id', sa.String(length=36), nullable=False),
+    sa.Column('ticket_number', sa.String(length=20), nullable=False),
+    sa.Column('ticket_type', sa.String(length=1), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('is_served', sa.Boolean(), nullable=True),
+    sa.Column('served_at', sa.DateTime(), nullable=True),
+    sa.Column('teller_id', sa.String(length=36), nullable=True),
+    sa.Column('is_canceled', sa.Boolean(), nullable=True),
+    sa.Column('completed', sa.Boolean(), nullable=True),
+    sa.ForeignKeyConstraint(['teller_id'], ['teller.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('ticket_number')
+    )
+    with op.batch_alter_table('ticket_archive', schema=None) as batch_op:
+        batch_op.create_index('ix_ticket_archive_created_at', ['created_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('ticket_archive', schema=None) as batch_op:
+        batch_op.drop_index('ix_ticket_archive_created_at')
+
+    op.drop_table('ticket_archive')
@@ -0,0 +1,36 @@
+"""add queue_event table for the live queue feed
+
+Revision ID: 8a4d6e2c1f57
+Revises: 3f1c2a7d9b04
+Create Date: 2026-10-18 11:40:03.207716
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8a4d6e2c1f57'
+down_revision = '3f1c2a7d9b04'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('queue_event',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('kind', sa.String(length=32), nullable=False),
+    sa.Column('payload', sa.Text(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sqlite_autoincrement=True
+    )
+    with op.batch_alter_table('queue_event', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_queue_event_created_at'), ['created_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('queue_event', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_queue_event_created_at'))
+
+    op.drop_table('queue_event')
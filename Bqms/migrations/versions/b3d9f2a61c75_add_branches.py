@@ -0,0 +1,169 @@
+"""add branches and scope tickets, tellers and counters by branch
+
+Revision ID: b3d9f2a61c75
+Revises: e7a92c4b0d18
+Create Date: 2026-10-18 16:41:09.207354
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b3d9f2a61c75'
+down_revision = 'e7a92c4b0d18'
+branch_labels = None
+depends_on = None
+
+
+DEFAULT_BRANCH = 'main'
+
+# The original tables were created without Alembic and their single column
+# UNIQUE constraints have no name on SQLite; batch mode names them after
+# this convention so they can be dropped
+NAMING = {'uq': 'uq_%(table_name)s_%(column_0_name)s'}
+
+is_served = sa.column('is_served')
+completed = sa.column('completed')
+is_canceled = sa.column('is_canceled')
+
+STATUS_FILTERS = {
+    'pending': is_served == sa.false(),
+    'served': sa.and_(is_served == sa.true(), completed == sa.false(), is_canceled == sa.false()),
+    'completed': sa.and_(is_served == sa.true(), completed == sa.true()),
+    'canceled': is_canceled == sa.true(),
+}
+
+# Tables that only gain a branch_id column and change their unique key
+KEYED_TABLES = {
+    'ticket_daily_stats': ('uq_ticket_daily_stats_key', ['day', 'ticket_type', 'teller_id']),
+    'ticket_wait_histogram': ('uq_ticket_wait_histogram_key', ['day', 'ticket_type', 'teller_id', 'bucket']),
+}
+
+
+def branch_column():
+    return sa.Column('branch_id', sa.String(length=36), server_default=DEFAULT_BRANCH, nullable=False)
+
+
+def unique_name(table, columns):
+    """Name of the unique constraint on exactly ``columns``, as batch mode sees it"""
+    for constraint in sa.inspect(op.get_bind()).get_unique_constraints(table):
+        if constraint['column_names'] == columns:
+            return constraint['name'] or f'uq_{table}_{columns[0]}'
+    return None
+
+
+def replace_unique(table, old_columns, new_name, new_columns, *, add_branch, foreign_key=None):
+    old_name = unique_name(table, old_columns)
+    with op.batch_alter_table(table, naming_convention=NAMING) as batch_op:
+        if add_branch:
+            batch_op.add_column(branch_column())
+            if foreign_key:
+                batch_op.create_foreign_key(foreign_key, 'branch', ['branch_id'], ['id'])
+        if old_name:
+            batch_op.drop_constraint(old_name, type_='unique')
+        batch_op.create_unique_constraint(new_name, new_columns)
+
+
+def restore_unique(table, new_name, old_name, old_columns, *, drop_branch, foreign_key=None):
+    with op.batch_alter_table(table) as batch_op:
+        batch_op.drop_constraint(new_name, type_='unique')
+        batch_op.create_unique_constraint(old_name, old_columns)
+        if drop_branch:
+            if foreign_key:
+                batch_op.drop_constraint(foreign_key, type_='foreignkey')
+            batch_op.drop_column('branch_id')
+
+
+def upgrade():
+    op.create_table('branch',
+    sa.Column('id', sa.String(length=36), nullable=False),
+    sa.Column('name', sa.String(length=80), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.bulk_insert(
+        sa.table('branch', sa.column('id'), sa.column('name')),
+        [{'id': DEFAULT_BRANCH, 'name': 'Main branch'}],
+    )
+
+    # Existing rows all belong to the default branch
+    with op.batch_alter_table('teller', schema=None) as batch_op:
+        batch_op.add_column(branch_column())
+        batch_op.create_foreign_key('fk_teller_branch_id', 'branch', ['branch_id'], ['id'])
+        batch_op.create_index('ix_teller_branch_active', ['branch_id', 'is_active'], unique=False)
+
+    # Partial indexes are dropped before the table is rebuilt, which would
+    # lose their WHERE clause on SQLite, and recreated per branch
+    for status in STATUS_FILTERS:
+        op.drop_index(f'ix_ticket_{status}_created_at', table_name='ticket')
+    replace_unique(
+        'ticket', ['ticket_number'], 'uq_ticket_branch_number', ['branch_id', 'ticket_number'],
+        add_branch=True, foreign_key='fk_ticket_branch_id',
+    )
+    op.create_index('ix_ticket_branch_created_at', 'ticket', ['branch_id', 'created_at'], unique=False)
+    for status, where in STATUS_FILTERS.items():
+        op.create_index(
+            f'ix_ticket_branch_{status}_created_at', 'ticket', ['branch_id', 'created_at'], unique=False,
+            sqlite_where=where, postgresql_where=where,
+        )
+
+    replace_unique(
+        'ticket_archive', ['ticket_number'], 'uq_ticket_archive_branch_number', ['branch_id', 'ticket_number'],
+        add_branch=True,
+    )
+    op.create_index('ix_ticket_archive_branch_created_at', 'ticket_archive', ['branch_id', 'created_at'], unique=False)
+
+    replace_unique(
+        'daily_counter', ['date'], 'uq_daily_counter_branch_date', ['branch_id', 'date'], add_branch=True,
+    )
+
+    for table, (name, columns) in KEYED_TABLES.items():
+        replace_unique(table, columns, name, ['branch_id'] + columns, add_branch=True)
+
+    with op.batch_alter_table('queue_event', schema=None) as batch_op:
+        batch_op.add_column(branch_column())
+
+    # Scopes now name the branch; the old ones are simply never read again
+    with op.batch_alter_table('list_version', schema=None) as batch_op:
+        batch_op.alter_column('scope', existing_type=sa.String(length=40), type_=sa.String(length=100), existing_nullable=False)
+
+
+def downgrade():
+    # Fails on purpose if several branches have issued the same ticket
+    # number or counted the same day: the old schema cannot hold both
+    with op.batch_alter_table('list_version', schema=None) as batch_op:
+        batch_op.alter_column('scope', existing_type=sa.String(length=100), type_=sa.String(length=40), existing_nullable=False)
+
+    with op.batch_alter_table('queue_event', schema=None) as batch_op:
+        batch_op.drop_column('branch_id')
+
+    for table, (name, columns) in KEYED_TABLES.items():
+        restore_unique(table, name, name, columns, drop_branch=True)
+
+    restore_unique('daily_counter', 'uq_daily_counter_branch_date', 'uq_daily_counter_date', ['date'], drop_branch=True)
+
+    op.drop_index('ix_ticket_archive_branch_created_at', table_name='ticket_archive')
+    restore_unique(
+        'ticket_archive', 'uq_ticket_archive_branch_number', 'uq_ticket_archive_ticket_number', ['ticket_number'],
+        drop_branch=True,
+    )
+
+    for status in STATUS_FILTERS:
+        op.drop_index(f'ix_ticket_branch_{status}_created_at', table_name='ticket')
+    op.drop_index('ix_ticket_branch_created_at', table_name='ticket')
+    restore_unique(
+        'ticket', 'uq_ticket_branch_number', 'uq_ticket_ticket_number', ['ticket_number'],
+        drop_branch=True, foreign_key='fk_ticket_branch_id',
+    )
+    for status, where in STATUS_FILTERS.items():
+        op.create_index(
+            f'ix_ticket_{status}_created_at', 'ticket', ['created_at'], unique=False,
+            sqlite_where=where, postgresql_where=where,
+        )
+
+    with op.batch_alter_table('teller', schema=None) as batch_op:
+        batch_op.drop_index('ix_teller_branch_active')
+        batch_op.drop_constraint('fk_teller_branch_id', type_='foreignkey')
+        batch_op.drop_column('branch_id')
+
+    op.drop_table('branch')
@@ -0,0 +1,47 @@
+"""add daily ticket statistics rollup tables
+
+Revision ID: c51e7f0a9d23
+Revises: 8a4d6e2c1f57
+Create Date: 2026-10-18 14:12:37.518402
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c51e7f0a9d23'
+down_revision = '8a4d6e2c1f57'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('ticket_daily_stats',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('ticket_type', sa.String(length=1), nullable=False),
+    sa.Column('teller_id', sa.String(length=36), nullable=False),
+    sa.Column('issued', sa.Integer(), nullable=False),
+    sa.Column('served', sa.Integer(), nullable=False),
+    sa.Column('completed', sa.Integer(), nullable=False),
+    sa.Column('canceled', sa.Integer(), nullable=False),
+    sa.Column('wait_seconds', sa.Float(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('day', 'ticket_type', 'teller_id', name='uq_ticket_daily_stats_key')
+    )
+    op.create_table('ticket_wait_histogram',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('ticket_type', sa.String(length=1), nullable=False),
+    sa.Column('teller_id', sa.String(length=36), nullable=False),
+    sa.Column('bucket', sa.Integer(), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('day', 'ticket_type', 'teller_id', 'bucket', name='uq_ticket_wait_histogram_key')
+    )
+
+
+def downgrade():
+    op.drop_table('ticket_wait_histogram')
+    op.drop_table('ticket_daily_stats')
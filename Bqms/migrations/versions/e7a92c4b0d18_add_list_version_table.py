@@ -0,0 +1,30 @@
+"""add list_version table for list ETags
+
+Revision ID: e7a92c4b0d18
+Revises: 5b8e3d1f6a92
+Create Date: 2026-10-18 15:47:22.630915
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e7a92c4b0d18'
+down_revision = '5b8e3d1f6a92'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('list_version',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('scope', sa.String(length=40), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('scope')
+    )
+
+
+def downgrade():
+    op.drop_table('list_version')
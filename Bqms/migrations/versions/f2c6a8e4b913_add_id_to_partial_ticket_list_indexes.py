@@ -0,0 +1,44 @@
+"""add id to the partial ticket list indexes
+
+Revision ID: f2c6a8e4b913
+Revises: d4f81c2e7a36
+Create Date: 2026-10-18 21:07:44.502913
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2c6a8e4b913'
+down_revision = 'd4f81c2e7a36'
+branch_labels = None
+depends_on = None
+
+is_served = sa.column('is_served')
+completed = sa.column('completed')
+is_canceled = sa.column('is_canceled')
+
+STATUS_FILTERS = {
+    'pending': is_served == sa.false(),
+    'served': sa.and_(is_served == sa.true(), completed == sa.false(), is_canceled == sa.false()),
+    'completed': sa.and_(is_served == sa.true(), completed == sa.true()),
+    'canceled': is_canceled == sa.true(),
+}
+
+
+def recreate_indexes(columns):
+    for status, where in STATUS_FILTERS.items():
+        op.drop_index(f'ix_ticket_branch_{status}_created_at', table_name='ticket')
+        op.create_index(
+            f'ix_ticket_branch_{status}_created_at', 'ticket', columns, unique=False,
+            sqlite_where=where, postgresql_where=where,
+        )
+
+
+def upgrade():
+    recreate_indexes(['branch_id', 'created_at', 'id'])
+
+
+def downgrade():
+    recreate_indexes(['branch_id', 'created_at'])
@@ -0,0 +1,80 @@
+from contextlib import contextmanager
+
+import pytest
+from flask_jwt_extended import create_access_token
+from sqlalchemy import event
+
+from app.app import create_app
+from app.config.config import TestingConfig
+from app.db.db import Teller, User, db
+from app.initialize_functions import create_branch, create_tellers
+
+
+@pytest.fixture
+def make_app(tmp_path, monkeypatch):
+    """Build an app on a fresh SQLite file with the main branch and its tellers"""
+    def make(**config):
+        monkeypatch.setattr(TestingConfig, 'SQLALCHEMY_DATABASE_URI', f"sqlite:///{tmp_path / 'test.db'}")
+        for name, value in config.items():
+            monkeypatch.setattr(TestingConfig, name, value)
+        app = create_app('testing')
+        with app.app_context():
+            db.create_all()
+            create_branch('main', 'Main branch')
+            create_tellers()
+        return app
+    return make
+
+
+@pytest.fixture
+def app(make_app):
+    return make_app()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def auth_headers_for():
+    """Headers authenticating a new user of ``app``"""
+    def headers(app):
+        with app.app_context():
+            user = User(username='tester', email='tester@example.com')
+            user.password = 'secret'
+            db.session.add(user)
+            db.session.commit()
+            return {'Authorization': f'Bearer {create_access_token(identity=user)}'}
+    return headers
+
+
+@pytest.fixture
+def auth_headers(app, auth_headers_for):
+    return auth_headers_for(app)
+
+
+@pytest.fixture
+def teller_ids(app):
+    with app.app_context():
+        return [teller.id for teller in Teller.query.filter_by(branch_id='main').order_by(Teller.name)]
+
+
+@pytest.fixture
+def capture_statements():
+    """Context manager collecting the (statement, parameters) ``app`` executes inside it"""
+    @contextmanager
+    def capture(app):
+        with app.app_context():
+            engine = db.engine
+        statements = []
+
+        def record(connection, cursor, statement, parameters, context, executemany):
+            statements.append((statement, parameters))
+
+        event.listen(engine, 'before_cursor_execute', record)
+        try:
+            yield statements
+        finally:
+            event.remove(engine, 'before_cursor_execute', record)
+    return capture
@@ -0,0 +1,74 @@
+import threading
+import time
+
+
+def test_clients_over_their_budget_get_429_before_any_sql(make_app, tmp_path, capture_statements):
+    app = make_app(
+        RATE_LIMIT_ENABLED=True, RATE_LIMIT_WRITE_RATE=0.01, RATE_LIMIT_WRITE_BURST=2,
+        RATE_LIMIT_STORE=str(tmp_path / 'rate-limits.db'),
+    )
+    client = app.test_client()
+    for _ in range(2):
+        assert client.post('/api/ticket/new', json={'ticket_type': 'W'}).status_code == 201
+
+    with capture_statements(app) as statements:
+        response = client.post('/api/ticket/new', json={'ticket_type': 'W'})
+    assert response.status_code == 429
+    assert int(response.headers['Retry-After']) >= 1
+    assert statements == []
+
+
+def test_busy_worker_answers_503_before_any_sql(make_app, capture_statements):
+    app = make_app(MAX_IN_FLIGHT=2)
+    slots = app.extensions['admission']._slots
+    # Two requests already running
+    slots.acquire()
+    slots.acquire()
+    try:
+        with capture_statements(app) as statements:
+            response = app.test_client().post('/api/ticket/new', json={'ticket_type': 'W'})
+    finally:
+        slots.release()
+        slots.release()
+    assert response.status_code == 503
+    assert int(response.headers['Retry-After']) >= 1
+    assert statements == []
+
+
+def test_admitted_requests_stay_fast_under_overload(make_app, auth_headers_for):
+    app = make_app(MAX_IN_FLIGHT=2)
+    headers = auth_headers_for(app)
+    latencies = []
+    rejected = []
+    stop = threading.Event()
+
+    def client(path):
+        client = app.test_client()
+        while not stop.is_set():
+            started = time.perf_counter()
+            if path.endswith('/new'):
+                response = client.post(path, json={'ticket_type': 'W'})
+            else:
+                response = client.get(path, headers=headers)
+            seconds = time.perf_counter() - started
+            if response.status_code == 503:
+                assert response.headers['Retry-After']
+                rejected.append(seconds)
+                # Retry soon, ignoring Retry-After, as an impatient kiosk would
+                time.sleep(0.1)
+            else:
+                assert response.status_code < 400
+                latencies.append(seconds)
+
+    paths = ['/api/ticket/new'] * 8 + ['/api/ticket/list?status=pending&limit=50'] * 8
+    threads = [threading.Thread(target=client, args=(path,)) for path in paths]
+    for thread in threads:
+        thread.start()
+    time.sleep(2)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    assert rejected and latencies
+    latencies.sort()
+    assert latencies[int(len(latencies) * 0.99)] < 1.0
@@ -0,0 +1,44 @@
+from datetime import datetime, timedelta
+
+from app.db.db import Ticket, TicketArchive, db
+from app.modules.ticket.archive import archive_tickets
+
+
+def issue_past_day(app, count):
+    """``count`` tickets issued an hour apart ten days ago; their ids in order"""
+    day = datetime.combine(datetime.now().date() - timedelta(days=10), datetime.min.time())
+    with app.app_context():
+        tickets = [
+            Ticket(ticket_number=f'{day:%Y%m%d}-W-{i:03}', ticket_type='W', created_at=day + timedelta(hours=i))
+            for i in range(count)
+        ]
+        db.session.add_all(tickets)
+        db.session.commit()
+        return day, [ticket.id for ticket in tickets]
+
+
+def test_partly_archived_day_lists_every_ticket_once(app, client, auth_headers):
+    day, ids = issue_past_day(app, 10)
+    with app.app_context():
+        # The archive job stopped half way through the day
+        assert archive_tickets(day + timedelta(hours=5), batch_size=2) == 5
+        assert TicketArchive.query.count() == 5 and Ticket.query.count() == 5
+
+    listed = []
+    url = f'/api/ticket/list?date={day:%Y-%m-%d}&limit=3'
+    page = client.get(url, headers=auth_headers).get_json()
+    listed += [ticket['id'] for ticket in page['tickets']]
+    while page['next_cursor']:
+        page = client.get(f"{url}&cursor={page['next_cursor']}", headers=auth_headers).get_json()
+        listed += [ticket['id'] for ticket in page['tickets']]
+    assert listed == ids
+
+
+def test_archived_ticket_is_expired(app, client):
+    day, _ = issue_past_day(app, 1)
+    with app.app_context():
+        archive_tickets(day + timedelta(days=1), batch_size=10)
+
+    response = client.post('/api/ticket/valid', json={'ticket_number': f'{day:%Y%m%d}-W-000'})
+    assert response.status_code == 400
+    assert response.get_json() == {'status': 'error', 'message': 'Ticket is expired'}
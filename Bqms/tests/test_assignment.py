@@ -0,0 +1,113 @@
+import random
+import threading
+
+from sqlalchemy.exc import OperationalError
+
+from app.db.db import Teller, Ticket, db
+from app.modules.ticket import route
+
+THREADS = 8
+OPERATIONS_PER_THREAD = 60
+
+
+def open_tickets_by_teller(app):
+    """teller id -> ids of the tickets it is serving (served, not completed or canceled)"""
+    with app.app_context():
+        rows = db.session.execute(
+            db.select(Ticket.teller_id, Ticket.id).where(
+                Ticket.is_served == True,
+                Ticket.is_canceled == False,
+                db.or_(Ticket.completed == False, Ticket.completed == None),
+            )
+        ).all()
+    tickets = {}
+    for teller_id, ticket_id in rows:
+        tickets.setdefault(teller_id, []).append(ticket_id)
+    return tickets
+
+
+def test_concurrent_assignment_never_double_books_a_teller(app, auth_headers, teller_ids):
+    client = app.test_client()
+    response = client.post('/api/ticket/batch', json={'tickets': [{'ticket_type': 'W'}] * 120})
+    assert response.status_code == 201
+    tickets = [(ticket['id'], ticket['ticket_number']) for ticket in response.get_json()['tickets']]
+
+    errors = []
+
+    def worker(seed):
+        rng = random.Random(seed)
+        client = app.test_client()
+        try:
+            for _ in range(OPERATIONS_PER_THREAD):
+                ticket_id, ticket_number = rng.choice(tickets)
+                teller_id = rng.choice(teller_ids)
+                operation = rng.choice(('serve', 'auto_assign', 'next', 'complete', 'cancel'))
+                if operation == 'serve':
+                    response = client.post(
+                        f'/api/ticket/{ticket_id}/serve', json={'teller_id': teller_id}, headers=auth_headers
+                    )
+                elif operation == 'auto_assign':
+                    response = client.get(f'/api/tickets/{ticket_id}/auto-assign')
+                elif operation == 'next':
+                    response = client.post(f'/api/tellers/{teller_id}/next')
+                elif operation == 'complete':
+                    response = client.put(f'/api/ticket/{ticket_id}/complete', headers=auth_headers)
+                else:
+                    response = client.post('/api/ticket/cancel', json={'ticket_number': ticket_number})
+                if response.status_code >= 500:
+                    errors.append((operation, response.status_code, response.get_data(as_text=True)))
+        except Exception as e:  # pragma: no cover - reported below
+            errors.append(('exception', repr(e)))
+
+    threads = [threading.Thread(target=worker, args=(seed,)) for seed in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert not errors
+
+    open_tickets = open_tickets_by_teller(app)
+    assert all(len(ids) <= 1 for ids in open_tickets.values()), open_tickets
+    with app.app_context():
+        busy = {teller.id: teller.is_active for teller in Teller.query.filter_by(branch_id='main')}
+    assert busy == {teller_id: teller_id in open_tickets for teller_id in teller_ids}
+
+
+def test_closing_a_closed_ticket_does_not_free_its_teller(app, client, auth_headers, teller_ids):
+    teller_id = teller_ids[0]
+    response = client.post('/api/ticket/batch', json={'tickets': [{'ticket_type': 'W'}] * 4})
+    first, second, third, fourth = response.get_json()['tickets']
+
+    # Cancel after complete: the teller has moved on to the second ticket
+    assert client.post(f"/api/ticket/{first['id']}/serve", json={'teller_id': teller_id}, headers=auth_headers).status_code == 200
+    assert client.put(f"/api/ticket/{first['id']}/complete", headers=auth_headers).status_code == 200
+    assert client.post(f"/api/ticket/{second['id']}/serve", json={'teller_id': teller_id}, headers=auth_headers).status_code == 200
+    assert client.post('/api/ticket/cancel', json={'ticket_number': first['ticket_number']}).status_code == 409
+    with app.app_context():
+        assert db.session.get(Teller, teller_id).is_active
+    assert client.put(f"/api/ticket/{second['id']}/complete", headers=auth_headers).status_code == 200
+
+    # Complete after cancel: the teller has moved on to the fourth ticket
+    assert client.post(f"/api/ticket/{third['id']}/serve", json={'teller_id': teller_id}, headers=auth_headers).status_code == 200
+    assert client.post('/api/ticket/cancel', json={'ticket_number': third['ticket_number']}).status_code == 200
+    assert client.post(f"/api/ticket/{fourth['id']}/serve", json={'teller_id': teller_id}, headers=auth_headers).status_code == 200
+    assert client.put(f"/api/ticket/{third['id']}/complete", headers=auth_headers).status_code == 409
+    with app.app_context():
+        assert db.session.get(Teller, teller_id).is_active
+    assert open_tickets_by_teller(app) == {teller_id: [fourth['id']]}
+
+
+def test_failed_claim_puts_the_ticket_back_in_the_queue(app, client, auth_headers, teller_ids, monkeypatch):
+    ticket = client.post('/api/ticket/new', json={'ticket_type': 'W'}).get_json()['ticket']
+
+    def locked(ticket_id, teller_id):
+        raise OperationalError('UPDATE ticket', {}, Exception('database is locked'))
+
+    with monkeypatch.context() as patch:
+        patch.setattr(route, 'claim_ticket', locked)
+        assert client.post(f'/api/tellers/{teller_ids[0]}/next', headers=auth_headers).status_code == 500
+
+    response = client.post(f'/api/tellers/{teller_ids[0]}/next', headers=auth_headers)
+    assert response.status_code == 200
+    assert response.get_json()['ticket']['id'] == ticket['id']
@@ -0,0 +1,83 @@
+import pytest
+
+from app.db.db import Teller
+from app.initialize_functions import create_branch, create_tellers
+
+NORTH = '/api/branches/north'
+
+
+@pytest.fixture
+def north_teller_ids(app):
+    with app.app_context():
+        create_branch('north', 'North branch')
+        create_tellers('north', 2)
+        return [teller.id for teller in Teller.query.filter_by(branch_id='north').order_by(Teller.name)]
+
+
+def new_ticket(client, prefix='/api'):
+    response = client.post(f'{prefix}/ticket/new', json={'ticket_type': 'W'})
+    assert response.status_code == 201
+    return response.get_json()['ticket']
+
+
+def test_each_branch_numbers_its_own_tickets(client, north_teller_ids):
+    main = [new_ticket(client)['ticket_number'] for _ in range(3)]
+    north = [new_ticket(client, NORTH)['ticket_number'] for _ in range(2)]
+    assert north == main[:2]
+
+
+def test_tickets_cannot_be_handled_from_another_branch(client, auth_headers, teller_ids, north_teller_ids):
+    ticket = new_ticket(client)
+
+    # A north teller serving a main ticket, by either branch's URL
+    for prefix in ('/api', NORTH):
+        response = client.post(
+            f"{prefix}/ticket/{ticket['id']}/serve", json={'teller_id': north_teller_ids[0]}, headers=auth_headers
+        )
+        assert response.status_code == 404
+    assert client.post(f'{NORTH}/tellers/{teller_ids[0]}/next', headers=auth_headers).status_code == 404
+    # The north queue is empty, whatever main's holds
+    assert client.post(f'{NORTH}/tellers/{north_teller_ids[0]}/next', headers=auth_headers).status_code == 204
+
+    assert client.post(
+        f"/api/ticket/{ticket['id']}/serve", json={'teller_id': teller_ids[0]}, headers=auth_headers
+    ).status_code == 200
+    assert client.put(f"{NORTH}/ticket/{ticket['id']}/complete", headers=auth_headers).status_code == 404
+    assert client.post(
+        f'{NORTH}/ticket/cancel', json={'ticket_number': ticket['ticket_number']}
+    ).status_code == 404
+    assert client.put(f"/api/ticket/{ticket['id']}/complete", headers=auth_headers).status_code == 200
+
+
+def test_lists_and_their_etags_are_per_branch(client, auth_headers, north_teller_ids):
+    north_ticket = new_ticket(client, NORTH)
+    new_ticket(client)
+
+    north = client.get(f'{NORTH}/ticket/list', headers=auth_headers)
+    assert [ticket['id'] for ticket in north.get_json()['tickets']] == [north_ticket['id']]
+    main = client.get('/api/ticket/list', headers=auth_headers)
+    assert north_ticket['id'] not in [ticket['id'] for ticket in main.get_json()['tickets']]
+
+    # A new main ticket changes main's list only
+    new_ticket(client)
+    assert client.get(
+        f'{NORTH}/ticket/list', headers={**auth_headers, 'If-None-Match': north.headers['ETag']}
+    ).status_code == 304
+    assert client.get(
+        '/api/ticket/list', headers={**auth_headers, 'If-None-Match': main.headers['ETag']}
+    ).status_code == 200
+
+    tellers = client.get(f'{NORTH}/tellers', headers=auth_headers).get_json()
+    assert sorted(teller['id'] for teller in tellers['tellers']) == sorted(north_teller_ids)
+
+
+@pytest.mark.parametrize('request_args', [
+    ('post', '/ticket/new', {'json': {'ticket_type': 'W'}}),
+    ('get', '/ticket/list', {}),
+    ('get', '/tellers', {}),
+])
+def test_unknown_branch_is_not_found(client, auth_headers, request_args):
+    method, path, kwargs = request_args
+    response = getattr(client, method)(f'/api/branches/nowhere{path}', headers=auth_headers, **kwargs)
+    assert response.status_code == 404
+    assert response.get_json()['message'] == 'Branch not found'
@@ -0,0 +1,23 @@
+import threading
+
+
+def test_stalled_feed_does_not_block_the_broker(make_app):
+    app = make_app(EVENT_HEARTBEAT=0.05)
+    broker = app.extensions['event_broker']
+
+    with app.app_context():
+        feed = broker.stream('main')
+        assert next(feed).startswith('retry:')
+        # The client stops reading right after a keepalive
+        assert next(feed) == ': keepalive\n\n'
+
+        answered = threading.Event()
+
+        def read_events():
+            with app.app_context():
+                broker.events_after(0)
+            answered.set()
+
+        threading.Thread(target=read_events, daemon=True).start()
+        assert answered.wait(2)
+        feed.close()
@@ -0,0 +1,88 @@
+import gc
+import json
+import tracemalloc
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.db.db import Ticket, db
+from app.modules.ticket import export
+from app.modules.ticket.archive import archive_tickets
+
+
+def issue_past_day(app, count):
+    """``count`` tickets issued a second apart ten days ago; their numbers in order"""
+    day = datetime.combine(datetime.now().date() - timedelta(days=10), datetime.min.time())
+    with app.app_context():
+        db.session.execute(db.insert(Ticket), [
+            {'ticket_number': f'{day:%Y%m%d}-W-{i:05}', 'ticket_type': 'W', 'created_at': day + timedelta(seconds=i)}
+            for i in range(count)
+        ])
+        db.session.commit()
+    return day, [f'{day:%Y%m%d}-W-{i:05}' for i in range(count)]
+
+
+def export_url(day):
+    return f'/api/ticket/export?fields=ticket_number&from={day:%Y-%m-%d}&to={day:%Y-%m-%d}'
+
+
+def test_export_pages_without_holding_a_connection(make_app, auth_headers_for):
+    app = make_app(TICKET_EXPORT_CHUNK_SIZE=3)
+    client = app.test_client()
+    created = client.post('/api/ticket/batch', json={'tickets': [{'ticket_type': 'W'}] * 10}).get_json()['tickets']
+
+    response = client.get('/api/ticket/export?fields=ticket_number', headers=auth_headers_for(app), buffered=False)
+    lines = []
+    for chunk in response.response:
+        lines += chunk.decode().splitlines()
+        with app.app_context():
+            assert db.engine.pool.checkedout() == 0
+    response.close()
+
+    numbers = [json.loads(line)['ticket_number'] for line in lines]
+    assert sorted(numbers) == sorted(ticket['ticket_number'] for ticket in created)
+
+
+@pytest.mark.parametrize('server_side_cursor', [False, True])
+def test_tickets_archived_during_an_export_are_sent_once(make_app, auth_headers_for, monkeypatch, server_side_cursor):
+    monkeypatch.setattr(export, '_streams_with_cursor', lambda: server_side_cursor)
+    app = make_app(TICKET_EXPORT_CHUNK_SIZE=3)
+    day, numbers = issue_past_day(app, 10)
+
+    response = app.test_client().get(export_url(day), headers=auth_headers_for(app), buffered=False)
+    chunks = iter(response.response)
+    lines = next(chunks).decode().splitlines()
+    # The nightly job moves the whole day while the client reads
+    with app.app_context():
+        assert archive_tickets(day + timedelta(days=1), batch_size=4) == 10
+    for chunk in chunks:
+        lines += chunk.decode().splitlines()
+    response.close()
+
+    assert [json.loads(line)['ticket_number'] for line in lines] == numbers
+
+
+def test_export_memory_does_not_grow_with_the_range(make_app, auth_headers_for):
+    app = make_app(TICKET_EXPORT_CHUNK_SIZE=100)
+    day, _ = issue_past_day(app, 10000)
+
+    response = app.test_client().get(
+        export_url(day).replace('fields=ticket_number', 'format=csv'), headers=auth_headers_for(app), buffered=False,
+    )
+    streamed = 0
+    held = []
+    tracemalloc.start()
+    try:
+        for index, chunk in enumerate(response.response):
+            streamed += len(chunk)
+            if index % 10 == 0:
+                gc.collect()
+                held.append(tracemalloc.get_traced_memory()[0])
+    finally:
+        tracemalloc.stop()
+        response.close()
+
+    # Neither the rows nor the body are kept: memory in use while streaming
+    # stays within a few MB (holding every row would take over 10)
+    assert streamed > 750_000
+    assert max(held) < 4_000_000
@@ -0,0 +1,123 @@
+import threading
+import time
+
+import pytest
+
+from app.db.db import Ticket, db
+
+
+def test_keyed_follower_does_not_hold_the_only_connection(make_app):
+    # As in a gevent worker on SQLite: one connection, shared by turns
+    app = make_app(
+        TICKET_GROUP_COMMIT=True, TICKET_GROUP_COMMIT_WINDOW_MS=300,
+        SQLALCHEMY_ENGINE_OPTIONS={'pool_size': 1, 'max_overflow': 0, 'pool_timeout': 2},
+    )
+    responses = {}
+
+    def create(name, headers):
+        started = time.perf_counter()
+        response = app.test_client().post('/api/ticket/new', json={'ticket_type': 'W'}, headers=headers)
+        responses[name] = response.status_code, time.perf_counter() - started
+
+    leader = threading.Thread(target=create, args=('leader', {}))
+    follower = threading.Thread(target=create, args=('follower', {'Idempotency-Key': 'kiosk-1'}))
+    leader.start()
+    time.sleep(0.1)
+    follower.start()
+    leader.join()
+    follower.join()
+
+    assert responses['leader'][0] == 201 and responses['follower'][0] == 201
+    assert max(seconds for _, seconds in responses.values()) < 2
+
+
+def ticket_count(app):
+    with app.app_context():
+        return db.session.scalar(db.select(db.func.count()).select_from(Ticket))
+
+
+@pytest.mark.parametrize('cached', [True, False])
+def test_retry_gets_the_stored_response(app, client, cached):
+    first = client.post('/api/ticket/new', json={'ticket_type': 'W'}, headers={'Idempotency-Key': 'kiosk-1'})
+    assert first.status_code == 201
+    assert 'Idempotent-Replayed' not in first.headers
+    if not cached:
+        # As if the retry reached another worker
+        app.extensions['idempotency_cache'].clear()
+
+    retry = client.post('/api/ticket/new', json={'ticket_type': 'W'}, headers={'Idempotency-Key': 'kiosk-1'})
+    assert retry.status_code == 201
+    assert retry.headers['Idempotent-Replayed'] == 'true'
+    assert retry.get_json() == first.get_json()
+    assert ticket_count(app) == 1
+
+
+def test_retried_cancel_is_answered_as_the_first(client):
+    ticket = client.post('/api/ticket/new', json={'ticket_type': 'W'}).get_json()['ticket']
+    cancel = {'ticket_number': ticket['ticket_number']}
+
+    first = client.post('/api/ticket/cancel', json=cancel, headers={'Idempotency-Key': 'cancel-1'})
+    retry = client.post('/api/ticket/cancel', json=cancel, headers={'Idempotency-Key': 'cancel-1'})
+    assert first.status_code == retry.status_code == 200
+    assert retry.get_json() == first.get_json()
+    assert retry.headers['Idempotent-Replayed'] == 'true'
+
+
+def test_key_reused_for_a_different_request_is_rejected(app, client):
+    assert client.post(
+        '/api/ticket/new', json={'ticket_type': 'W'}, headers={'Idempotency-Key': 'kiosk-1'}
+    ).status_code == 201
+
+    response = client.post('/api/ticket/new', json={'ticket_type': 'D'}, headers={'Idempotency-Key': 'kiosk-1'})
+    assert response.status_code == 422
+    assert ticket_count(app) == 1
+
+
+def test_concurrent_requests_with_one_key_create_one_batch(app):
+    barrier = threading.Barrier(6)
+    responses = []
+
+    def create():
+        client = app.test_client()
+        barrier.wait()
+        response = client.post(
+            '/api/ticket/batch', json={'tickets': [{'ticket_type': 'W'}] * 3},
+            headers={'Idempotency-Key': 'offline-flush'},
+        )
+        responses.append((response.status_code, response.get_json()))
+
+    threads = [threading.Thread(target=create) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert [status for status, _ in responses] == [201] * 6
+    assert all(body == responses[0][1] for _, body in responses)
+    assert ticket_count(app) == 3
+
+
+def test_group_committed_ticket_stores_its_key(make_app):
+    app = make_app(TICKET_GROUP_COMMIT=True, TICKET_GROUP_COMMIT_WINDOW_MS=50)
+    responses = {}
+
+    def create(name, headers):
+        responses[name] = app.test_client().post('/api/ticket/new', json={'ticket_type': 'W'}, headers=headers)
+
+    # Two requests in one group commit, one of them keyed
+    threads = [
+        threading.Thread(target=create, args=('plain', {})),
+        threading.Thread(target=create, args=('keyed', {'Idempotency-Key': 'kiosk-1'})),
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert responses['plain'].status_code == responses['keyed'].status_code == 201
+
+    app.extensions['idempotency_cache'].clear()
+    retry = app.test_client().post('/api/ticket/new', json={'ticket_type': 'W'}, headers={'Idempotency-Key': 'kiosk-1'})
+    assert retry.status_code == 201
+    assert retry.headers['Idempotent-Replayed'] == 'true'
+    assert retry.get_json() == responses['keyed'].get_json()
+    assert ticket_count(app) == 2
@@ -0,0 +1,63 @@
+import sqlite3
+
+import pytest
+
+from app.app import create_app
+from app.config.config import TestingConfig
+from app.db.db import Branch, Teller, db
+
+# The schema db.create_all() built before migrations were tracked
+BASELINE_SCHEMA = '''
+CREATE TABLE user (id VARCHAR(36) NOT NULL PRIMARY KEY, username VARCHAR(80) NOT NULL UNIQUE, email VARCHAR(120) NOT NULL UNIQUE, _password VARCHAR(128) NOT NULL, created_at DATETIME);
+CREATE TABLE teller (id VARCHAR(36) NOT NULL PRIMARY KEY, name VARCHAR(50) NOT NULL, is_active BOOLEAN);
+CREATE TABLE ticket (id VARCHAR(36) NOT NULL PRIMARY KEY, ticket_number VARCHAR(20) NOT NULL UNIQUE, ticket_type VARCHAR(1) NOT NULL, created_at DATETIME, is_served BOOLEAN, served_at DATETIME, teller_id VARCHAR(36) REFERENCES teller(id), is_canceled BOOLEAN, completed BOOLEAN);
+CREATE TABLE daily_counter (id INTEGER NOT NULL PRIMARY KEY, date DATE NOT NULL UNIQUE, last_number INTEGER);
+INSERT INTO teller VALUES ('t1', 'Teller A', 0);
+INSERT INTO ticket VALUES ('a', '20250101-W-001', 'W', '2025-01-01 10:00:00', 1, '2025-01-01 10:05:00', 't1', 0, 1);
+'''
+
+
+@pytest.fixture
+def bare_app(tmp_path, monkeypatch, request):
+    """An app on an empty SQLite file, run from the directory holding migrations/"""
+    monkeypatch.chdir(request.config.rootpath)
+    path = tmp_path / 'init.db'
+    monkeypatch.setattr(TestingConfig, 'SQLALCHEMY_DATABASE_URI', f'sqlite:///{path}')
+    return create_app('testing'), path
+
+
+def init_db(app):
+    result = app.test_cli_runner().invoke(args=['bqms', 'init-db'])
+    assert result.exception is None, result.output
+    return result
+
+
+def revision(path):
+    return sqlite3.connect(path).execute('SELECT version_num FROM alembic_version').fetchone()[0]
+
+
+def test_init_db_creates_a_fresh_schema_at_head(bare_app):
+    app, path = bare_app
+    init_db(app)
+    head = revision(path)
+    init_db(app)
+    assert revision(path) == head
+    with app.app_context():
+        assert db.session.get(Branch, 'main')
+        assert Teller.query.filter_by(branch_id='main').count() == 6
+
+
+def test_init_db_migrates_a_baseline_database(bare_app):
+    app, path = bare_app
+    sqlite3.connect(path).executescript(BASELINE_SCHEMA)
+
+    init_db(app)
+
+    with app.app_context():
+        assert db.session.get(Branch, 'main')
+        # The existing teller moved to the default branch; none were added
+        assert [teller.id for teller in Teller.query.filter_by(branch_id='main')] == ['t1']
+    connection = sqlite3.connect(path)
+    tables = {name for name, in connection.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    assert {'branch', 'queue_event', 'ticket_archive', 'idempotency_key'} <= tables
+    assert connection.execute('SELECT branch_id FROM ticket').fetchall() == [('main',)]
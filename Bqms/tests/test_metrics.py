@@ -0,0 +1,26 @@
+from flask import g
+
+from app.utils import metrics as metrics_module
+from app.utils.metrics import RequestMetrics
+
+
+def test_gevent_workers_profile_one_request_at_a_time(make_app, tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics_module, 'gevent_patched', lambda: True)
+    app = make_app(PROFILE_THRESHOLD_MS=60000, PROFILE_DIR=str(tmp_path / 'profiles'))
+    metrics = RequestMetrics(app)
+
+    # Two requests interleaved on one thread, as greenlets would be; each
+    # has its own app context, so its own g
+    with app.app_context(), app.test_request_context('/api/ticket/list'):
+        metrics.before_request()
+        assert 'profile' in g.metrics
+        with app.app_context(), app.test_request_context('/api/ticket/list'):
+            metrics.before_request()
+            assert 'profile' not in g.metrics
+            metrics.teardown_request(None)
+        metrics.teardown_request(None)
+
+    with app.app_context(), app.test_request_context('/api/ticket/list'):
+        metrics.before_request()
+        assert 'profile' in g.metrics
+        metrics.teardown_request(None)
@@ -0,0 +1,28 @@
+import pytest
+
+from app import initialize_functions
+
+
+def test_block_leases_are_refused_with_a_single_sqlite_connection(make_app, monkeypatch):
+    monkeypatch.setattr(initialize_functions, 'gevent_patched', lambda: True)
+    with pytest.raises(RuntimeError, match='TICKET_NUMBER_BLOCK_SIZE'):
+        make_app(TICKET_NUMBER_BLOCK_SIZE=10)
+
+
+def test_block_leases_hand_out_consecutive_numbers(make_app):
+    client = make_app(TICKET_NUMBER_BLOCK_SIZE=10).test_client()
+    numbers = [client.post('/api/ticket/new', json={'ticket_type': 'W'}).get_json()['ticket']['ticket_number']
+               for _ in range(12)]
+    assert [int(number.rsplit('-', 1)[-1]) for number in numbers] == list(range(1, 13))
+
+
+def test_block_leases_are_not_shared_between_apps(make_app, tmp_path):
+    first, second = (
+        make_app(TICKET_NUMBER_BLOCK_SIZE=10, SQLALCHEMY_DATABASE_URI=f"sqlite:///{tmp_path / name}")
+        for name in ('first.db', 'second.db')
+    )
+    numbers = [app.test_client().post('/api/ticket/new', json={'ticket_type': 'W'}).get_json()['ticket']['ticket_number']
+               for app in (first, second)]
+    # Each database starts its own sequence
+    assert numbers[0] == numbers[1]
+    assert numbers[0].endswith('-001')
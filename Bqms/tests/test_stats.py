@@ -0,0 +1,66 @@
+from datetime import datetime, timedelta
+
+from app.db.db import Ticket, db
+from app.modules.ticket.stats import rebuild_stats
+
+
+def stats(client, headers, day=None):
+    query = f'?from={day:%Y-%m-%d}&to={day:%Y-%m-%d}' if day else ''
+    response = client.get(f'/api/stats{query}', headers=headers)
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def serve_past_day(app, teller_id, waits):
+    """Tickets issued ten days ago, each served by ``teller_id`` after one of ``waits`` seconds"""
+    day = datetime.combine(datetime.now().date() - timedelta(days=10), datetime.min.time())
+    with app.app_context():
+        db.session.execute(db.insert(Ticket), [
+            {
+                'ticket_number': f'{day:%Y%m%d}-W-{i:03}', 'ticket_type': 'W', 'created_at': day + timedelta(minutes=i),
+                'is_served': True, 'served_at': day + timedelta(minutes=i, seconds=wait), 'teller_id': teller_id,
+            }
+            for i, wait in enumerate(waits)
+        ])
+        db.session.commit()
+        rebuild_stats(day.date(), day.date())
+    return day
+
+
+def test_rollup_matches_a_rebuild_from_the_tickets(app, client, auth_headers, teller_ids):
+    tickets = client.post(
+        '/api/ticket/batch', json={'tickets': [{'ticket_type': 'W'}] * 4 + [{'ticket_type': 'D'}] * 2}
+    ).get_json()['tickets']
+    for ticket, teller_id in zip(tickets[:3], teller_ids):
+        assert client.post(f"/api/ticket/{ticket['id']}/serve", json={'teller_id': teller_id}, headers=auth_headers).status_code == 200
+    for ticket in tickets[:2]:
+        assert client.put(f"/api/ticket/{ticket['id']}/complete", headers=auth_headers).status_code == 200
+    # One canceled while being served, one while waiting
+    for ticket in (tickets[2], tickets[5]):
+        assert client.post('/api/ticket/cancel', json={'ticket_number': ticket['ticket_number']}).status_code == 200
+
+    rolled_up = stats(client, auth_headers)
+    total = rolled_up['total']
+    assert (total['issued'], total['served'], total['completed'], total['canceled']) == (6, 3, 2, 2)
+    assert [teller['served'] for teller in rolled_up['by_teller']] == [1, 1, 1]
+
+    with app.app_context():
+        today = datetime.now().date()
+        assert rebuild_stats(today, today) == 6
+    assert stats(client, auth_headers) == rolled_up
+
+
+def test_percentiles_are_interpolated_within_buckets(app, client, auth_headers, teller_ids):
+    # Served at once: not reported as the first bucket's bound (30s)
+    day = serve_past_day(app, teller_ids[0], [0] * 5)
+    total = stats(client, auth_headers, day)['total']
+    assert (total['p50_wait_seconds'], total['p90_wait_seconds']) == (0, 0)
+
+    with app.app_context():
+        db.session.execute(db.delete(Ticket))
+        db.session.commit()
+    day = serve_past_day(app, teller_ids[0], range(100, 1001, 100))
+    total = stats(client, auth_headers, day)['total']
+    assert total['avg_wait_seconds'] == 550
+    # The 5th and 9th waits lie in the (450, 600] and (600, 900] buckets
+    assert (total['p50_wait_seconds'], total['p90_wait_seconds']) == (525, 900)
@@ -0,0 +1,68 @@
+import re
+
+import pytest
+
+from app.db.db import db
+
+
+def served_queue(client, auth_headers, teller_ids, count):
+    """Issue ``count`` tickets and have every teller serve one of them"""
+    tickets = client.post('/api/ticket/batch', json={'tickets': [{'ticket_type': 'W'}] * count}).get_json()['tickets']
+    for ticket, teller_id in zip(tickets, teller_ids):
+        client.post(f"/api/ticket/{ticket['id']}/serve", json={'teller_id': teller_id}, headers=auth_headers)
+    return tickets
+
+
+def test_listing_costs_the_same_statements_for_any_page_size(app, client, auth_headers, teller_ids, capture_statements):
+    served_queue(client, auth_headers, teller_ids, 50)
+
+    counts = {}
+    for limit in (1, 50):
+        with capture_statements(app) as statements:
+            response = client.get(f'/api/ticket/list?limit={limit}', headers=auth_headers)
+        assert response.status_code == 200
+        assert len(response.get_json()['tickets']) == limit
+        counts[limit] = len(statements)
+    assert counts[1] == counts[50]
+
+
+def list_query(statements):
+    """The (statement, parameters) that read the page from the ticket table"""
+    return next((statement, parameters) for statement, parameters in statements if 'FROM ticket ' in statement)
+
+
+@pytest.mark.parametrize('status, index', [
+    (None, 'ix_ticket_branch_created_at'),
+    ('pending', 'ix_ticket_branch_pending_created_at'),
+    ('served', 'ix_ticket_branch_served_created_at'),
+    ('completed', 'ix_ticket_branch_completed_created_at'),
+    ('canceled', 'ix_ticket_branch_canceled_created_at'),
+])
+def test_list_filters_use_their_index(app, client, auth_headers, teller_ids, capture_statements, status, index):
+    served_queue(client, auth_headers, teller_ids, 20)
+
+    with capture_statements(app) as statements:
+        response = client.get(f"/api/ticket/list?status={status or ''}", headers=auth_headers)
+    assert response.status_code == 200
+    statement, parameters = list_query(statements)
+
+    with app.app_context():
+        plan = ' | '.join(
+            row[-1] for row in db.session.connection().exec_driver_sql(f'EXPLAIN QUERY PLAN {statement}', parameters)
+        )
+    assert index in plan, statement
+    assert 'SCAN ticket' not in plan
+
+
+def test_unchanged_list_is_answered_without_reading_tickets(app, client, auth_headers, capture_statements):
+    client.post('/api/ticket/batch', json={'tickets': [{'ticket_type': 'W'}] * 3})
+    first = client.get('/api/ticket/list?status=pending', headers=auth_headers)
+    assert first.status_code == 200
+
+    with capture_statements(app) as statements:
+        response = client.get(
+            '/api/ticket/list?status=pending',
+            headers={**auth_headers, 'If-None-Match': first.headers['ETag']},
+        )
+    assert response.status_code == 304
+    assert not [statement for statement, _ in statements if re.search(r'\bticket\b', statement)]
@@ -1,10 +1,10 @@
 import React, { useEffect, useState } from 'react'
 import { useAuth } from '../context/AuthContext'
 import { useQuery, useMutation, useQueryClient } from '@tanstack/react-query'
-import { api, endpoints } from '../utils/api'
+import { api, BASE_URL, endpoints } from '../utils/api'
 import { motion, AnimatePresence } from 'framer-motion'
 import { toast, Toaster } from 'sonner'
-import type { Ticket, Teller } from '../utils/validation'
+import type { Ticket, Teller, TicketListResponse } from '../utils/validation'
 import {
   CalendarIcon,
   FilterIcon,
@@ -33,15 +33,45 @@ export default function AdminDashboard() {
     logout()
     navigate('/login')
   }
+  // Refetch the lists when the live queue feed reports a change
+  useEffect(() => {
+    if (!accessToken) return
+    const source = new EventSource(
+      `${BASE_URL}${endpoints.ticketEvents}?jwt=${encodeURIComponent(accessToken)}`,
+    )
+    const refresh = () => {
+      queryClient.invalidateQueries({ queryKey: ['tickets'] })
+      queryClient.invalidateQueries({ queryKey: ['tellers'] })
+    }
+    const kinds = [
+      'ticket.created',
+      'ticket.served',
+      'ticket.completed',
+      'ticket.canceled',
+      'reset',
+    ]
+    kinds.forEach((kind) => source.addEventListener(kind, refresh))
+    return () => source.close()
+  }, [accessToken, queryClient])
   const { data: ticketsData, isLoading: isLoadingTickets } = useQuery({
     queryKey: ['tickets', selectedDate, filterStatus],
     queryFn: async () => {
       const params = new URLSearchParams()
       if (selectedDate) params.append('date', selectedDate)
       if (filterStatus !== 'all') params.append('status', filterStatus)
-      const url = `${endpoints.listTickets}?${params.toString()}`
-      const response = await api.get(url)
-      return response.data
+      // The list is paginated; follow next_cursor to collect the whole day
+      const tickets: Ticket[] = []
+      let page: TicketListResponse
+      let cursor: string | null = null
+      do {
+        if (cursor) params.set('cursor', cursor)
+        const url = `${endpoints.listTickets}?${params.toString()}`
+        const response = await api.get<TicketListResponse>(url)
+        page = response.data
+        tickets.push(...page.tickets)
+        cursor = page.next_cursor
+      } while (cursor)
+      return { ...page, tickets, total_tickets: tickets.length }
     },
   })
   const { data: tellersData } = useQuery({
@@ -1,5 +1,5 @@
 import axios from 'axios'
-const BASE_URL = 'http://localhost:5000/api'
+export const BASE_URL = 'http://localhost:5000/api'
 export const api = axios.create({
   baseURL: BASE_URL,
   headers: {
@@ -26,6 +26,7 @@ export const endpoints = {
   serveTicket: (ticketId: string) => `/ticket/${ticketId}/serve`,
   completeTicket: (ticketId: string) => `/ticket/${ticketId}/complete`,
   autoAssignTicket: (ticketId: string) => `/tickets/${ticketId}/auto-assign`,
+  ticketEvents: '/ticket/events',
 }
 
 export const setAuthToken = (token: string | null) => {
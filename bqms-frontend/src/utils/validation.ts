@@ -54,6 +54,7 @@ export interface TicketListResponse {
   status: string
   tickets: Ticket[]
   total_tickets: number
+  next_cursor: string | null
 }
 export interface RefreshTokenResponse {
   access_token: string